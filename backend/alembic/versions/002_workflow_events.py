@@ -0,0 +1,41 @@
+"""Workflow events log
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'workflow_events',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('loan_application_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('event', sa.Enum('submitted', 'step_started', 'step_completed', 'step_failed', 'completed', 'rejected', name='workfloweventtype'), nullable=False),
+        sa.Column('step', sa.String(length=50), nullable=True),
+        sa.Column('status', sa.String(length=50), nullable=True),
+        sa.Column('attempt', sa.Integer(), nullable=True),
+        sa.Column('duration_ms', sa.Numeric(precision=12, scale=3), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('data', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['loan_application_id'], ['loan_applications.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_workflow_events_loan_application_id_created_at', 'workflow_events', ['loan_application_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_workflow_events_loan_application_id_created_at', table_name='workflow_events')
+    op.drop_table('workflow_events')
+    sa.Enum(name='workfloweventtype').drop(op.get_bind(), checkfirst=True)
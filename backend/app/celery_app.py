@@ -1,7 +1,9 @@
 """
 Celery Application Configuration
 """
+import asyncio
 from celery import Celery
+from celery.signals import worker_process_init
 from app.core.config import settings
 
 celery_app = Celery(
@@ -20,5 +22,19 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=30 * 60,  # 30 minutes
     task_soft_time_limit=25 * 60,  # 25 minutes
+    worker_prefetch_multiplier=1,  # late-acked tasks should not sit prefetched on a busy worker
+    beat_schedule={
+        "resume-loan-workflows": {
+            "task": "resume_loan_workflows",
+            "schedule": settings.LOAN_WORKFLOW_RESUME_INTERVAL_SECONDS,
+        },
+    },
 )
 
+
+
+@worker_process_init.connect
+def load_worker_models(**kwargs):
+    """Load the model registry in each worker process (the API lifespan never runs here)"""
+    from app.core.ml_loader import ensure_models_loaded
+    asyncio.run(ensure_models_loaded())
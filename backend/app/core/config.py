@@ -2,7 +2,7 @@
 Application Configuration
 """
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 
@@ -86,9 +86,56 @@ class Settings(BaseSettings):
     
     # ML Models
     ML_MODELS_DIR: str = "app/ml_models"
+    ML_MODELS_MMAP: bool = True  # memory-map numpy payloads (uncompressed joblib dumps only)
+    ML_MODEL_LOAD_WORKERS: int = 4
+    INFERENCE_BATCH_MAX_ROWS: int = 64
+    INFERENCE_BATCH_MAX_WAIT_MS: float = 5.0
+    MODEL_SHADOW_SAMPLE_RATE: float = 0.1  # share of batched traffic also scored by a shadow model
+    BATCH_SCORE_CHUNK_SIZE: int = 1000  # loans per Celery batch-scoring task
+    # Inference executor: per-model concurrency limit and timeout, overridable per model name
+    INFERENCE_MAX_CONCURRENCY: int = 4
+    INFERENCE_MODEL_CONCURRENCY: Dict[str, int] = {}
+    INFERENCE_TIMEOUT_SECONDS: float = 10.0
+    INFERENCE_MODEL_TIMEOUTS: Dict[str, float] = {}
+    # Models whose predict holds the GIL run in a process pool instead of threads
+    INFERENCE_PROCESS_MODELS: List[str] = []
+    INFERENCE_PROCESS_WORKERS: int = 2
+    PREQUAL_BATCH_CHUNK_ROWS: int = 10000  # leads scored per vector operation in /prequal/batch
+    ROI_BATCH_MAX_ROWS: int = 10000  # items per /roi-prediction/batch request
+    SHAP_WORKERS: int = 2  # explanation process pool size; 0 = one per CPU
+    PREDICTION_CACHE_SIZE: int = 10000
+    PREDICTION_CACHE_TTL_SECONDS: int = 24 * 3600  # 0 disables the prediction cache
     
     # Data files
     DATA_DIR: str = "app/data"
+    REFERENCE_DATA_WATCH_SECONDS: float = 5.0  # 0 disables the file watcher
+    
+    # Calculations
+    EMI_BATCH_MAX_ROWS: int = 50000
+    AMORTIZATION_EXPORT_MAX_SCHEDULES: int = 1000  # schedules per /amortization/export request
+    ROI_SIMULATION_MAX_PATHS: int = 100000
+    ROI_SIMULATION_WORKERS: int = 0  # 0 = one per CPU
+    SIMULATION_MAX_CELLS: int = 500000
+    SIMULATION_MAX_RESULTS: int = 200
+    ANGLE_CACHE_SIZE: int = 4096
+    ANGLE_CACHE_PRECISION: int = 1  # decimal places of lat/lon (0.1° ≈ 11 km)
+    ANGLE_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
+    
+    # Loan workflow (Celery): per-step retries with exponential backoff, and a sweep that resumes stalled loans
+    LOAN_WORKFLOW_MAX_RETRIES: int = 5
+    LOAN_WORKFLOW_RETRY_BACKOFF_SECONDS: int = 2
+    LOAN_WORKFLOW_RETRY_BACKOFF_MAX_SECONDS: int = 300
+    LOAN_WORKFLOW_STALL_SECONDS: int = 35 * 60  # longer than the Celery hard time limit
+    LOAN_WORKFLOW_RESUME_INTERVAL_SECONDS: int = 5 * 60
+    
+    # Live workflow events (Server-Sent Events)
+    SSE_QUEUE_SIZE: int = 100  # events held per subscriber before the oldest are dropped
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+    SSE_RETRY_MS: int = 3000  # client reconnect delay
+    
+    # Bulk loan import (/api/loans/bulk)
+    LOAN_BULK_CHUNK_ROWS: int = 1000  # rows per multi-row INSERT ... RETURNING and commit
+    LOAN_BULK_MAX_ROWS: int = 50000
     
     # PDF Cache
     PDF_CACHE_TTL_DAYS: int = 7
@@ -4,6 +4,7 @@ Database Configuration
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import text
+from sqlalchemy.pool import NullPool
 from app.core.config import settings
 import logging
 
@@ -28,6 +29,9 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# Celery tasks run each job in a fresh event loop, so pooled connections from a previous loop cannot be reused
+_worker_engine = None
+
 # Base class for models
 Base = declarative_base()
 
@@ -41,6 +45,14 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+def worker_session() -> AsyncSession:
+    """Session for Celery tasks (unpooled connections)"""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+    return async_sessionmaker(_worker_engine, class_=AsyncSession, expire_on_commit=False)()
+
+
 async def init_db():
     """Initialize database connection"""
     try:
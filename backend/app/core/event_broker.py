@@ -0,0 +1,126 @@
+"""
+Workflow Event Broker
+
+Fans loan workflow events out to open Server-Sent Event streams. Each API
+worker holds a single Redis pub/sub connection, pattern-subscribed to every
+loan's channel, and hands each message to the in-process queues of that
+loan's subscribers: thousands of open streams cost thousands of small queues,
+not thousands of Redis connections. A subscriber that falls behind loses its
+oldest events instead of growing without bound.
+"""
+import asyncio
+import json
+from typing import Dict, Optional, Set
+from app.core.config import settings
+from app.core.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENT_CHANNEL_PREFIX = "loan_events:"
+
+
+class EventBroker:
+    """Per-process fan-out of loan events from Redis to subscriber queues"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.stats = {"messages": 0, "delivered": 0, "dropped": 0, "reconnects": 0}
+
+    def subscribe(self, loan_id) -> asyncio.Queue:
+        """Queue receiving every event published for the loan from now on"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(str(loan_id), set()).add(queue)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, loan_id, queue: asyncio.Queue):
+        queues = self._subscribers.get(str(loan_id))
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[str(loan_id)]
+
+    def dispatch(self, loan_id, event: dict):
+        """Hand an event to the loan's local subscribers"""
+        self.stats["messages"] += 1
+        for queue in self._subscribers.get(str(loan_id), ()):
+            if queue.full():
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(event)
+            self.stats["delivered"] += 1
+
+    async def _listen(self):
+        delay = 1.0
+        while self._subscribers:
+            client = await get_redis()
+            if client is None:
+                # No Redis (tests, scripts): only local dispatch
+                return
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{EVENT_CHANNEL_PREFIX}*")
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    loan_id = message["channel"][len(EVENT_CHANNEL_PREFIX):]
+                    try:
+                        self.dispatch(loan_id, json.loads(message["data"]))
+                    except ValueError:
+                        logger.warning(f"Dropping malformed workflow event for loan {loan_id}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["reconnects"] += 1
+                logger.warning(f"Workflow event subscription lost ({e}); reconnecting in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "loans": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "listening": self._listener is not None and not self._listener.done(),
+        }
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+
+_broker: Optional[EventBroker] = None
+
+
+def get_event_broker() -> EventBroker:
+    global _broker
+    if _broker is None:
+        _broker = EventBroker(settings.SSE_QUEUE_SIZE)
+    return _broker
+
+
+def get_event_broker_stats() -> dict:
+    return _broker.get_stats() if _broker else {"subscribers": 0}
+
+
+async def shutdown_event_broker():
+    """Stop the Redis subscription (app shutdown)"""
+    global _broker
+    if _broker is not None:
+        await _broker.close()
+        _broker = None
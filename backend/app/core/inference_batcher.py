@@ -0,0 +1,204 @@
+"""
+Micro-batching Inference
+
+Queues single-row predictions from concurrent requests and runs them as one
+matrix in a worker thread, flushing every INFERENCE_BATCH_MAX_WAIT_MS or
+INFERENCE_BATCH_MAX_ROWS rows, whichever comes first. The event loop never
+runs model code; each caller awaits its own future. Flushed batches run on
+the model's inference executor lane (limits, timeouts and timing stats).
+
+The wrapped model can be swapped at any time; each batch is scored entirely
+by the version that was active when it was flushed.
+"""
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+import numpy as np
+from app.core.config import settings
+from app.core.inference_executor import run_model_sync
+import logging
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchingModel:
+    """Wraps a model so concurrent single-row calls share one predict_proba"""
+
+    def __init__(self, name: str, model, max_batch_rows: int, max_wait_ms: float,
+                 version: str = None, after_batch: Callable = None):
+        self.name = name
+        self._active = (model, version)
+        # Called from the worker with (features, output) after callers are resolved, e.g. shadow scoring
+        self.after_batch = after_batch
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        # Updated from the event loop (requests) and the worker thread (batches)
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "rows": 0,
+            "max_batch_rows": 0,
+            "errors": 0,
+            "last_batch_ms": None,
+        }
+        self._worker = threading.Thread(target=self._run, name=f"inference-{name}", daemon=True)
+        self._worker.start()
+
+    def __getattr__(self, attr):
+        # Everything else (classes_, feature_names_in_, ...) comes from the wrapped model
+        if attr == "_active":
+            raise AttributeError(attr)
+        return getattr(self._active[0], attr)
+
+    @property
+    def model(self):
+        return self._active[0]
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._active[1]
+
+    def swap(self, model, version: str = None):
+        """Atomically replace the model; queued rows are scored by whichever version flushes them"""
+        self._active = (model, version)
+
+    def predict_proba(self, features) -> np.ndarray:
+        """Direct matrix inference for callers that already batch (blocks the calling thread)"""
+        return run_model_sync(self.name, self.model, "predict_proba", features, self.version)
+
+    def submit(self, row) -> Future:
+        """Queue one feature row; the future resolves to (probabilities, model version)"""
+        future = Future()
+        with self._stats_lock:
+            self.stats["requests"] += 1
+        self._queue.put((np.asarray(row, dtype=np.float64).ravel(), future))
+        return future
+
+    async def apredict_proba(self, row) -> np.ndarray:
+        """Await one row's probabilities from the next batch"""
+        probabilities, _ = await asyncio.wrap_future(self.submit(row))
+        return probabilities
+
+    async def apredict_proba_versioned(self, row) -> tuple:
+        """Like apredict_proba, also returning the version that scored the row"""
+        return await asyncio.wrap_future(self.submit(row))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _collect(self, first) -> tuple:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stopping = self._collect(first)
+            # Skip requests whose callers have already gone away
+            batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+            model, version = self._active
+            features = np.vstack([row for row, _ in batch])
+            start = time.perf_counter()
+            try:
+                probabilities = run_model_sync(self.name, model, "predict_proba", features, version)
+            except Exception as e:
+                with self._stats_lock:
+                    self.stats["errors"] += 1
+                logger.error(f"Batched {self.name} inference failed ({len(batch)} rows): {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self._record(len(batch), (time.perf_counter() - start) * 1000)
+            for future, result in zip(futures, probabilities):
+                future.set_result((result, version))
+            if self.after_batch is not None:
+                try:
+                    self.after_batch(features, probabilities)
+                except Exception as e:
+                    logger.warning(f"after_batch hook for {self.name} failed: {e}")
+
+    def _record(self, rows: int, batch_ms: float):
+        with self._stats_lock:
+            self.stats["batches"] += 1
+            self.stats["rows"] += rows
+            self.stats["max_batch_rows"] = max(self.stats["max_batch_rows"], rows)
+            self.stats["last_batch_ms"] = round(batch_ms, 3)
+
+    def close(self, timeout: float = 5.0):
+        """Drain queued requests and stop the worker thread"""
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        batches = stats["batches"]
+        return {
+            **stats,
+            "version": self.version,
+            "queue_depth": self.queue_depth,
+            "mean_batch_rows": round(stats["rows"] / batches, 2) if batches else 0.0,
+        }
+
+
+# One long-lived batcher per batched model; new model versions are swapped into it
+_batchers: Dict[str, BatchingModel] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batching_model(name: str, model, version: str = None,
+                       after_batch: Callable = None) -> Optional[BatchingModel]:
+    """Batcher serving `model`, created on first use and swapped when the model changes"""
+    if model is None:
+        return None
+    batcher = _batchers.get(name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(name)
+            if batcher is None:
+                batcher = BatchingModel(
+                    name, model, settings.INFERENCE_BATCH_MAX_ROWS, settings.INFERENCE_BATCH_MAX_WAIT_MS,
+                    version=version, after_batch=after_batch,
+                )
+                _batchers[name] = batcher
+    if batcher.model is not model:
+        batcher.swap(model, version)
+    return batcher
+
+
+def get_inference_stats() -> dict:
+    return {name: batcher.get_stats() for name, batcher in _batchers.items()}
+
+
+def shutdown_batchers():
+    """Stop every batcher's worker thread (app shutdown)"""
+    with _batchers_lock:
+        for batcher in _batchers.values():
+            batcher.close()
+        _batchers.clear()
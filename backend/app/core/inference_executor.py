@@ -0,0 +1,190 @@
+"""
+Inference Executor
+
+Every model call runs here, never on the event loop. Each model has its own
+lane: a thread pool whose size is the model's concurrency limit
+(INFERENCE_MAX_CONCURRENCY, or INFERENCE_MODEL_CONCURRENCY[name]), so one
+slow model queues behind itself instead of starving the others. Calls that
+exceed the model's timeout fail with InferenceTimeoutError.
+
+Most libraries (sklearn trees, xgboost, catboost) release the GIL while
+predicting, so threads suffice. Models listed in INFERENCE_PROCESS_MODELS
+run in a shared process pool instead; each worker process loads the
+registered artifact (memory-mapped) once per version.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Tuple
+import joblib
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceTimeoutError(TimeoutError):
+    """A model call exceeded its timeout"""
+
+
+class _ModelLane:
+    """Concurrency-limited executor and timing stats for one model"""
+
+    def __init__(self, name: str, max_concurrency: int, timeout: float, use_process: bool):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.use_process = use_process
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"infer-{name}")
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "errors": 0,
+            "timeouts": 0,
+            "in_flight": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "total_exec_ms": 0.0,
+            "max_exec_ms": 0.0,
+        }
+
+    def _record(self, wait_ms: float, exec_ms: float, failed: bool):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["errors"] += int(failed)
+            self.stats["total_wait_ms"] += wait_ms
+            self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+            self.stats["total_exec_ms"] += exec_ms
+            self.stats["max_exec_ms"] = max(self.stats["max_exec_ms"], exec_ms)
+
+    def submit(self, model, method: str, features, version: Optional[str]) -> Future:
+        queued_at = time.perf_counter()
+        target = _process_target(self.name, version) if self.use_process else None
+
+        def call():
+            started = time.perf_counter()
+            with self._lock:
+                self.stats["in_flight"] += 1
+            failed = True
+            try:
+                if target is not None:
+                    result = _get_process_pool().submit(_predict_artifact, *target, method, features).result()
+                else:
+                    result = getattr(model, method)(features)
+                failed = False
+                return result
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.stats["in_flight"] -= 1
+                self._record((started - queued_at) * 1000, (finished - started) * 1000, failed)
+
+        return self.executor.submit(call)
+
+    def timed_out(self):
+        with self._lock:
+            self.stats["timeouts"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        calls = stats["calls"]
+        return {
+            **{key: round(value, 3) if isinstance(value, float) else value for key, value in stats.items()},
+            "mean_wait_ms": round(stats["total_wait_ms"] / calls, 3) if calls else None,
+            "mean_exec_ms": round(stats["total_exec_ms"] / calls, 3) if calls else None,
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "pool": "process" if self.use_process else "thread",
+        }
+
+
+_lanes: Dict[str, _ModelLane] = {}
+_lanes_lock = threading.Lock()
+_process_pool: Optional[ProcessPoolExecutor] = None
+# Per worker process: artifacts loaded by the process pool, keyed by (path, version)
+_process_models: Dict[Tuple[str, str], object] = {}
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared inference process pool"""
+    global _process_pool
+    with _lanes_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=settings.INFERENCE_PROCESS_WORKERS or None)
+    return _process_pool
+
+
+def _process_target(name: str, version: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(path, version) of the registered artifact, or None to run in-thread (model not from the registry)"""
+    from app.core.ml_loader import get_active_version
+    active = get_active_version(name)
+    if active is None or (version is not None and active.version != version):
+        return None
+    return active.path, active.version
+
+
+def _predict_artifact(path: str, version: str, method: str, features):
+    """Process-pool entry point"""
+    key = (path, version)
+    if key not in _process_models:
+        _process_models[key] = joblib.load(path, mmap_mode="r" if settings.ML_MODELS_MMAP else None)
+    return getattr(_process_models[key], method)(features)
+
+
+def _lane(name: str) -> _ModelLane:
+    lane = _lanes.get(name)
+    if lane is None:
+        with _lanes_lock:
+            lane = _lanes.get(name)
+            if lane is None:
+                lane = _ModelLane(
+                    name,
+                    settings.INFERENCE_MODEL_CONCURRENCY.get(name, settings.INFERENCE_MAX_CONCURRENCY),
+                    settings.INFERENCE_MODEL_TIMEOUTS.get(name, settings.INFERENCE_TIMEOUT_SECONDS),
+                    name in settings.INFERENCE_PROCESS_MODELS,
+                )
+                _lanes[name] = lane
+    return lane
+
+
+async def run_model(name: str, model, method: str, features, version: str = None):
+    """Await `model.<method>(features)` on the model's lane"""
+    lane = _lane(name)
+    future = lane.submit(model, method, features, version)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), lane.timeout)
+    except asyncio.TimeoutError:
+        lane.timed_out()
+        raise InferenceTimeoutError(f"{name} inference timed out after {lane.timeout}s")
+
+
+def run_model_sync(name: str, model, method: str, features, version: str = None):
+    """Blocking variant for worker threads and Celery tasks"""
+    lane = _lane(name)
+    future = lane.submit(model, method, features, version)
+    try:
+        return future.result(lane.timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        lane.timed_out()
+        raise InferenceTimeoutError(f"{name} inference timed out after {lane.timeout}s")
+
+
+def get_inference_executor_stats() -> dict:
+    """Queue wait and execution timing per model"""
+    return {name: lane.get_stats() for name, lane in _lanes.items()}
+
+
+def shutdown_inference_executor():
+    """Stop every lane and the process pool (app shutdown)"""
+    global _process_pool
+    with _lanes_lock:
+        for lane in _lanes.values():
+            lane.executor.shutdown(wait=False, cancel_futures=True)
+        _lanes.clear()
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
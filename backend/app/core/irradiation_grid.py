@@ -0,0 +1,161 @@
+"""
+Gridded Irradiation Index
+
+Monthly GHI (kWh/m²/day) on a regular lat/lon grid, stored as a
+memory-mapped .npy array of shape (n_lat, n_lon, 12) with a JSON sidecar:
+
+    irradiation_grid.npy
+    irradiation_grid.json   {"lat_min": 6.0, "lon_min": 68.0, "resolution": 0.1, "version": "...", "source": "..."}
+    pincodes.csv            pincode,latitude,longitude
+
+Cell lookup is O(1) index arithmetic; the OS page cache is shared between workers.
+
+Build the grid from a long-format CSV (lat,lon,month,ghi), e.g. a NASA POWER export:
+    python -m app.core.irradiation_grid build <input.csv> <output_dir> [resolution]
+"""
+import csv
+import json
+import sys
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+GRID_FILE = "irradiation_grid.npy"
+META_FILE = "irradiation_grid.json"
+PINCODE_FILE = "pincodes.csv"
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.float64)
+
+
+def _cell_index(values, origin: float, resolution: float) -> np.ndarray:
+    """Grid index along one axis; used by both the builder and the lookups so points on a grid line bin alike"""
+    # Epsilon guards against e.g. (18.2 - 18.0) / 0.1 == 1.999...
+    return np.floor((np.asarray(values, dtype=np.float64) - origin) / resolution + 1e-9).astype(np.int64)
+
+
+class IrradiationGrid:
+    """Read-only monthly GHI grid with O(1) cell and pincode lookups"""
+
+    def __init__(self, ghi: np.ndarray, lat_min: float, lon_min: float, resolution: float,
+                 pincode_cells: Mapping[str, Tuple[int, int]] = None, version: str = None):
+        self.ghi = ghi
+        self.lat_min = lat_min
+        self.lon_min = lon_min
+        self.resolution = resolution
+        self.pincode_cells = pincode_cells or MappingProxyType({})
+        self.version = version
+        # Day-weighted annual mean per cell, computed once (n_lat x n_lon, small)
+        self.annual = (np.asarray(ghi, dtype=np.float64) @ DAYS_IN_MONTH / DAYS_IN_MONTH.sum()).astype(np.float32)
+        self.annual.setflags(write=False)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.ghi.shape[0], self.ghi.shape[1]
+
+    def cell(self, latitude: float, longitude: float) -> Optional[Tuple[int, int]]:
+        """Grid cell containing the point, or None if outside the grid"""
+        i = int(_cell_index(float(latitude), self.lat_min, self.resolution))
+        j = int(_cell_index(float(longitude), self.lon_min, self.resolution))
+        n_lat, n_lon = self.shape
+        if 0 <= i < n_lat and 0 <= j < n_lon:
+            return i, j
+        return None
+
+    def cells(self, latitude, longitude) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized cell lookup; returns (i, j, valid)"""
+        i = _cell_index(latitude, self.lat_min, self.resolution)
+        j = _cell_index(longitude, self.lon_min, self.resolution)
+        n_lat, n_lon = self.shape
+        valid = (i >= 0) & (i < n_lat) & (j >= 0) & (j < n_lon)
+        return np.where(valid, i, 0), np.where(valid, j, 0), valid
+
+    def cell_center(self, i: int, j: int) -> Tuple[float, float]:
+        return (
+            round(self.lat_min + (i + 0.5) * self.resolution, 6),
+            round(self.lon_min + (j + 0.5) * self.resolution, 6),
+        )
+
+    def pincode_cell(self, pincode: str) -> Optional[Tuple[int, int]]:
+        return self.pincode_cells.get(str(pincode).strip())
+
+    def monthly(self, i: int, j: int) -> Optional[np.ndarray]:
+        """Monthly GHI for a cell, or None where the grid has no data"""
+        values = np.asarray(self.ghi[i, j], dtype=np.float64)
+        return None if np.isnan(values).any() else values
+
+    def annual_mean(self, i: int, j: int) -> Optional[float]:
+        value = float(self.annual[i, j])
+        return None if np.isnan(value) else value
+
+    def annual_mean_many(self, latitude, longitude, default) -> np.ndarray:
+        """Vectorized annual mean GHI; `default` (scalar or array) fills points off-grid or without data"""
+        i, j, valid = self.cells(latitude, longitude)
+        values = self.annual[i, j].astype(np.float64)
+        ok = valid & ~np.isnan(values)
+        return np.where(ok, values, default)
+
+
+def load_irradiation_grid(data_dir: Path) -> Optional[IrradiationGrid]:
+    """Memory-map the grid if present; returns None when no grid is installed"""
+    data_dir = Path(data_dir)
+    grid_path, meta_path = data_dir / GRID_FILE, data_dir / META_FILE
+    if not grid_path.exists() or not meta_path.exists():
+        return None
+
+    meta = json.loads(meta_path.read_text())
+    ghi = np.load(grid_path, mmap_mode="r")
+    if ghi.ndim != 3 or ghi.shape[2] != 12:
+        raise ValueError(f"Irradiation grid must have shape (n_lat, n_lon, 12), got {ghi.shape}")
+    grid = IrradiationGrid(ghi, float(meta["lat_min"]), float(meta["lon_min"]), float(meta["resolution"]),
+                           version=meta.get("version"))
+
+    pincode_path = data_dir / PINCODE_FILE
+    if pincode_path.exists():
+        cells = {}
+        with open(pincode_path, "r") as f:
+            for row in csv.DictReader(f):
+                cell = grid.cell(float(row["latitude"]), float(row["longitude"]))
+                if cell is not None:
+                    cells[row["pincode"].strip()] = cell
+        grid.pincode_cells = MappingProxyType(cells)
+
+    logger.info(f"Mapped irradiation grid {ghi.shape} at {meta['resolution']}° ({len(grid.pincode_cells)} pincodes)")
+    return grid
+
+
+def build_grid_from_csv(input_csv: Path, output_dir: Path, resolution: float = 0.1, version: str = None):
+    """Build irradiation_grid.npy/.json from a long-format CSV with columns lat,lon,month,ghi"""
+    rows = np.loadtxt(input_csv, delimiter=",", skiprows=1, usecols=(0, 1, 2, 3), ndmin=2)
+    lat, lon, month, ghi = rows.T
+    # Origins are rounded as they are stored in the sidecar, so lookups bin against the same values
+    lat_min = round(float(_cell_index(lat.min(), 0.0, resolution) * resolution), 6)
+    lon_min = round(float(_cell_index(lon.min(), 0.0, resolution) * resolution), 6)
+    i = _cell_index(lat, lat_min, resolution)
+    j = _cell_index(lon, lon_min, resolution)
+    m = month.astype(np.int64) - 1
+
+    grid = np.full((i.max() + 1, j.max() + 1, 12), np.nan, dtype=np.float32)
+    grid[i, j, m] = ghi
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    np.save(output_dir / GRID_FILE, grid)
+    (output_dir / META_FILE).write_text(json.dumps({
+        "lat_min": lat_min,
+        "lon_min": lon_min,
+        "resolution": resolution,
+        "version": version or Path(input_csv).stem,
+        "source": Path(input_csv).name,
+    }, indent=2))
+    return grid.shape
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "build":
+        print(__doc__)
+        sys.exit(1)
+    shape = build_grid_from_csv(Path(sys.argv[2]), Path(sys.argv[3]), float(sys.argv[4]) if len(sys.argv) > 4 else 0.1)
+    print(f"Wrote grid {shape} to {sys.argv[3]}")
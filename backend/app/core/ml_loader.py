@@ -1,49 +1,345 @@
 """
 ML Models Loader
+
+Versioned model registry. Each model is tracked with its name, version and
+checksum; new versions load in a background thread and are swapped in
+atomically, so in-flight requests finish on the version they started with.
+A candidate version can run in shadow mode on a sampled fraction of traffic,
+scored off the request path.
+
+Versions come from ML_MODELS_DIR/manifest.json when present:
+    {"eligibility": {"file": "eligibility_model.pkl", "version": "2024.06"}}
+otherwise the version is the first 12 hex digits of the file's SHA-256.
+
+At startup all models load concurrently. With ML_MODELS_MMAP, numpy payloads
+in uncompressed joblib dumps are memory-mapped read-only, so every worker
+process shares the same page-cache copy instead of holding its own.
 """
-import joblib
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Optional
+import joblib
+import numpy as np
 from app.core.config import settings
+from app.core.inference_batcher import get_batching_model
+from app.core.prediction_cache import invalidate_model
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Global model storage
+# Default file per model when the manifest does not name one
+MODEL_FILES = {
+    "eligibility": "eligibility_model.pkl",
+    "roi_prediction": "roi_model.pkl",
+    "angle_optimization": "angle_model.pkl",
+    "prequal": "prequal_model.pkl",
+}
+MANIFEST_FILE = "manifest.json"
+
+# Models served through the micro-batching scheduler (single-row calls use apredict_proba)
+BATCHED_MODELS = ("eligibility",)
+
+
+@dataclass(frozen=True)
+class ModelVersion:
+    """One loaded model artifact"""
+    name: str
+    version: str
+    checksum: str
+    path: str
+    model: Any = field(repr=False, compare=False)
+    loaded_at: datetime = field(default_factory=datetime.utcnow)
+    load_ms: float = 0.0
+    size_bytes: int = 0
+    # Process RSS growth during the load (approximate when loads overlap)
+    rss_delta_bytes: int = 0
+    mmap: bool = False
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "checksum": self.checksum,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "load_ms": self.load_ms,
+            "size_mb": round(self.size_bytes / 2**20, 2),
+            "rss_delta_mb": round(self.rss_delta_bytes / 2**20, 2),
+            "mmap": self.mmap,
+        }
+
+
+# Global model storage: name -> raw model (active version), plus the registry metadata
 ml_models = {}
+model_versions: Dict[str, ModelVersion] = {}
+shadow_models: Dict[str, ModelVersion] = {}
+shadow_stats: Dict[str, dict] = {}
+
+_loader: Optional[ThreadPoolExecutor] = None
+_shadow_executor: Optional[ThreadPoolExecutor] = None
+_registry_lock = threading.Lock()
+# Set once this process has loaded the registry (API lifespan or ensure_models_loaded)
+_models_loaded = False
+
+
+def _get_executors() -> tuple:
+    """Lazily create the loader and shadow threads (one each, so loads and shadow scoring stay serial)"""
+    global _loader, _shadow_executor
+    with _registry_lock:
+        if _loader is None:
+            _loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+            _shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-shadow")
+    return _loader, _shadow_executor
+
+
+def _read_manifest(models_dir: Path) -> dict:
+    path = models_dir / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except ValueError as e:
+        logger.error(f"Invalid model manifest {path}: {e}")
+        return {}
+
+
+def _rss_bytes() -> int:
+    """Current resident set size (Linux /proc; falls back to peak RSS elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_model_version(name: str, path: Path, version: str = None, mmap: bool = None) -> ModelVersion:
+    """Load one artifact from disk (blocking)"""
+    path = Path(path)
+    mmap = settings.ML_MODELS_MMAP if mmap is None else mmap
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    checksum = _checksum(path)
+    # Memory-mapping only applies to numpy arrays in uncompressed dumps; anything else loads normally
+    model = joblib.load(path, mmap_mode="r" if mmap else None)
+    return ModelVersion(
+        name, version or checksum[:12], checksum, str(path), model,
+        load_ms=round((time.perf_counter() - start) * 1000, 1),
+        size_bytes=path.stat().st_size,
+        rss_delta_bytes=max(_rss_bytes() - rss_before, 0),
+        mmap=mmap,
+    )
+
+
+def activate_model(model_version: ModelVersion):
+    """Atomically make `model_version` the active version of its model"""
+    with _registry_lock:
+        model_versions[model_version.name] = model_version
+        ml_models[model_version.name] = model_version.model
+    # Cached outputs are keyed by version; free the superseded ones now rather than at TTL
+    invalidate_model(model_version.name, keep_version=model_version.version)
+    logger.info(f"Activated {model_version.name} model version {model_version.version}")
+
+
+def set_shadow_model(model_version: Optional[ModelVersion], name: str = None):
+    """Install (or with None, remove) the shadow candidate for a model"""
+    name = model_version.name if model_version else name
+    with _registry_lock:
+        if model_version is None:
+            shadow_models.pop(name, None)
+        else:
+            shadow_models[name] = model_version
+            shadow_stats[name] = {
+                "version": model_version.version,
+                "rows": 0,
+                "errors": 0,
+                "agreement": 0,
+                "sum_abs_diff": 0.0,
+            }
+
+
+def promote_shadow(name: str) -> ModelVersion:
+    """Make the current shadow candidate the active version"""
+    candidate = shadow_models.get(name)
+    if candidate is None:
+        raise ValueError(f"No shadow model for {name}")
+    activate_model(candidate)
+    set_shadow_model(None, name)
+    return candidate
+
+
+def _resolve_path(name: str, path: Optional[str], version: Optional[str]) -> tuple:
+    """Model file inside ML_MODELS_DIR; anything else is refused, since loading a file unpickles it"""
+    models_dir = Path(settings.ML_MODELS_DIR).resolve()
+    entry = _read_manifest(models_dir).get(name, {})
+    if path is None:
+        path = entry.get("file", MODEL_FILES.get(name, f"{name}_model.pkl"))
+        version = version or entry.get("version")
+    resolved = (models_dir / path).resolve()
+    if not resolved.is_relative_to(models_dir):
+        raise ValueError(f"Model files must be inside {settings.ML_MODELS_DIR}")
+    return resolved, version
+
+
+def reload_model(name: str, path: str = None, version: str = None, shadow: bool = False,
+                 executor: ThreadPoolExecutor = None) -> Future:
+    """Load a model version in the background; it is activated (or shadowed) once fully loaded"""
+    path, version = _resolve_path(name, path, version)
+    if not path.exists():
+        raise ValueError(f"Model file not found: {path}")
+
+    def load():
+        model_version = load_model_version(name, path, version)
+        if shadow:
+            set_shadow_model(model_version)
+        else:
+            activate_model(model_version)
+        return model_version
+
+    return (executor or _get_executors()[0]).submit(load)
 
 
 async def load_ml_models():
     """Load ML models at startup"""
+    global _models_loaded
+    _models_loaded = True
     models_dir = Path(settings.ML_MODELS_DIR)
-    
+
     if not models_dir.exists():
         logger.warning(f"ML models directory not found: {models_dir}")
         return
-    
-    model_files = {
-        "eligibility": "eligibility_model.pkl",
-        "roi_prediction": "roi_model.pkl",
-        "angle_optimization": "angle_model.pkl",
-        "prequal": "prequal_model.pkl",
-    }
-    
-    for model_name, filename in model_files.items():
-        model_path = models_dir / filename
-        if model_path.exists():
-            try:
-                ml_models[model_name] = joblib.load(model_path)
-                logger.info(f"Loaded {model_name} model from {model_path}")
-            except Exception as e:
-                logger.error(f"Failed to load {model_name} model: {e}")
+
+    manifest = _read_manifest(models_dir)
+    pending = {}
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    # joblib/xgboost/catboost release the GIL for file reads and native deserialization
+    with ThreadPoolExecutor(max_workers=settings.ML_MODEL_LOAD_WORKERS, thread_name_prefix="model-startup") as pool:
+        for model_name in {**MODEL_FILES, **manifest}:
+            model_path, version = _resolve_path(model_name, None, None)
+            if model_path.exists():
+                pending[model_name] = reload_model(model_name, model_path, version, executor=pool)
+            else:
+                logger.warning(f"Model file not found: {model_path}")
+        results = await asyncio.gather(
+            *(asyncio.wrap_future(future) for future in pending.values()), return_exceptions=True,
+        )
+
+    for model_name, result in zip(pending, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to load {model_name} model: {result}")
         else:
-            logger.warning(f"Model file not found: {model_path}")
-    
+            logger.info(
+                f"Loaded {model_name} model {result.version} from {result.path} in {result.load_ms:.0f}ms "
+                f"({result.size_bytes / 2**20:.1f} MB file, +{result.rss_delta_bytes / 2**20:.1f} MB RSS, "
+                f"mmap={'on' if result.mmap else 'off'})"
+            )
+    if pending:
+        logger.info(
+            f"Loaded {len(pending)} models in {(time.perf_counter() - start) * 1000:.0f}ms, "
+            f"RSS {rss_before / 2**20:.0f} -> {_rss_bytes() / 2**20:.0f} MB"
+        )
+
     if not ml_models:
         logger.warning("No ML models loaded. Using mock predictions.")
 
 
+async def ensure_models_loaded():
+    """Load the registry once in processes without the API lifespan (Celery workers)"""
+    if not _models_loaded:
+        await load_ml_models()
+
+
+def _score_shadow(name: str, candidate: ModelVersion, features: np.ndarray, primary: np.ndarray):
+    stats = shadow_stats.get(name)
+    if stats is None or stats["version"] != candidate.version:
+        return
+    try:
+        shadow = np.asarray(candidate.model.predict_proba(features))
+    except Exception as e:
+        stats["errors"] += 1
+        logger.warning(f"Shadow {name} {candidate.version} failed: {e}")
+        return
+    stats["rows"] += len(features)
+    stats["agreement"] += int((shadow.argmax(axis=1) == primary.argmax(axis=1)).sum())
+    stats["sum_abs_diff"] += float(np.abs(shadow - primary).sum(axis=1).sum())
+
+
+def shadow_score(name: str, features, primary_output):
+    """Queue a sampled share of a batch for the shadow candidate; never blocks the caller"""
+    candidate = shadow_models.get(name)
+    if candidate is None or settings.MODEL_SHADOW_SAMPLE_RATE <= 0:
+        return
+    features = np.asarray(features)
+    primary = np.asarray(primary_output)
+    if settings.MODEL_SHADOW_SAMPLE_RATE < 1:
+        sampled = np.random.random(len(features)) < settings.MODEL_SHADOW_SAMPLE_RATE
+        if not sampled.any():
+            return
+        features, primary = features[sampled], primary[sampled]
+    _get_executors()[1].submit(_score_shadow, name, candidate, features, primary)
+
+
 def get_model(model_name: str):
-    """Get a loaded ML model"""
-    return ml_models.get(model_name)
+    """Get a loaded ML model (batched models are wrapped in a BatchingModel)"""
+    model = ml_models.get(model_name)
+    if model_name in BATCHED_MODELS:
+        return get_batching_model(
+            model_name, model, version=get_model_version(model_name),
+            after_batch=lambda features, output: shadow_score(model_name, features, output),
+        )
+    return model
+
+
+def get_model_version(model_name: str) -> Optional[str]:
+    """Version string of the active model, or None when it is not loaded"""
+    model_version = model_versions.get(model_name)
+    return model_version.version if model_version else None
+
+
+def get_active_version(model_name: str) -> Optional[ModelVersion]:
+    """Registry entry of the active model version"""
+    return model_versions.get(model_name)
+
+
+def get_registry_info() -> dict:
+    """Active and shadow versions per model, with shadow comparison metrics"""
+    info = {}
+    for name in sorted(set(model_versions) | set(shadow_models)):
+        active, candidate = model_versions.get(name), shadow_models.get(name)
+        stats = dict(shadow_stats.get(name, {})) if candidate else None
+        if stats:
+            rows = stats.pop("rows")
+            stats["rows"] = rows
+            stats["agreement_rate"] = round(stats.pop("agreement") / rows, 4) if rows else None
+            stats["mean_abs_diff"] = round(stats.pop("sum_abs_diff") / rows, 6) if rows else None
+        info[name] = {
+            "active": active.info() if active else None,
+            "shadow": {**candidate.info(), "stats": stats} if candidate else None,
+        }
+    return info
+
 
+def shutdown_model_loader():
+    """Stop the background loader and shadow threads (app shutdown)"""
+    global _loader, _shadow_executor
+    with _registry_lock:
+        for executor in (_loader, _shadow_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        _loader = _shadow_executor = None
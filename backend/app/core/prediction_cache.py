@@ -0,0 +1,119 @@
+"""
+Prediction Cache
+
+Model outputs keyed by (model name, model version, canonical feature hash):
+a bounded in-process LRU with TTL in front of Redis. The version is part of
+the key, so a registry swap makes old entries unreachable; local entries for
+the old version are also dropped eagerly, Redis entries expire by TTL.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from app.core.config import settings
+from app.core.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+_entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+_lock = threading.Lock()
+prediction_cache_stats = {"memory_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0}
+
+
+def feature_hash(features) -> str:
+    """Stable hash of model inputs (sorted keys, floats normalised)"""
+    if isinstance(features, dict):
+        canonical = {key: float(value) if isinstance(value, (int, float)) else value for key, value in features.items()}
+    else:
+        canonical = [float(value) for value in features]
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def cache_key(model_name: str, model_version: str, features) -> str:
+    return f"pred:{model_name}:{model_version}:{feature_hash(features)}"
+
+
+def _memory_get(key: str) -> Optional[dict]:
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return value
+
+
+def _memory_put(key: str, value: dict):
+    with _lock:
+        _entries[key] = (time.monotonic() + settings.PREDICTION_CACHE_TTL_SECONDS, value)
+        _entries.move_to_end(key)
+        while len(_entries) > settings.PREDICTION_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+async def get_cached_prediction(model_name: str, model_version: str, features) -> Tuple[Optional[dict], Optional[str]]:
+    """Cached output and where it came from ("memory" / "redis"), or (None, None)"""
+    if settings.PREDICTION_CACHE_TTL_SECONDS <= 0:
+        return None, None
+    key = cache_key(model_name, model_version, features)
+    value = _memory_get(key)
+    if value is not None:
+        prediction_cache_stats["memory_hits"] += 1
+        return value, "memory"
+
+    redis = await get_redis()
+    if redis is not None:
+        try:
+            cached = await redis.get(key)
+            if cached:
+                value = json.loads(cached)
+                _memory_put(key, value)
+                prediction_cache_stats["redis_hits"] += 1
+                return value, "redis"
+        except Exception as e:
+            logger.warning(f"Prediction cache read failed: {e}")
+
+    prediction_cache_stats["misses"] += 1
+    return None, None
+
+
+async def cache_prediction(model_name: str, model_version: str, features, value: dict):
+    """Store a model output in the LRU and Redis"""
+    if settings.PREDICTION_CACHE_TTL_SECONDS <= 0:
+        return
+    key = cache_key(model_name, model_version, features)
+    _memory_put(key, value)
+    redis = await get_redis()
+    if redis is not None:
+        try:
+            await redis.setex(key, settings.PREDICTION_CACHE_TTL_SECONDS, json.dumps(value))
+        except Exception as e:
+            logger.warning(f"Prediction cache write failed: {e}")
+
+
+def invalidate_model(model_name: str, keep_version: str = None):
+    """Drop local entries for a model (except `keep_version`), e.g. after a version swap"""
+    prefix = f"pred:{model_name}:"
+    keep = f"{prefix}{keep_version}:" if keep_version else None
+    with _lock:
+        stale = [key for key in _entries if key.startswith(prefix) and not (keep and key.startswith(keep))]
+        for key in stale:
+            del _entries[key]
+    prediction_cache_stats["invalidations"] += len(stale)
+
+
+def get_prediction_cache_stats() -> dict:
+    hits = prediction_cache_stats["memory_hits"] + prediction_cache_stats["redis_hits"]
+    lookups = hits + prediction_cache_stats["misses"]
+    return {
+        **prediction_cache_stats,
+        "entries": len(_entries),
+        "hit_ratio": round(hits / lookups, 4) if lookups else None,
+    }
@@ -37,4 +37,5 @@ async def close_redis():
     global redis_client
     if redis_client:
         await redis_client.close()
+        redis_client = None
 
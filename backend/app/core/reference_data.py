@@ -0,0 +1,186 @@
+"""
+Reference Data
+
+Process-wide, immutable snapshot of the calculation reference data
+(irradiation.csv, subsidy.json and the optional gridded irradiation index).
+Loaded once at startup, swapped atomically on reload, and watched for file changes.
+"""
+import asyncio
+import csv
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+from app.core.config import settings
+from app.core.irradiation_grid import GRID_FILE, META_FILE, PINCODE_FILE, IrradiationGrid, load_irradiation_grid
+from app.services.subsidy_engine import SubsidyRules, load_subsidy_rules
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Used when irradiation.csv is missing
+DEFAULT_IRRADIATION = {
+    "Maharashtra": 5.5,
+    "Gujarat": 5.8,
+    "Rajasthan": 6.0,
+    "Karnataka": 5.2,
+    "Tamil Nadu": 5.0,
+}
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    """Immutable reference data snapshot"""
+    irradiation: Mapping[str, float]
+    subsidy_rules: SubsidyRules
+    irradiation_grid: Optional[IrradiationGrid]
+    source_mtimes: Mapping[str, Optional[float]]
+    loaded_at: datetime = field(default_factory=datetime.utcnow)
+
+
+# Global snapshot and metrics
+_reference_data: Optional[ReferenceData] = None
+_load_lock = threading.Lock()
+_watcher_task: Optional[asyncio.Task] = None
+reference_data_stats: Dict[str, object] = {
+    "reload_count": 0,
+    "reload_failures": 0,
+    "last_load_ms": None,
+    "total_load_ms": 0.0,
+    "last_error": None,
+}
+
+
+def _data_files() -> Dict[str, Path]:
+    data_dir = Path(settings.DATA_DIR)
+    return {
+        "irradiation": data_dir / "irradiation.csv",
+        "subsidy": data_dir / "subsidy.json",
+        "irradiation_grid": data_dir / GRID_FILE,
+        "irradiation_grid_meta": data_dir / META_FILE,
+        "pincodes": data_dir / PINCODE_FILE,
+    }
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def _load_irradiation(path: Path) -> Dict[str, float]:
+    if not path.exists():
+        logger.warning(f"Irradiation data not found at {path}, using defaults")
+        return dict(DEFAULT_IRRADIATION)
+    with open(path, "r") as f:
+        reader = csv.DictReader(f)
+        return {row["state"]: float(row["irradiation"]) for row in reader}
+
+
+def _build() -> ReferenceData:
+    files = _data_files()
+    # Take mtimes before reading so a write during the load triggers another reload
+    mtimes = {name: _mtime(path) for name, path in files.items()}
+    return ReferenceData(
+        irradiation=MappingProxyType(_load_irradiation(files["irradiation"])),
+        subsidy_rules=load_subsidy_rules(files["subsidy"]),
+        irradiation_grid=load_irradiation_grid(Path(settings.DATA_DIR)),
+        source_mtimes=MappingProxyType(mtimes),
+    )
+
+
+def reload_reference_data() -> ReferenceData:
+    """Rebuild the snapshot from disk and swap it in; keeps the old snapshot on failure"""
+    global _reference_data
+    with _load_lock:
+        start = time.perf_counter()
+        try:
+            data = _build()
+        except Exception as e:
+            reference_data_stats["reload_failures"] += 1
+            reference_data_stats["last_error"] = str(e)
+            if _reference_data is None:
+                raise
+            logger.error(f"Reference data reload failed, keeping current snapshot: {e}")
+            return _reference_data
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _reference_data = data
+        reference_data_stats["reload_count"] += 1
+        reference_data_stats["last_load_ms"] = round(elapsed_ms, 3)
+        reference_data_stats["total_load_ms"] += elapsed_ms
+        reference_data_stats["last_error"] = None
+        logger.info(
+            f"Loaded reference data in {elapsed_ms:.1f}ms "
+            f"({len(data.irradiation)} irradiation rows, subsidy rules {data.subsidy_rules.version})"
+        )
+        return data
+
+
+def get_reference_data() -> ReferenceData:
+    """Get the current snapshot (loaded on first use outside the app, e.g. Celery workers)"""
+    if _reference_data is None:
+        return reload_reference_data()
+    return _reference_data
+
+
+def get_reference_data_stats() -> dict:
+    """Reload metrics plus a summary of the current snapshot"""
+    data = _reference_data
+    return {
+        **reference_data_stats,
+        "total_load_ms": round(reference_data_stats["total_load_ms"], 3),
+        "loaded_at": data.loaded_at if data else None,
+        "irradiation_locations": len(data.irradiation) if data else 0,
+        "subsidy_rules_version": data.subsidy_rules.version if data else None,
+        "irradiation_grid": (
+            {
+                "shape": list(data.irradiation_grid.shape),
+                "resolution": data.irradiation_grid.resolution,
+                "pincodes": len(data.irradiation_grid.pincode_cells),
+                "version": data.irradiation_grid.version,
+            }
+            if data and data.irradiation_grid else None
+        ),
+    }
+
+
+def _sources_changed() -> bool:
+    data = _reference_data
+    if data is None:
+        return True
+    return any(_mtime(path) != data.source_mtimes.get(name) for name, path in _data_files().items())
+
+
+async def _watch(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if _sources_changed():
+                logger.info("Reference data files changed, reloading")
+                await asyncio.to_thread(reload_reference_data)
+        except Exception as e:
+            logger.error(f"Reference data watcher error: {e}")
+
+
+async def load_reference_data():
+    """Load reference data at startup and start the file watcher"""
+    global _watcher_task
+    await asyncio.to_thread(reload_reference_data)
+    if settings.REFERENCE_DATA_WATCH_SECONDS > 0 and _watcher_task is None:
+        _watcher_task = asyncio.create_task(_watch(settings.REFERENCE_DATA_WATCH_SECONDS))
+
+
+async def stop_reference_data_watcher():
+    """Stop the file watcher (app shutdown)"""
+    global _watcher_task
+    if _watcher_task is not None:
+        _watcher_task.cancel()
+        try:
+            await _watcher_task
+        except asyncio.CancelledError:
+            pass
+        _watcher_task = None
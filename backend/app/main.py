@@ -15,8 +15,14 @@ from app.core.config import settings
 from app.core.database import init_db
 from app.core.logging_config import setup_logging
 from app.core.redis_client import init_redis
+from app.core.event_broker import shutdown_event_broker
 from app.core.s3_client import init_s3
-from app.core.ml_loader import load_ml_models
+from app.core.ml_loader import load_ml_models, shutdown_model_loader
+from app.core.inference_batcher import shutdown_batchers
+from app.core.inference_executor import InferenceTimeoutError, shutdown_inference_executor
+from app.core.reference_data import load_reference_data, stop_reference_data_watcher
+from app.services.calculation_service import shutdown_simulation_pool
+from app.services.explainer import shutdown_explain_pool
 from app.routers import (
     auth,
     loans,
@@ -49,10 +55,18 @@ async def lifespan(app: FastAPI):
     await init_redis()
     init_s3()  # S3 init is synchronous
     await load_ml_models()
+    await load_reference_data()
     logger.info("Backend started successfully")
     yield
     # Shutdown
     logger.info("Shutting down backend...")
+    await shutdown_event_broker()
+    await stop_reference_data_watcher()
+    shutdown_simulation_pool()
+    shutdown_explain_pool()
+    shutdown_batchers()
+    shutdown_inference_executor()
+    shutdown_model_loader()
 
 
 # Create FastAPI app
@@ -85,6 +99,16 @@ app.add_middleware(SecurityMiddleware)
 
 
 # Exception handlers
+@app.exception_handler(InferenceTimeoutError)
+async def inference_timeout_handler(request: Request, exc: InferenceTimeoutError):
+    """Model calls over their timeout are reported as temporarily unavailable"""
+    logger.warning(f"{request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
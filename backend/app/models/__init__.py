@@ -5,6 +5,7 @@ from app.models.kyc import KYCRecord, KYCTask
 from app.models.credit import CreditCheck
 from app.models.ai_prediction import AIPrediction, BatchJob
 from app.models.audit import AuditLog
+from app.models.workflow import WorkflowEvent
 
 __all__ = [
     "User",
@@ -16,5 +17,6 @@ __all__ = [
     "AIPrediction",
     "BatchJob",
     "AuditLog",
+    "WorkflowEvent",
 ]
 
@@ -0,0 +1,41 @@
+"""
+Workflow Event Model
+"""
+from sqlalchemy import Column, String, Numeric, DateTime, Text, ForeignKey, JSON, Enum, Integer, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+import enum
+from app.core.database import Base
+
+
+class WorkflowEventType(str, enum.Enum):
+    SUBMITTED = "submitted"
+    STEP_STARTED = "step_started"
+    STEP_COMPLETED = "step_completed"
+    STEP_FAILED = "step_failed"
+    COMPLETED = "completed"
+    REJECTED = "rejected"
+
+
+class WorkflowEvent(Base):
+    """Append-only log of a loan's workflow transitions"""
+    __tablename__ = "workflow_events"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    loan_application_id = Column(UUID(as_uuid=True), ForeignKey("loan_applications.id"), nullable=False)
+    
+    event = Column(Enum(WorkflowEventType), nullable=False)
+    step = Column(String(50), nullable=True)
+    status = Column(String(50), nullable=True)  # loan status the event stands for
+    attempt = Column(Integer, nullable=True)
+    duration_ms = Column(Numeric(12, 3), nullable=True)
+    error = Column(Text, nullable=True)
+    data = Column(JSON, nullable=True)
+    
+    # When the transition happened (events are buffered and written at the next step boundary)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_workflow_events_loan_application_id_created_at", "loan_application_id", "created_at"),
+    )
@@ -1,11 +1,21 @@
 """
 AI/ML Router
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.core.database import get_db
 from app.dependencies import get_current_user
 from app.services.ai_service import AIService
+from app.core.inference_batcher import get_inference_stats as batching_stats
+from app.core.inference_executor import get_inference_executor_stats
+from app.core.ml_loader import get_registry_info, promote_shadow, reload_model
+from app.core.prediction_cache import get_prediction_cache_stats
+from app.services import prequal_batch as prequal_batch_service
+from app.services.feature_service import ELIGIBILITY_SCHEMA
 from app.schemas.ai import (
     EligibilityRequest,
     EligibilityResponse,
@@ -22,10 +32,12 @@ from app.schemas.ai import (
     BatchScoreRequest,
     BatchScoreResponse,
     BatchScoreStatusResponse,
+    ModelReloadRequest,
+    ROIPredictionBatchRequest,
+    ROIPredictionBatchResponse,
 )
 from app.models.user import User
 from uuid import UUID
-from decimal import Decimal
 
 router = APIRouter()
 
@@ -72,6 +84,31 @@ async def predict_roi(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/roi-prediction/batch", response_model=ROIPredictionBatchResponse)
+async def predict_roi_batch(
+    batch_data: ROIPredictionBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Predict ROI for many systems in one vectorized pass"""
+    if len(batch_data.items) > settings.ROI_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch size exceeds limit of {settings.ROI_BATCH_MAX_ROWS} rows",
+        )
+    try:
+        results = await AIService.predict_roi_batch(db, [item.model_dump() for item in batch_data.items])
+        return ROIPredictionBatchResponse(
+            results=[
+                ROIPredictionResponse(loan_application_id=item.loan_application_id, **result)
+                for item, result in zip(batch_data.items, results)
+            ],
+            count=len(results),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.post("/angle-optimization", response_model=AngleOptimizationResponse)
 async def optimize_angle(
     angle_data: AngleOptimizationRequest,
@@ -107,7 +144,7 @@ async def prequal(
             db,
             prequal_data.annual_income,
             prequal_data.existing_loans,
-            prequal_data.credit_score or Decimal("700"),
+            prequal_data.credit_score,
             prequal_data.loan_amount,
             prequal_data.loan_tenure_years,
         )
@@ -116,6 +153,40 @@ async def prequal(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/prequal/batch")
+async def prequal_batch(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+):
+    """Prequalify a lead list (CSV body, or Parquet), streaming results back as CSV"""
+    content_type = request.headers.get("content-type", "text/csv").split(";")[0].strip().lower()
+    try:
+        if content_type in prequal_batch_service.PARQUET_CONTENT_TYPES:
+            # Parquet needs random access to its footer, so the body is spooled to disk first
+            upload = tempfile.SpooledTemporaryFile(max_size=16 * 2**20)
+            async for data in request.stream():
+                upload.write(data)
+            upload.seek(0)
+            batches = await asyncio.to_thread(prequal_batch_service.parquet_batches, upload)
+            results = prequal_batch_service.stream_parquet_results(batches)
+        elif content_type in prequal_batch_service.CSV_CONTENT_TYPES:
+            rows = prequal_batch_service.csv_rows(prequal_batch_service.iter_lines(request.stream()))
+            header = await prequal_batch_service.read_csv_header(rows)
+            results = prequal_batch_service.stream_csv_results(header, rows)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Upload text/csv or application/vnd.apache.parquet",
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return StreamingResponse(
+        results,
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=prequal_results.csv"},
+    )
+
+
 @router.post("/simulate", response_model=SimulateResponse)
 async def simulate(
     simulate_data: SimulateRequest,
@@ -152,13 +223,13 @@ async def explain(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 
-@router.post("/batch-score", response_model=BatchScoreResponse)
+@router.post("/batch-score", response_model=BatchScoreResponse, status_code=status.HTTP_202_ACCEPTED)
 async def batch_score(
     batch_data: BatchScoreRequest,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Batch score multiple loans"""
+    """Queue a batch scoring job; poll /batch-score/{job_id}/status for progress"""
     try:
         job = await AIService.batch_score(db, batch_data.loan_ids, batch_data.prediction_type)
         return BatchScoreResponse(
@@ -187,5 +258,90 @@ async def get_batch_score_status(
     if not job:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
     
-    return BatchScoreStatusResponse.model_validate(job)
+    return BatchScoreStatusResponse(
+        job_id=job.id,
+        status=job.status.value,
+        total_count=job.total_count or 0,
+        success_count=job.success_count or 0,
+        failed_count=job.failed_count or 0,
+        results=job.results,
+        failed_items=job.failed_items,
+        created_at=job.created_at,
+        completed_at=job.completed_at,
+    )
+
+
+
+@router.get("/inference-stats")
+async def get_inference_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Micro-batching metrics per model (queue depth, batch sizes, latency)"""
+    return batching_stats()
+
+
+@router.get("/inference-executor/stats")
+async def inference_executor_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Per-model queue wait and execution timing on the inference executor"""
+    return get_inference_executor_stats()
 
+
+@router.get("/feature-schema")
+async def feature_schema(
+    current_user: User = Depends(get_current_user),
+):
+    """Declared eligibility feature schema (column order of model inputs)"""
+    return ELIGIBILITY_SCHEMA.describe()
+
+
+@router.get("/prediction-cache/stats")
+async def prediction_cache_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Prediction cache hit/miss counts and hit ratio"""
+    return get_prediction_cache_stats()
+
+
+@router.get("/models")
+async def list_models(
+    current_user: User = Depends(get_current_user),
+):
+    """Active and shadow model versions"""
+    return get_registry_info()
+
+
+@router.post("/models/{model_name}/reload")
+async def reload_model_endpoint(
+    model_name: str,
+    reload_data: ModelReloadRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Load a model version in the background and swap it in (or install it as the shadow candidate)"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    try:
+        await asyncio.wrap_future(
+            reload_model(model_name, reload_data.path, reload_data.version, shadow=reload_data.shadow)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Model load failed: {e}")
+    return get_registry_info()[model_name]
+
+
+@router.post("/models/{model_name}/promote")
+async def promote_model(
+    model_name: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Promote the shadow candidate to the active version"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    try:
+        promote_shadow(model_name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return get_registry_info()[model_name]
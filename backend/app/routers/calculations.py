@@ -2,16 +2,26 @@
 Calculations Router
 """
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.core.database import get_db
 from app.dependencies import get_current_user
-from app.services.calculation_service import CalculationService
+from app.services.calculation_service import CalculationService, get_calculation_service
+from app.core.reference_data import get_reference_data_stats, reload_reference_data
 from app.models.user import User
 from decimal import Decimal
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, Union
+import asyncio
+import json
 
 router = APIRouter()
 
+# Rows buffered per streamed chunk
+STREAM_CHUNK_ROWS = 256
+AMORTIZATION_COLUMNS = ["schedule", "month", "payment", "principal", "interest", "balance"]
+
 
 class EMICalculationRequest(BaseModel):
     principal: Decimal
@@ -29,6 +39,114 @@ class EMICalculationResponse(BaseModel):
     tenure_months: int
 
 
+class EMIBatchRequest(BaseModel):
+    principals: List[float]
+    interest_rates: List[float]
+    tenure_years: List[int]
+
+
+class EMIBatchResponse(BaseModel):
+    emi_amount: List[float]
+    total_amount: List[float]
+    total_interest: List[float]
+    tenure_months: List[int]
+    count: int
+
+
+class EMIRateSolveRequest(BaseModel):
+    principals: List[float]
+    emi_amounts: List[float]
+    tenure_years: List[int]
+
+
+class EMIRateSolveResponse(BaseModel):
+    interest_rate: List[Optional[float]]
+    converged: List[bool]
+    iterations: int
+    count: int
+
+
+class EMITenureSolveRequest(BaseModel):
+    principals: List[float]
+    emi_amounts: List[float]
+    interest_rates: List[float]
+
+
+class EMITenureSolveResponse(BaseModel):
+    tenure_months: List[Optional[int]]
+    tenure_months_exact: List[Optional[float]]
+    feasible: List[bool]
+    count: int
+
+
+class IRRBatchRequest(BaseModel):
+    system_capacity_kw: List[float]
+    # One state for every row, or one per row
+    locations: Union[str, List[str]]
+    installation_costs: List[float]
+    subsidy_amounts: Optional[List[float]] = None
+    # Compute subsidies from the rules engine when subsidy_amounts is not given
+    apply_subsidy: bool = False
+    electricity_rate: float = 8.0
+    degradation_rate: float = 0.5
+    years: int = Field(25, ge=1, le=40)
+
+
+class IRRBatchResponse(BaseModel):
+    irr_percentage: List[Optional[float]]
+    converged: List[bool]
+    net_cost: List[float]
+    count: int
+    years: int
+
+
+class AmortizationExportRequest(BaseModel):
+    schedules: List[EMICalculationRequest]
+
+
+class DistributionSpec(BaseModel):
+    kind: Literal["fixed", "normal", "uniform", "triangular"]
+    mean: Optional[float] = None
+    sd: Optional[float] = None
+    low: Optional[float] = None
+    mode: Optional[float] = None
+    high: Optional[float] = None
+
+
+class ROIRiskRequest(BaseModel):
+    system_capacity_kw: Decimal
+    location: str
+    # Optional, resolved against the gridded irradiation index when installed
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    pincode: Optional[str] = None
+    installation_cost: Decimal
+    electricity_rate: Decimal = Decimal("8.0")
+    degradation_rate: Decimal = Decimal("0.5")
+    years: int = Field(25, ge=1, le=40)
+    paths: int = Field(10000, ge=100)
+    seed: Optional[int] = None
+    parallel: bool = False
+    # Keys: irradiation, degradation, tariff_escalation, downtime
+    distributions: Optional[Dict[str, DistributionSpec]] = None
+
+
+class ROIRiskResponse(BaseModel):
+    npv: Dict[str, float]
+    payback_period_years: Dict[str, float]
+    total_savings: Dict[str, float]
+    cumulative_savings: List[Dict[str, float]]
+    mean_npv: float
+    probability_of_payback: float
+    probability_npv_positive: float
+    paths: int
+    seed: int
+    distributions: Dict[str, Dict[str, Any]]
+    system_capacity_kw: Decimal
+    installation_cost: Decimal
+    years: int
+
+
 class SubsidyCalculationRequest(BaseModel):
     system_capacity_kw: Decimal
     state: str
@@ -42,6 +160,7 @@ class SubsidyCalculationResponse(BaseModel):
     system_capacity_kw: Decimal
     state: str
     system_type: str
+    rules_version: str
 
 
 @router.post("/emi", response_model=EMICalculationResponse)
@@ -62,6 +181,181 @@ async def calculate_emi(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/emi/batch", response_model=EMIBatchResponse)
+async def calculate_emi_batch(
+    batch_data: EMIBatchRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Calculate EMIs for many principal/rate/tenure combinations (columnar)"""
+    try:
+        result = await CalculationService.calculate_emi_batch(
+            batch_data.principals,
+            batch_data.interest_rates,
+            batch_data.tenure_years,
+        )
+        return EMIBatchResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/emi/solve-rate", response_model=EMIRateSolveResponse)
+async def solve_rate_for_emi(
+    solve_data: EMIRateSolveRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Find the interest rate that gives each target EMI"""
+    try:
+        result = await CalculationService.solve_rate_for_emi(
+            solve_data.principals,
+            solve_data.emi_amounts,
+            solve_data.tenure_years,
+        )
+        return EMIRateSolveResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/emi/solve-tenure", response_model=EMITenureSolveResponse)
+async def solve_tenure_for_emi(
+    solve_data: EMITenureSolveRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Find the tenure needed to repay each principal at a target EMI"""
+    try:
+        result = await CalculationService.solve_tenure_for_emi(
+            solve_data.principals,
+            solve_data.emi_amounts,
+            solve_data.interest_rates,
+        )
+        return EMITenureSolveResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.post("/irr", response_model=IRRBatchResponse)
+async def calculate_irr(
+    irr_data: IRRBatchRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Project IRR after subsidy for one or many systems"""
+    try:
+        result = await get_calculation_service().calculate_irr_batch(
+            irr_data.system_capacity_kw,
+            irr_data.locations,
+            irr_data.installation_costs,
+            subsidy_amounts=irr_data.subsidy_amounts,
+            apply_subsidy=irr_data.apply_subsidy,
+            electricity_rate=irr_data.electricity_rate,
+            degradation_rate=irr_data.degradation_rate,
+            years=irr_data.years,
+        )
+        return IRRBatchResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _stream_amortization(schedules: Iterable[Iterator[dict]], fmt: str) -> Iterator[str]:
+    """Serialize schedules as NDJSON or CSV, flushing every STREAM_CHUNK_ROWS rows"""
+    buffer = []
+    if fmt == "csv":
+        yield ",".join(AMORTIZATION_COLUMNS) + "\n"
+    for index, rows in enumerate(schedules):
+        for row in rows:
+            if fmt == "csv":
+                buffer.append(",".join(str(v) for v in (index, *row.values())))
+            else:
+                buffer.append(json.dumps({"schedule": index, **row}, default=str))
+            if len(buffer) >= STREAM_CHUNK_ROWS:
+                yield "\n".join(buffer) + "\n"
+                buffer.clear()
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+def _amortization_response(schedules: List[Iterator[dict]], fmt: str) -> StreamingResponse:
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _stream_amortization(schedules, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=amortization.{fmt}"},
+    )
+
+
+@router.post("/amortization")
+async def amortization_schedule(
+    emi_data: EMICalculationRequest,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: User = Depends(get_current_user),
+):
+    """Stream a month-by-month amortization schedule"""
+    try:
+        schedule = CalculationService.amortization_schedule(
+            emi_data.principal,
+            emi_data.interest_rate,
+            emi_data.tenure_years,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _amortization_response([schedule], format)
+
+
+@router.post("/amortization/export")
+async def amortization_export(
+    export_data: AmortizationExportRequest,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: User = Depends(get_current_user),
+):
+    """Stream amortization schedules for a portfolio of loans"""
+    if len(export_data.schedules) > settings.AMORTIZATION_EXPORT_MAX_SCHEDULES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Export exceeds limit of {settings.AMORTIZATION_EXPORT_MAX_SCHEDULES} schedules",
+        )
+    try:
+        # Generators are created (and validated) up front but rows are produced on demand
+        schedules = [
+            CalculationService.amortization_schedule(item.principal, item.interest_rate, item.tenure_years)
+            for item in export_data.schedules
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return _amortization_response(schedules, format)
+
+
+@router.post("/roi/risk", response_model=ROIRiskResponse)
+async def simulate_roi_risk(
+    risk_data: ROIRiskRequest,
+    current_user: User = Depends(get_current_user),
+):
+    """Monte Carlo ROI simulation with P10/P50/P90 bands"""
+    try:
+        calc_service = get_calculation_service()
+        distributions = None
+        if risk_data.distributions:
+            distributions = {
+                name: spec.model_dump(exclude_none=True)
+                for name, spec in risk_data.distributions.items()
+            }
+        result = await calc_service.simulate_roi_risk(
+            risk_data.system_capacity_kw,
+            risk_data.location,
+            risk_data.installation_cost,
+            risk_data.electricity_rate,
+            risk_data.degradation_rate,
+            risk_data.years,
+            paths=risk_data.paths,
+            seed=risk_data.seed,
+            distributions=distributions,
+            parallel=risk_data.parallel,
+            latitude=risk_data.latitude,
+            longitude=risk_data.longitude,
+            pincode=risk_data.pincode,
+        )
+        return ROIRiskResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.post("/subsidy", response_model=SubsidyCalculationResponse)
 async def calculate_subsidy(
     subsidy_data: SubsidyCalculationRequest,
@@ -70,7 +364,7 @@ async def calculate_subsidy(
 ):
     """Calculate subsidy"""
     try:
-        calc_service = CalculationService()
+        calc_service = get_calculation_service()
         result = await calc_service.calculate_subsidy(
             subsidy_data.system_capacity_kw,
             subsidy_data.state,
@@ -80,3 +374,21 @@ async def calculate_subsidy(
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
+
+@router.get("/reference-data")
+async def reference_data_status(
+    current_user: User = Depends(get_current_user),
+):
+    """Reference data snapshot summary and reload metrics"""
+    return get_reference_data_stats()
+
+
+@router.post("/reference-data/reload")
+async def reload_reference_data_endpoint(
+    current_user: User = Depends(get_current_user),
+):
+    """Reload irradiation and subsidy reference data from disk"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    await asyncio.to_thread(reload_reference_data)
+    return get_reference_data_stats()
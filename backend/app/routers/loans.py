@@ -1,16 +1,22 @@
 """
 Loan Router
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
+from app.core.event_broker import get_event_broker_stats
 from app.dependencies import get_current_user
+from app.services import loan_bulk
 from app.services.loan_service import LoanService
+from app.services.prequal_batch import CSV_CONTENT_TYPES, csv_rows, iter_lines, read_csv_header
 from app.schemas.loan import (
     LoanApplicationCreate,
     LoanApplicationUpdate,
     LoanApplicationResponse,
     LoanSubmitResponse,
+    BulkLoanImportResponse,
+    WorkflowEventResponse,
 )
 from app.models.user import User
 from uuid import UUID
@@ -33,6 +39,32 @@ async def create_loan(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.post("/bulk", response_model=BulkLoanImportResponse)
+async def bulk_import_loans(
+    request: Request,
+    submit: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Create loan applications from JSON lines or CSV, optionally submitting them"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    lines = iter_lines(request.stream())
+    try:
+        if content_type in loan_bulk.JSONL_CONTENT_TYPES:
+            records = loan_bulk.jsonl_records(lines)
+        elif content_type in CSV_CONTENT_TYPES:
+            rows = csv_rows(lines)
+            records = loan_bulk.csv_records(await read_csv_header(rows, loan_bulk.validate_header), rows)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Upload application/x-ndjson or text/csv",
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return await loan_bulk.import_loans(db, current_user.id, records, submit=submit)
+
+
 @router.get("", response_model=List[LoanApplicationResponse])
 async def list_loans(
     skip: int = 0,
@@ -45,6 +77,14 @@ async def list_loans(
     return [LoanApplicationResponse.model_validate(loan) for loan in loans]
 
 
+@router.get("/event-streams/stats")
+async def event_stream_stats(
+    current_user: User = Depends(get_current_user),
+):
+    """Open workflow event streams and fan-out counters on this worker"""
+    return get_event_broker_stats()
+
+
 @router.get("/{loan_id}", response_model=LoanApplicationResponse)
 async def get_loan(
     loan_id: UUID,
@@ -74,25 +114,59 @@ async def update_loan(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 
-@router.post("/{loan_id}/submit", response_model=LoanSubmitResponse)
+@router.post("/{loan_id}/submit", response_model=LoanSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
 async def submit_loan(
     loan_id: UUID,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Submit loan application and trigger workflow"""
+    """Submit loan application; the workflow runs in the background (poll GET /{loan_id})"""
     try:
         loan = await LoanService.submit_loan(db, loan_id, current_user.id)
         return LoanSubmitResponse(
             loan_id=loan.id,
             status=loan.status,
-            message="Loan application submitted successfully",
+            message="Loan application submitted; processing has started",
             workflow_steps=loan.workflow_data.get("steps", []) if loan.workflow_data else [],
         )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
+@router.get("/{loan_id}/workflow-events", response_model=List[WorkflowEventResponse])
+async def get_workflow_events(
+    loan_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Workflow event log of a loan application"""
+    try:
+        events = await LoanService.get_workflow_events(db, loan_id, current_user.id)
+        return [WorkflowEventResponse.model_validate(event) for event in events]
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+@router.get("/{loan_id}/events")
+async def stream_loan_events(
+    loan_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Live workflow progress as Server-Sent Events"""
+    try:
+        await LoanService.get_loan(db, loan_id, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    # The stream outlives the request's session; release its connection now
+    await db.close()
+    return StreamingResponse(
+        LoanService.event_stream(db.bind, loan_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/{loan_id}/disburse", status_code=status.HTTP_200_OK)
 async def disburse_loan(
     loan_id: UUID,
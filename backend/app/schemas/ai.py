@@ -1,7 +1,7 @@
 """
 AI/ML Schemas
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from uuid import UUID
@@ -42,6 +42,22 @@ class ROIPredictionResponse(BaseModel):
     created_at: datetime
 
 
+class ROIPredictionBatchItem(BaseModel):
+    loan_application_id: UUID
+    system_capacity_kw: Decimal
+    location: str
+    roof_angle: Optional[Decimal] = None
+
+
+class ROIPredictionBatchRequest(BaseModel):
+    items: List[ROIPredictionBatchItem] = Field(..., min_length=1)
+
+
+class ROIPredictionBatchResponse(BaseModel):
+    results: List[ROIPredictionResponse]
+    count: int
+
+
 class AngleOptimizationRequest(BaseModel):
     loan_application_id: UUID
     latitude: Decimal
@@ -54,6 +70,8 @@ class AngleOptimizationResponse(BaseModel):
     optimal_angle: Decimal
     optimal_azimuth: Decimal
     expected_efficiency_gain: Decimal
+    annual_irradiation: Optional[Decimal] = None  # kWh/m²/day at the location
+    annual_poa_kwh_m2: Optional[Decimal] = None  # plane-of-array irradiation at the optimum
     prediction_id: UUID
     created_at: datetime
 
@@ -72,7 +90,7 @@ class PrequalResponse(BaseModel):
     recommended_tenure: int
     confidence: Decimal
     reasons: List[str]
-    created_at: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class SimulateRequest(BaseModel):
@@ -82,9 +100,10 @@ class SimulateRequest(BaseModel):
 
 class SimulateResponse(BaseModel):
     loan_application_id: UUID
-    scenarios: List[Dict[str, Any]]
-    best_scenario: Dict[str, Any]
-    created_at: datetime
+    scenarios: List[Dict[str, Any]]  # Pareto front ranked by EMI (lowest first)
+    best_scenario: Dict[str, Any]  # Highest NPV on the front
+    grid_size: int
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class ExplainRequest(BaseModel):
@@ -124,3 +143,8 @@ class BatchScoreStatusResponse(BaseModel):
     created_at: datetime
     completed_at: Optional[datetime] = None
 
+
+class ModelReloadRequest(BaseModel):
+    path: Optional[str] = None  # file in ML_MODELS_DIR; defaults to the manifest / standard file
+    version: Optional[str] = None
+    shadow: bool = False
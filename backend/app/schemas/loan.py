@@ -82,3 +82,32 @@ class LoanSubmitResponse(BaseModel):
     message: str
     workflow_steps: list[str]
 
+
+class BulkLoanRowResult(BaseModel):
+    row: int
+    loan_id: Optional[UUID] = None
+    status: Optional[LoanStatus] = None
+    error: Optional[str] = None
+
+
+class BulkLoanImportResponse(BaseModel):
+    created: int
+    failed: int
+    submitted: bool
+    results: list[BulkLoanRowResult]
+
+
+
+class WorkflowEventResponse(BaseModel):
+    id: UUID
+    event: str
+    step: Optional[str] = None
+    status: Optional[str] = None
+    attempt: Optional[int] = None
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    data: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
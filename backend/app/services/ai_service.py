@@ -1,21 +1,67 @@
 """
 AI/ML Service
 """
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import insert, select, update
 from app.models.ai_prediction import AIPrediction, BatchJob, PredictionType, BatchJobStatus
 from app.models.loan import LoanApplication
-from app.core.ml_loader import get_model
+from app.core.ml_loader import get_active_version, get_model, get_model_version
+from app.core.inference_executor import run_model
+from app.core.prediction_cache import cache_prediction, get_cached_prediction
+from app.core.reference_data import get_reference_data
 from app.core.config import settings
+from app.services.calculation_service import get_calculation_service, pareto_front
+from app.services.angle_optimizer import MODEL_VERSION as ANGLE_MODEL_VERSION, get_optimal_orientation
+from app.services.explainer import describe, explain_artifact, explain_matrix, shap_rows
+from app.services.feature_service import ELIGIBILITY_SCHEMA, ROI_SCHEMA, load_loan_features
+from app.services.prequal_batch import score_leads
 from datetime import datetime
-from uuid import UUID
+from typing import Optional
+from uuid import UUID, uuid4
 from decimal import Decimal
+import asyncio
 import json
+import time
+from pathlib import Path
 import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Scenario grid axes and the loan attribute each one defaults to
+SCENARIO_AXES = ("system_capacity_kw", "loan_tenure_years", "interest_rate", "down_payment")
+DEFAULT_COST_PER_KW = 60000.0
+DEFAULT_INTEREST_RATE = 8.5
+ROI_ELECTRICITY_RATE = 8.0
+ROI_DEGRADATION_RATE = 0.5
+
+ELIGIBILITY_THRESHOLD = 60.0
+MOCK_ELIGIBILITY_SCORE = 75.0
+MOCK_SHAP_VALUES = {
+    "annual_income": 0.25,
+    "loan_amount": -0.15,
+    "existing_loans": -0.10,
+    "credit_score": 0.20,
+}
+
+# Background explanation tasks (kept referenced until they finish)
+_explanation_tasks: set = set()
+
+
+def _explanation_columns(shap_values: dict) -> dict:
+    """AIPrediction column values for one row of SHAP values"""
+    importance, _ = describe(shap_values)
+    return {"shap_values": json.dumps(shap_values), "feature_importance": importance}
+
+
+def _eligibility_result(eligibility_score: float) -> dict:
+    is_eligible = eligibility_score >= ELIGIBILITY_THRESHOLD
+    return {
+        "eligibility_score": eligibility_score,
+        "is_eligible": is_eligible,
+        "reasons": ["Income sufficient", "Good credit history"] if is_eligible else ["Insufficient income"],
+    }
+
 
 class AIService:
     """AI/ML prediction service"""
@@ -25,66 +71,134 @@ class AIService:
         db: AsyncSession,
         loan_application_id: UUID,
         features: dict = None,
+        explain_inline: bool = False,
+        commit: bool = True,
     ) -> dict:
-        """Check loan eligibility using AI"""
-        # Get loan application
-        result = await db.execute(
-            select(LoanApplication).where(LoanApplication.id == loan_application_id)
-        )
-        loan = result.scalar_one_or_none()
-        if not loan:
+        """Check loan eligibility using AI; workflow steps explain inline and leave the commit to their checkpoint"""
+        # Get loan application with its credit and KYC features
+        loan_features = await load_loan_features(db, [loan_application_id])
+        if loan_application_id not in loan_features:
             raise ValueError("Loan application not found")
+        loan, assembled = loan_features[loan_application_id]
         
-        # Prepare features
-        if not features:
-            features = {
-                "annual_income": float(loan.annual_income or 0),
-                "loan_amount": float(loan.loan_amount),
-                "existing_loans": float(loan.existing_loans or 0),
-                "loan_tenure_years": loan.loan_tenure_years or 5,
-                "system_capacity_kw": float(loan.system_capacity_kw or 0),
-            }
+        # Caller-supplied values override the assembled ones
+        features = ELIGIBILITY_SCHEMA.row({**assembled, **(features or {})})
         
         # Get model
         model = get_model("eligibility")
+        start = time.perf_counter()
+        cache_source = None
+        created_at = datetime.utcnow()
+        scored_at = created_at
         
         if model and not settings.USE_MOCKS:
-            # Use real model
-            feature_array = np.array([[features.get("annual_income", 0), features.get("loan_amount", 0)]])
-            prediction = model.predict_proba(feature_array)[0]
-            eligibility_score = float(prediction[1] * 100)
-            is_eligible = eligibility_score >= 60
+            # Use real model; identical inputs for the same model version are served from the cache
+            model_inputs = ELIGIBILITY_SCHEMA.matrix([features], ELIGIBILITY_SCHEMA.model_columns(model))[0].tolist()
+            cached, cache_source = await get_cached_prediction("eligibility", model.version, model_inputs)
+            if cached:
+                eligibility_score, model_version = cached["eligibility_score"], cached["model_version"]
+                # A cached score keeps the time it was computed (entries cached before it was recorded get now)
+                if cached.get("scored_at"):
+                    scored_at = datetime.fromisoformat(cached["scored_at"])
+            else:
+                # Queued and scored with other concurrent requests in the batcher's worker thread
+                prediction, model_version = await model.apredict_proba_versioned(model_inputs)
+                eligibility_score = float(prediction[1] * 100)
+                await cache_prediction(
+                    "eligibility", model_version, model_inputs,
+                    {"eligibility_score": eligibility_score, "model_version": model_version, "scored_at": scored_at.isoformat()},
+                )
         else:
             # Mock prediction
-            eligibility_score = 75.0
-            is_eligible = True
+            eligibility_score = MOCK_ELIGIBILITY_SCORE
+            model_version = "mock"
+        outcome = _eligibility_result(eligibility_score)
         
-        # Create prediction record
+        # Audit record (id assigned client-side, so no refresh round-trip)
         prediction = AIPrediction(
+            id=uuid4(),
             loan_application_id=loan_application_id,
             user_id=loan.user_id,
             prediction_type=PredictionType.ELIGIBILITY,
             model_name="eligibility_model",
+            model_version=model_version,
             input_features=features,
-            prediction_result={
-                "eligibility_score": eligibility_score,
-                "is_eligible": is_eligible,
-                "reasons": ["Income sufficient", "Good credit history"] if is_eligible else ["Insufficient income"],
-            },
-            confidence_score=Decimal(str(eligibility_score)),
+            prediction_result=outcome,
+            confidence_score=Decimal(str(round(eligibility_score, 2))),
+            processing_time_ms=Decimal(str(round((time.perf_counter() - start) * 1000, 2))),
+            meta_data={"cache": cache_source} if cache_source else None,
+            created_at=created_at,
         )
         db.add(prediction)
-        await db.commit()
-        await db.refresh(prediction)
+        if explain_inline and model and model_version == model.version:
+            # No background tasks or process pool here: the worker's loop ends with the step
+            try:
+                columns = ELIGIBILITY_SCHEMA.model_columns(model)
+                values = await asyncio.to_thread(
+                    explain_matrix, model.model, np.asarray([model_inputs], dtype=np.float32), ("eligibility", model_version),
+                )
+                for key, value in _explanation_columns(shap_rows(columns, values)[0]).items():
+                    setattr(prediction, key, value)
+            except Exception as e:
+                logger.warning(f"Explaining prediction {prediction.id} failed: {e}")
+        if commit:
+            await db.commit()
+            if model_version != "mock" and not explain_inline:
+                AIService.schedule_explanations(db, [prediction.id])
         
         return {
-            "eligibility_score": eligibility_score,
-            "is_eligible": is_eligible,
-            "reasons": prediction.prediction_result.get("reasons", []),
+            **outcome,
             "confidence": float(eligibility_score),
             "prediction_id": str(prediction.id),
+            "created_at": scored_at,
         }
     
+    @staticmethod
+    def schedule_explanations(db: AsyncSession, prediction_ids: list[UUID]):
+        """Compute and store SHAP values in the background, in a session of its own"""
+        session_factory = async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+        
+        async def run():
+            try:
+                async with session_factory() as session:
+                    await AIService.explain_predictions(session, prediction_ids)
+            except Exception as e:
+                logger.warning(f"Explaining {len(prediction_ids)} predictions failed: {e}")
+        
+        task = asyncio.create_task(run())
+        _explanation_tasks.add(task)
+        task.add_done_callback(_explanation_tasks.discard)
+    
+    @staticmethod
+    async def explain_predictions(db: AsyncSession, prediction_ids: list[UUID]) -> int:
+        """Batch-explain eligibility predictions made by the active model version; returns rows updated"""
+        active = get_active_version("eligibility")
+        if active is None or not Path(active.path).exists():
+            return 0
+        result = await db.execute(
+            select(AIPrediction.id, AIPrediction.input_features).where(
+                AIPrediction.id.in_(prediction_ids),
+                AIPrediction.prediction_type == PredictionType.ELIGIBILITY,
+                AIPrediction.model_version == active.version,
+                AIPrediction.shap_values.is_(None),
+            )
+        )
+        pending = result.all()
+        if not pending:
+            return 0
+        
+        start = time.perf_counter()
+        columns = ELIGIBILITY_SCHEMA.model_columns(active.model)
+        matrix = ELIGIBILITY_SCHEMA.matrix([features or {} for _, features in pending], columns)
+        values = await explain_artifact(active.path, active.version, matrix)
+        await db.execute(update(AIPrediction), [
+            {"id": prediction_id, **_explanation_columns(row)}
+            for (prediction_id, _), row in zip(pending, shap_rows(columns, values))
+        ])
+        await db.commit()
+        logger.info(f"Explained {len(pending)} predictions in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return len(pending)
+    
     @staticmethod
     async def predict_roi(
         db: AsyncSession,
@@ -94,45 +208,97 @@ class AIService:
         roof_angle: Decimal = None,
     ) -> dict:
         """Predict ROI for solar system"""
-        # Mock ROI prediction
-        # In production, use actual ML model with location, capacity, angle, etc.
-        predicted_roi = Decimal("18.5")
-        npv = Decimal("250000")
-        payback_period = Decimal("5.5")
-        total_savings = Decimal("500000")
-        degradation_rate = Decimal("0.5")
+        results = await AIService.predict_roi_batch(db, [{
+            "loan_application_id": loan_application_id,
+            "system_capacity_kw": system_capacity_kw,
+            "location": location,
+            "roof_angle": roof_angle,
+        }])
+        return results[0]
+    
+    @staticmethod
+    async def predict_roi_batch(db: AsyncSession, items: list[dict]) -> list[dict]:
+        """Vectorized ROI for many (loan, capacity, location, roof angle) rows, written back in bulk"""
+        start = time.perf_counter()
+        loan_ids = [item["loan_application_id"] for item in items]
+        result = await db.execute(
+            select(LoanApplication.id, LoanApplication.user_id, LoanApplication.estimated_cost)
+            .where(LoanApplication.id.in_(loan_ids))
+        )
+        loans = {row.id: row for row in result.all()}
+        missing = [str(loan_id) for loan_id in loan_ids if loan_id not in loans]
+        if missing:
+            raise ValueError(f"Loan application not found: {', '.join(missing[:10])}")
         
-        prediction = AIPrediction(
-            loan_application_id=loan_application_id,
-            user_id=None,  # Will be set from loan
-            prediction_type=PredictionType.ROI_PREDICTION,
-            model_name="roi_model",
-            input_features={
-                "system_capacity_kw": float(system_capacity_kw),
-                "location": location,
-                "roof_angle": float(roof_angle) if roof_angle else None,
-            },
-            prediction_result={
-                "predicted_roi": float(predicted_roi),
-                "npv": float(npv),
-                "payback_period_years": float(payback_period),
-                "total_savings_25_years": float(total_savings),
-                "degradation_rate": float(degradation_rate),
-            },
-            confidence_score=Decimal("85.0"),
+        capacity = np.array([float(item["system_capacity_kw"]) for item in items])
+        if (capacity <= 0).any():
+            raise ValueError("system_capacity_kw must be positive")
+        locations = [item["location"] for item in items]
+        roof_angle = np.array([
+            np.nan if item.get("roof_angle") is None else float(item["roof_angle"]) for item in items
+        ])
+        installation_cost = np.array([
+            float(loans[loan_id].estimated_cost) if loans[loan_id].estimated_cost else DEFAULT_COST_PER_KW * kw
+            for loan_id, kw in zip(loan_ids, capacity.tolist())
+        ])
+        
+        calc_service = get_calculation_service()
+        irradiation = calc_service.irradiation_for(locations)
+        model = get_model("roi_prediction")
+        if model is not None and not settings.USE_MOCKS:
+            # The model predicts annual yield (kWh per kW); financials come from the deterministic engine
+            matrix = ROI_SCHEMA.column_matrix(
+                {"system_capacity_kw": capacity, "irradiation": np.asarray(irradiation, dtype=np.float64), "roof_angle": roof_angle},
+                len(items),
+            )
+            specific_yield = np.asarray(await run_model("roi_prediction", model, "predict", matrix), dtype=np.float64)
+            irradiation = specific_yield / 365
+            model_name, model_version = "roi_model", get_model_version("roi_prediction") or "unversioned"
+        else:
+            model_name, model_version = "roi_engine", "engine"
+        
+        summary = await calc_service.calculate_roi_batch(
+            capacity, locations, installation_cost, ROI_ELECTRICITY_RATE, ROI_DEGRADATION_RATE,
+            irradiation=irradiation,
         )
-        db.add(prediction)
-        await db.commit()
-        await db.refresh(prediction)
+        created_at = datetime.utcnow()
+        processing_ms = Decimal(str(round((time.perf_counter() - start) * 1000 / len(items), 2)))
         
-        return {
-            "predicted_roi": float(predicted_roi),
-            "npv": float(npv),
-            "payback_period_years": float(payback_period),
-            "total_savings_25_years": float(total_savings),
-            "degradation_rate": float(degradation_rate),
-            "prediction_id": str(prediction.id),
-        }
+        predictions, loan_updates, results = [], [], []
+        for i, item in enumerate(items):
+            outcome = {
+                "predicted_roi": summary["roi_percentage"][i],
+                "npv": summary["npv"][i],
+                "payback_period_years": float(summary["payback_period_years"][i]),
+                "total_savings_25_years": summary["total_savings"][i],
+                "degradation_rate": ROI_DEGRADATION_RATE,
+            }
+            prediction_id = uuid4()
+            predictions.append({
+                "id": prediction_id,
+                "loan_application_id": loan_ids[i],
+                "user_id": loans[loan_ids[i]].user_id,
+                "prediction_type": PredictionType.ROI_PREDICTION,
+                "model_name": model_name,
+                "model_version": model_version,
+                "input_features": {
+                    "system_capacity_kw": float(capacity[i]),
+                    "location": locations[i],
+                    "roof_angle": None if np.isnan(roof_angle[i]) else float(roof_angle[i]),
+                    "irradiation": round(float(irradiation[i]), 4),
+                },
+                "prediction_result": outcome,
+                "processing_time_ms": processing_ms,
+                "created_at": created_at,
+            })
+            loan_updates.append({"id": loan_ids[i], "roi_prediction": {**outcome, "model_version": model_version}})
+            results.append({**outcome, "prediction_id": str(prediction_id), "created_at": created_at})
+        
+        # One multi-row INSERT for the audit rows and one executemany UPDATE for the loans
+        await db.execute(insert(AIPrediction), predictions)
+        await db.execute(update(LoanApplication), loan_updates)
+        await db.commit()
+        return results
     
     @staticmethod
     async def optimize_angle(
@@ -142,27 +308,29 @@ class AIService:
         longitude: Decimal,
         roof_area_sqft: Decimal,
     ) -> dict:
-        """Optimize solar panel angle"""
-        # Mock optimization
-        optimal_angle = Decimal("25.0")
-        optimal_azimuth = Decimal("180.0")
-        efficiency_gain = Decimal("12.5")
+        """Optimize panel tilt/azimuth for the location (memoized by rounded coordinates)"""
+        result = await db.execute(
+            select(LoanApplication.user_id).where(LoanApplication.id == loan_application_id)
+        )
+        user_id = result.scalar_one_or_none()
+        if not user_id:
+            raise ValueError("Loan application not found")
+        
+        orientation = await get_optimal_orientation(float(latitude), float(longitude))
         
         prediction = AIPrediction(
             loan_application_id=loan_application_id,
-            user_id=None,
+            user_id=user_id,
             prediction_type=PredictionType.ANGLE_OPTIMIZATION,
-            model_name="angle_model",
+            model_name="solar_geometry",
+            model_version=ANGLE_MODEL_VERSION,
             input_features={
                 "latitude": float(latitude),
                 "longitude": float(longitude),
                 "roof_area_sqft": float(roof_area_sqft),
+                "irradiation_source": orientation["irradiation_source"],
             },
-            prediction_result={
-                "optimal_angle": float(optimal_angle),
-                "optimal_azimuth": float(optimal_azimuth),
-                "expected_efficiency_gain": float(efficiency_gain),
-            },
+            prediction_result=orientation,
             confidence_score=Decimal("90.0"),
         )
         db.add(prediction)
@@ -170,10 +338,13 @@ class AIService:
         await db.refresh(prediction)
         
         return {
-            "optimal_angle": float(optimal_angle),
-            "optimal_azimuth": float(optimal_azimuth),
-            "expected_efficiency_gain": float(efficiency_gain),
+            "optimal_angle": orientation["optimal_angle"],
+            "optimal_azimuth": orientation["optimal_azimuth"],
+            "expected_efficiency_gain": orientation["expected_efficiency_gain"],
+            "annual_irradiation": orientation["annual_irradiation"],
+            "annual_poa_kwh_m2": orientation["annual_poa_kwh_m2"],
             "prediction_id": str(prediction.id),
+            "created_at": prediction.created_at,
         }
     
     @staticmethod
@@ -181,46 +352,153 @@ class AIService:
         db: AsyncSession,
         annual_income: Decimal,
         existing_loans: Decimal,
-        credit_score: Decimal,
+        credit_score: Optional[Decimal],
         loan_amount: Decimal,
         loan_tenure_years: int,
     ) -> dict:
         """Prequalify loan"""
-        # Simple prequal logic
-        debt_to_income = float(existing_loans / annual_income) if annual_income > 0 else 1.0
-        is_prequalified = debt_to_income < 0.4 and float(credit_score) >= 650
-        max_loan_amount = annual_income * Decimal("0.3") if is_prequalified else Decimal("0")
+        # One-row case of the vectorized lead scoring used by /prequal/batch
+        scores = await asyncio.to_thread(score_leads, {
+            "annual_income": np.array([float(annual_income)]),
+            "existing_loans": np.array([float(existing_loans)]),
+            # Missing: score_leads fills in DEFAULT_CREDIT_SCORE, like the batch and eligibility paths
+            "credit_score": np.array([np.nan if credit_score is None else float(credit_score)]),
+            "loan_amount": np.array([float(loan_amount)]),
+            "loan_tenure_years": np.array([float(loan_tenure_years)]),
+        })
+        is_prequalified = bool(scores["is_prequalified"][0])
+        max_loan_amount = float(scores["max_loan_amount"][0])
+        confidence = float(scores["confidence"][0])
         
         return {
             "is_prequalified": is_prequalified,
-            "max_loan_amount": float(max_loan_amount),
+            "max_loan_amount": max_loan_amount,
             "recommended_tenure": loan_tenure_years,
-            "confidence": 85.0,
+            "confidence": round(confidence, 2),
             "reasons": ["Meets income requirements", "Good credit score"] if is_prequalified else ["High debt-to-income ratio"],
         }
     
+    @staticmethod
+    def _build_scenario_grid(scenarios: list, defaults: dict) -> dict:
+        """Expand each scenario (scalar or list per axis) into a flattened capacity x tenure x rate x down payment grid"""
+        columns = {axis: [] for axis in SCENARIO_AXES + ("cost_per_kw", "electricity_rate", "scenario_index")}
+        total = 0
+        for index, scenario in enumerate(scenarios or [{}]):
+            unknown = set(scenario) - set(SCENARIO_AXES) - {"cost_per_kw", "electricity_rate"}
+            if unknown:
+                raise ValueError(f"Unknown scenario parameters: {sorted(unknown)}")
+            axes = [np.atleast_1d(np.asarray(scenario.get(axis, defaults[axis]), dtype=np.float64)) for axis in SCENARIO_AXES]
+            total += int(np.prod([a.size for a in axes]))
+            if total > settings.SIMULATION_MAX_CELLS:
+                raise ValueError(f"Scenario grid exceeds {settings.SIMULATION_MAX_CELLS} cells")
+            mesh = np.meshgrid(*axes, indexing="ij")
+            for axis, values in zip(SCENARIO_AXES, mesh):
+                columns[axis].append(values.ravel())
+            size = mesh[0].size
+            for key in ("cost_per_kw", "electricity_rate"):
+                columns[key].append(np.full(size, float(scenario.get(key, defaults[key]))))
+            columns["scenario_index"].append(np.full(size, index))
+        
+        grid = {key: np.concatenate(values) for key, values in columns.items()}
+        if (grid["system_capacity_kw"] <= 0).any() or (grid["loan_tenure_years"] <= 0).any():
+            raise ValueError("system_capacity_kw and loan_tenure_years must be positive")
+        if (grid["loan_tenure_years"] != np.floor(grid["loan_tenure_years"])).any():
+            raise ValueError("loan_tenure_years must be whole years")
+        grid["loan_tenure_years"] = grid["loan_tenure_years"].astype(np.int64)
+        return grid
+    
+    @staticmethod
+    def evaluate_scenarios(grid: dict, state: str, max_results: int = None) -> dict:
+        """Evaluate a scenario grid and rank its Pareto front (lowest EMI vs highest NPV)"""
+        calc_service = get_calculation_service()
+        evaluated = calc_service.evaluate_scenario_grid(
+            grid["system_capacity_kw"],
+            grid["loan_tenure_years"],
+            grid["interest_rate"],
+            grid["down_payment"],
+            state,
+            grid["cost_per_kw"],
+            grid["electricity_rate"],
+        )
+        front = pareto_front(evaluated["emi"], evaluated["npv"])
+        if max_results:
+            # Thin long fronts evenly so both extremes are always kept
+            if front.size > max_results:
+                front = front[np.unique(np.linspace(0, front.size - 1, max_results).round().astype(int))]
+        
+        results = []
+        for rank, i in enumerate(front.tolist(), start=1):
+            results.append({
+                "rank": rank,
+                "scenario_index": int(grid["scenario_index"][i]),
+                "system_capacity_kw": float(grid["system_capacity_kw"][i]),
+                "loan_tenure_years": int(grid["loan_tenure_years"][i]),
+                "interest_rate": float(grid["interest_rate"][i]),
+                "down_payment": float(grid["down_payment"][i]),
+                "installation_cost": round(float(evaluated["installation_cost"][i]), 2),
+                "subsidy_amount": round(float(evaluated["subsidy_amount"][i]), 2),
+                "loan_amount": round(float(evaluated["principal"][i]), 2),
+                "emi": round(float(evaluated["emi"][i]), 2),
+                "total_cost": round(float(evaluated["principal"][i] + evaluated["total_interest"][i] + grid["down_payment"][i]), 2),
+                "npv": round(float(evaluated["npv"][i]), 2),
+                "predicted_roi": round(float(evaluated["roi_percentage"][i]), 2),
+                "payback_period_years": int(evaluated["payback_period_years"][i]),
+            })
+        return {"results": results, "grid_size": int(evaluated["emi"].size)}
+    
     @staticmethod
     async def simulate(
         db: AsyncSession,
         loan_application_id: UUID,
         scenarios: list,
     ) -> dict:
-        """Simulate different loan scenarios"""
-        results = []
-        for scenario in scenarios:
-            # Mock simulation
-            results.append({
-                **scenario,
-                "predicted_roi": 18.5,
-                "emi": 5000,
-                "total_cost": 200000,
-            })
+        """Simulate loan scenarios over a parameter grid and return the EMI/NPV Pareto front"""
+        result = await db.execute(
+            select(LoanApplication).where(LoanApplication.id == loan_application_id)
+        )
+        loan = result.scalar_one_or_none()
+        if not loan:
+            raise ValueError("Loan application not found")
+        
+        capacity = float(loan.system_capacity_kw or 0) or 3.0
+        defaults = {
+            "system_capacity_kw": capacity,
+            "loan_tenure_years": loan.loan_tenure_years or 5,
+            "interest_rate": float(loan.interest_rate or DEFAULT_INTEREST_RATE),
+            "down_payment": 0.0,
+            "cost_per_kw": float(loan.estimated_cost) / capacity if loan.estimated_cost else DEFAULT_COST_PER_KW,
+            "electricity_rate": 8.0,
+        }
         
-        best_scenario = max(results, key=lambda x: x.get("predicted_roi", 0))
+        start = time.perf_counter()
+        grid = AIService._build_scenario_grid(scenarios, defaults)
+        evaluated = AIService.evaluate_scenarios(grid, loan.state, settings.SIMULATION_MAX_RESULTS)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        
+        front = evaluated["results"]
+        best_scenario = max(front, key=lambda x: x["npv"])
+        
+        prediction = AIPrediction(
+            loan_application_id=loan_application_id,
+            user_id=loan.user_id,
+            prediction_type=PredictionType.SIMULATE,
+            model_name="scenario_grid",
+            model_version=get_reference_data().subsidy_rules.version,
+            input_features={"scenarios": scenarios},
+            prediction_result={
+                "grid_size": evaluated["grid_size"],
+                "pareto_size": len(front),
+                "best_scenario": best_scenario,
+            },
+            processing_time_ms=Decimal(str(round(elapsed_ms, 2))),
+        )
+        db.add(prediction)
+        await db.commit()
         
         return {
-            "scenarios": results,
+            "scenarios": front,
             "best_scenario": best_scenario,
+            "grid_size": evaluated["grid_size"],
         }
     
     @staticmethod
@@ -229,38 +507,37 @@ class AIService:
         loan_id: UUID,
         prediction_type: str = "eligibility",
     ) -> dict:
-        """Get explainability for prediction"""
+        """Get explainability for prediction (SHAP values are precomputed after scoring)"""
         # Get prediction
         result = await db.execute(
             select(AIPrediction).where(
                 AIPrediction.loan_application_id == loan_id,
                 AIPrediction.prediction_type == PredictionType(prediction_type),
-            ).order_by(AIPrediction.created_at.desc())
+            ).order_by(AIPrediction.created_at.desc()).limit(1)
         )
         prediction = result.scalar_one_or_none()
         
         if not prediction:
             raise ValueError("Prediction not found")
         
-        # Mock SHAP values
-        shap_values = {
-            "annual_income": 0.25,
-            "loan_amount": -0.15,
-            "existing_loans": -0.10,
-            "credit_score": 0.20,
-        }
+        if prediction.shap_values is None and prediction.model_version != "mock":
+            # Background explanation not stored yet: compute it now, still off the event loop
+            if await AIService.explain_predictions(db, [prediction.id]):
+                await db.refresh(prediction)
         
-        feature_importance = {
-            "annual_income": "High positive impact",
-            "credit_score": "Moderate positive impact",
-            "loan_amount": "Negative impact",
-            "existing_loans": "Negative impact",
-        }
+        if prediction.shap_values is not None:
+            shap_values = json.loads(prediction.shap_values)
+        elif prediction.model_version == "mock":
+            shap_values = MOCK_SHAP_VALUES
+        else:
+            raise ValueError("Explanation not available for this prediction")
+        feature_importance, explanation = describe(shap_values)
         
         return {
             "shap_values": shap_values,
-            "feature_importance": feature_importance,
-            "explanation": "Loan eligibility is primarily driven by annual income and credit score.",
+            "feature_importance": prediction.feature_importance or feature_importance,
+            "explanation": explanation,
+            "created_at": prediction.created_at,
         }
     
     @staticmethod
@@ -269,40 +546,130 @@ class AIService:
         loan_ids: list[UUID],
         prediction_type: str = "eligibility",
     ) -> BatchJob:
-        """Batch score multiple loans"""
+        """Create a batch job and fan its loans out to Celery in chunks of BATCH_SCORE_CHUNK_SIZE"""
+        from app.tasks.ai_tasks import enqueue_batch_chunks
+        
+        if prediction_type != "eligibility":
+            raise ValueError(f"Unsupported prediction type: {prediction_type}")
+        loan_ids = list(dict.fromkeys(loan_ids))
+        
         job = BatchJob(
             job_type=f"batch_{prediction_type}",
-            status=BatchJobStatus.PROCESSING,
+            status=BatchJobStatus.PENDING,
             input_data={"loan_ids": [str(loan_id) for loan_id in loan_ids]},
             total_count=len(loan_ids),
             success_count=0,
             failed_count=0,
+            results=[],
         )
         db.add(job)
         await db.commit()
+        await db.refresh(job)
         
-        # Process in background (in production, use Celery)
-        results = []
-        failed_items = []
+        size = settings.BATCH_SCORE_CHUNK_SIZE
+        chunks = [[str(loan_id) for loan_id in loan_ids[i:i + size]] for i in range(0, len(loan_ids), size)]
+        try:
+            enqueue_batch_chunks(str(job.id), chunks, prediction_type)
+        except Exception as e:
+            logger.error(f"Failed to enqueue batch job {job.id}: {e}")
+            job.status = BatchJobStatus.FAILED
+            job.error_message = f"Failed to enqueue: {e}"
+            await db.commit()
+            await db.refresh(job)
+        return job
+    
+    @staticmethod
+    async def score_batch_chunk(
+        db: AsyncSession,
+        job_id: UUID,
+        loan_ids: list[UUID],
+        prediction_type: str = "eligibility",
+    ) -> dict:
+        """Score one chunk: one joined feature query, one predict_proba matrix, one bulk INSERT, one progress update"""
+        start = time.perf_counter()
+        loan_features = await load_loan_features(db, loan_ids)
+        loans = [loan for loan, _ in loan_features.values()]
+        features = [row for _, row in loan_features.values()]
+        failed_items = [
+            {"loan_id": str(loan_id), "error": "Loan application not found"}
+            for loan_id in loan_ids if loan_id not in loan_features
+        ]
         
-        for loan_id in loan_ids:
+        model = get_model("eligibility")
+        if loans and model and not settings.USE_MOCKS:
+            columns = ELIGIBILITY_SCHEMA.model_columns(model)
+            matrix = ELIGIBILITY_SCHEMA.matrix(features, columns)
+            probabilities = await run_model("eligibility", model.model, "predict_proba", matrix, model.version)
+            scores = (probabilities[:, 1] * 100).tolist()
+            model_version = model.version
+            # Workers are already off the request path, so the chunk is explained inline in one pass
             try:
-                if prediction_type == "eligibility":
-                    result = await AIService.check_eligibility(db, loan_id)
-                    results.append({"loan_id": str(loan_id), "result": result})
-                    job.success_count += 1
-                else:
-                    raise ValueError(f"Unsupported prediction type: {prediction_type}")
+                explanations = [
+                    _explanation_columns(row) for row in shap_rows(
+                        columns,
+                        explain_matrix(model.model, matrix, key=("eligibility", model_version)),
+                    )
+                ]
             except Exception as e:
-                failed_items.append({"loan_id": str(loan_id), "error": str(e)})
-                job.failed_count += 1
+                logger.warning(f"Batch job {job_id}: explaining chunk failed: {e}")
+                explanations = [{}] * len(loans)
+        else:
+            scores = [MOCK_ELIGIBILITY_SCORE] * len(loans)
+            model_version = "mock"
+            explanations = [{}] * len(loans)
+        
+        rows, results = [], []
+        for loan, row_features, score, explanation in zip(loans, features, scores, explanations):
+            outcome = _eligibility_result(score)
+            prediction_id = uuid4()
+            rows.append({
+                "id": prediction_id,
+                "loan_application_id": loan.id,
+                "user_id": loan.user_id,
+                "prediction_type": PredictionType.ELIGIBILITY,
+                "model_name": "eligibility_model",
+                "model_version": model_version,
+                "input_features": row_features,
+                "prediction_result": outcome,
+                "confidence_score": Decimal(str(round(score, 2))),
+                "meta_data": {"batch_job_id": str(job_id)},
+                **explanation,
+            })
+            results.append({
+                "loan_id": str(loan.id),
+                "result": {**outcome, "confidence": score, "prediction_id": str(prediction_id)},
+            })
+        if rows:
+            await db.execute(insert(AIPrediction), rows)
         
-        job.results = results
-        job.failed_items = failed_items if failed_items else None
-        job.status = BatchJobStatus.COMPLETED
-        job.completed_at = datetime.utcnow()
+        # Lock the job row so concurrent chunks append results and counts without losing updates
+        job = (await db.execute(select(BatchJob).where(BatchJob.id == job_id).with_for_update())).scalar_one()
+        job.success_count = (job.success_count or 0) + len(results)
+        job.failed_count = (job.failed_count or 0) + len(failed_items)
+        job.results = (job.results or []) + results
+        if failed_items:
+            job.failed_items = (job.failed_items or []) + failed_items
+        if job.success_count + job.failed_count >= job.total_count:
+            job.status = BatchJobStatus.COMPLETED
+            job.completed_at = datetime.utcnow()
+        else:
+            job.status = BatchJobStatus.PROCESSING
         await db.commit()
-        await db.refresh(job)
         
-        return job
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"Batch job {job_id}: scored {len(results)} loans ({len(failed_items)} failed) in {elapsed_ms:.0f}ms")
+        return {"success_count": len(results), "failed_count": len(failed_items)}
+    
+    @staticmethod
+    async def fail_batch_chunk(db: AsyncSession, job_id: UUID, loan_ids: list[UUID], error: str):
+        """Record every loan in a chunk that could not be scored"""
+        job = (await db.execute(select(BatchJob).where(BatchJob.id == job_id).with_for_update())).scalar_one()
+        job.failed_count = (job.failed_count or 0) + len(loan_ids)
+        job.failed_items = (job.failed_items or []) + [
+            {"loan_id": str(loan_id), "error": error} for loan_id in loan_ids
+        ]
+        if job.success_count + job.failed_count >= job.total_count:
+            job.status = BatchJobStatus.COMPLETED
+            job.completed_at = datetime.utcnow()
+        await db.commit()
 
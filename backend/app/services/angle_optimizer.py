@@ -0,0 +1,218 @@
+"""
+Panel Orientation Optimizer
+
+Hourly sun positions for a full year (NOAA/Spencer approximations), Haurwitz
+clear-sky GHI scaled to the location's monthly irradiation, an Erbs
+diffuse split and an isotropic-sky plane-of-array (POA) model. POA is
+evaluated for a tilt x azimuth grid as one broadcast over the daylight
+hours, first coarse, then refined around the best cell.
+
+Results depend only on the rounded coordinates, so they are memoized in a
+process-local LRU and in Redis, shared by neighbouring roofs.
+"""
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.core.reference_data import get_reference_data
+from app.core.irradiation_grid import DAYS_IN_MONTH
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOURS_PER_YEAR = 8760
+SOLAR_CONSTANT = 1367.0  # W/m²
+GROUND_ALBEDO = 0.2
+MIN_COS_ZENITH = 0.065  # ~86°; below this DNI is numerically unstable
+MAX_TILT = 60.0
+DEFAULT_IRRADIATION = 5.0  # kWh/m²/day, matches CalculationService
+# Bump when the irradiance model changes (recorded as AIPrediction.model_version)
+MODEL_VERSION = "geometry-1"
+
+# Month (0-11) of every hour in a non-leap year
+_HOUR_MONTH = np.repeat(np.arange(12), DAYS_IN_MONTH.astype(np.int64) * 24)
+
+_memo: "OrderedDict[str, dict]" = OrderedDict()
+_memo_lock = threading.Lock()
+angle_cache_stats = {"memory_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+def solar_position(latitude: float, longitude: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Hourly (mid-hour, UTC) cos(zenith), azimuth (radians from north) and day of year for one year"""
+    hours = np.arange(HOURS_PER_YEAR)
+    day = hours // 24 + 1
+    hour_utc = hours % 24 + 0.5
+    gamma = 2 * np.pi / 365 * (day - 1 + (hour_utc - 12) / 24)
+
+    eqtime = 229.18 * (
+        0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+        - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma)
+    )
+    decl = (
+        0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+        - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+        - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma)
+    )
+    true_solar_minutes = hour_utc * 60 + eqtime + 4 * longitude
+    hour_angle = np.radians(true_solar_minutes / 4 - 180)
+
+    lat = np.radians(latitude)
+    cos_zenith = np.sin(lat) * np.sin(decl) + np.cos(lat) * np.cos(decl) * np.cos(hour_angle)
+    azimuth = np.arctan2(
+        np.sin(hour_angle),
+        np.cos(hour_angle) * np.sin(lat) - np.tan(decl) * np.cos(lat),
+    ) + np.pi
+    return cos_zenith, azimuth, day
+
+
+def _erbs_diffuse_fraction(kt: np.ndarray) -> np.ndarray:
+    return np.select(
+        [kt <= 0.22, kt <= 0.8],
+        [1 - 0.09 * kt, 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4],
+        default=0.165,
+    )
+
+
+def hourly_irradiance(latitude: float, longitude: float, monthly_ghi: np.ndarray) -> dict:
+    """Daylight-hour GHI/DNI/DHI (W/m²) whose monthly totals match `monthly_ghi` (kWh/m²/day)"""
+    cos_zenith, azimuth, day = solar_position(latitude, longitude)
+    up = cos_zenith > MIN_COS_ZENITH
+    cos_zenith, azimuth, day, month = cos_zenith[up], azimuth[up], day[up], _HOUR_MONTH[up]
+
+    clear_sky = 1098.0 * cos_zenith * np.exp(-0.057 / cos_zenith)
+    # Scale clear-sky GHI so each month's total equals the measured monthly mean
+    target_wh = np.asarray(monthly_ghi, dtype=np.float64) * DAYS_IN_MONTH * 1000
+    modelled_wh = np.bincount(month, weights=clear_sky, minlength=12)
+    scale = np.divide(target_wh, modelled_wh, out=np.zeros(12), where=modelled_wh > 0)
+    ghi = clear_sky * scale[month]
+
+    extraterrestrial = SOLAR_CONSTANT * (1 + 0.033 * np.cos(2 * np.pi * day / 365)) * cos_zenith
+    kt = np.clip(ghi / extraterrestrial, 0, 1)
+    dhi = ghi * _erbs_diffuse_fraction(kt)
+    dni = (ghi - dhi) / cos_zenith
+    return {
+        "cos_zenith": cos_zenith,
+        "sin_zenith": np.sqrt(1 - cos_zenith ** 2),
+        "azimuth": azimuth,
+        "ghi": ghi,
+        "dni": dni,
+        "dhi": dhi,
+    }
+
+
+def plane_of_array(irradiance: dict, tilt_deg: np.ndarray, azimuth_deg: np.ndarray) -> np.ndarray:
+    """Annual POA irradiation (kWh/m²) for every tilt x azimuth pair, shape (len(tilt), len(azimuth))"""
+    tilt = np.radians(np.asarray(tilt_deg, dtype=np.float64))[:, None, None]
+    surface_azimuth = np.radians(np.asarray(azimuth_deg, dtype=np.float64))[None, :, None]
+    cos_tilt, sin_tilt = np.cos(tilt), np.sin(tilt)
+
+    # (tilt, azimuth, hour) angle of incidence, float32 to halve memory traffic
+    cos_aoi = (
+        irradiance["cos_zenith"] * cos_tilt
+        + irradiance["sin_zenith"] * sin_tilt * np.cos(irradiance["azimuth"] - surface_azimuth)
+    ).astype(np.float32)
+    np.maximum(cos_aoi, 0, out=cos_aoi)
+    beam = cos_aoi @ irradiance["dni"].astype(np.float32)
+
+    sky = irradiance["dhi"].sum() * (1 + cos_tilt[:, :, 0]) / 2
+    ground = irradiance["ghi"].sum() * GROUND_ALBEDO * (1 - cos_tilt[:, :, 0]) / 2
+    return (beam + sky + ground) / 1000
+
+
+def _grid_search(irradiance: dict, tilts: np.ndarray, azimuths: np.ndarray) -> Tuple[float, float, float]:
+    poa = plane_of_array(irradiance, tilts, azimuths)
+    i, j = np.unravel_index(np.argmax(poa), poa.shape)
+    return float(tilts[i]), float(azimuths[j]), float(poa[i, j])
+
+
+def optimize_orientation(latitude: float, longitude: float, monthly_ghi) -> dict:
+    """Tilt/azimuth maximising annual POA irradiation, and the gain over a flat mount"""
+    irradiance = hourly_irradiance(latitude, longitude, monthly_ghi)
+    flat = float(irradiance["ghi"].sum() / 1000)
+    # Equator-facing half of the compass; refine 1° around the best coarse cell
+    facing = 180.0 if latitude >= 0 else 0.0
+    tilt, azimuth, _ = _grid_search(
+        irradiance, np.arange(0, MAX_TILT + 1, 5.0), facing + np.arange(-90, 91, 10.0),
+    )
+    tilt, azimuth, best = _grid_search(
+        irradiance,
+        np.clip(np.arange(tilt - 5, tilt + 6, 1.0), 0, MAX_TILT),
+        azimuth + np.arange(-10, 11, 1.0),
+    )
+    return {
+        "optimal_angle": tilt,
+        "optimal_azimuth": azimuth % 360,
+        "expected_efficiency_gain": round((best / flat - 1) * 100, 2) if flat > 0 else 0.0,
+        "annual_poa_kwh_m2": round(best, 1),
+        "annual_flat_kwh_m2": round(flat, 1),
+    }
+
+
+def _monthly_irradiation(latitude: float, longitude: float) -> Tuple[np.ndarray, str, Optional[str]]:
+    """Monthly GHI for the grid cell, or DEFAULT_IRRADIATION for every month off-grid or without data; plus source and data version"""
+    grid = get_reference_data().irradiation_grid
+    if grid is not None:
+        cell = grid.cell(latitude, longitude)
+        monthly = grid.monthly(*cell) if cell is not None else None
+        if monthly is not None:
+            return monthly, "grid", grid.version
+    return np.full(12, DEFAULT_IRRADIATION), "default", None
+
+
+def _memo_get(key: str) -> Optional[dict]:
+    with _memo_lock:
+        result = _memo.get(key)
+        if result is not None:
+            _memo.move_to_end(key)
+        return result
+
+
+def _memo_put(key: str, result: dict):
+    with _memo_lock:
+        _memo[key] = result
+        _memo.move_to_end(key)
+        while len(_memo) > settings.ANGLE_CACHE_SIZE:
+            _memo.popitem(last=False)
+
+
+async def get_optimal_orientation(latitude: float, longitude: float) -> dict:
+    """Memoized orientation for the rounded location (LRU -> Redis -> compute)"""
+    precision = settings.ANGLE_CACHE_PRECISION
+    latitude, longitude = round(float(latitude), precision), round(float(longitude), precision)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Latitude must be within ±90 and longitude within ±180")
+    monthly, source, version = _monthly_irradiation(latitude, longitude)
+    key = f"angle_opt:{latitude}:{longitude}:{version or source}"
+
+    result = _memo_get(key)
+    if result is not None:
+        angle_cache_stats["memory_hits"] += 1
+        return result
+
+    redis = await get_redis()
+    if redis is not None:
+        try:
+            cached = await redis.get(key)
+            if cached:
+                result = json.loads(cached)
+                angle_cache_stats["redis_hits"] += 1
+                _memo_put(key, result)
+                return result
+        except Exception as e:
+            logger.warning(f"Angle cache read failed: {e}")
+
+    angle_cache_stats["misses"] += 1
+    result = await asyncio.to_thread(optimize_orientation, latitude, longitude, monthly)
+    result["irradiation_source"] = source
+    result["annual_irradiation"] = round(float(monthly @ DAYS_IN_MONTH / DAYS_IN_MONTH.sum()), 3)
+    _memo_put(key, result)
+    if redis is not None:
+        try:
+            await redis.setex(key, settings.ANGLE_CACHE_TTL_SECONDS, json.dumps(result))
+        except Exception as e:
+            logger.warning(f"Angle cache write failed: {e}")
+    return result
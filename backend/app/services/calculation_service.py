@@ -1,69 +1,174 @@
 """
 Calculation Service
 """
-import json
-import csv
-from pathlib import Path
-from decimal import Decimal
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterator, Optional, Sequence
 from app.core.config import settings
+from app.core.reference_data import get_reference_data
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
+CENT = Decimal("0.01")
+ROI_DISCOUNT_RATE = Decimal("0.08")
 
-class CalculationService:
-    """Financial calculation service"""
+# Monte Carlo ROI: paths per chunk are fixed so results depend only on the seed, not the worker count
+RISK_CHUNK_PATHS = 10000
+RISK_DEFAULT_DISTRIBUTIONS = {
+    # Multiplier on the location's mean irradiation, drawn per path-year
+    "irradiation": {"kind": "normal", "mean": 1.0, "sd": 0.05},
+    # Annual degradation (%), drawn per path; mean defaults to the degradation_rate argument
+    "degradation": {"kind": "normal", "sd": 0.15},
+    # Annual tariff escalation (%), drawn per path
+    "tariff_escalation": {"kind": "normal", "mean": 3.0, "sd": 1.0},
+    # Fraction of generation lost to downtime, drawn per path-year
+    "downtime": {"kind": "uniform", "low": 0.0, "high": 0.03},
+}
+
+_simulation_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _sample(rng: np.random.Generator, spec: dict, size) -> np.ndarray:
+    """Draw samples for a distribution spec"""
+    kind = spec.get("kind", "fixed")
+    if kind == "fixed":
+        return np.full(size, float(spec["mean"]))
+    if kind == "normal":
+        return rng.normal(spec["mean"], spec.get("sd", 0.0), size)
+    if kind == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if kind == "triangular":
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    raise ValueError(f"Unsupported distribution kind: {kind}")
+
+
+def _simulate_roi_chunk(params: dict) -> tuple:
+    """Simulate one chunk of ROI paths (module-level so it can run in a process pool)"""
+    rng = np.random.default_rng(params["seed"])
+    paths, years = params["paths"], params["years"]
+    dists = params["distributions"]
     
-    def __init__(self):
-        self.data_dir = Path(settings.DATA_DIR)
-        self._irradiation_data = None
-        self._subsidy_data = None
+    irradiation = params["irradiation"] * np.clip(_sample(rng, dists["irradiation"], (paths, years)), 0, None)
+    degradation = np.clip(_sample(rng, dists["degradation"], (paths, 1)), 0, 100) / 100
+    escalation = _sample(rng, dists["tariff_escalation"], (paths, 1)) / 100
+    downtime = np.clip(_sample(rng, dists["downtime"], (paths, years)), 0, 1)
+    
+    year_index = np.arange(years)
+    generation = params["system_capacity_kw"] * 365 * irradiation * (1 - downtime) * (1 - degradation) ** year_index
+    savings = generation * params["electricity_rate"] * (1 + escalation) ** year_index
+    cumulative = np.cumsum(savings, axis=1)
+    
+    cost = params["installation_cost"]
+    discount = (1 + params["discount_rate"]) ** -(year_index + 1.0)
+    npv = savings @ discount - cost
+    reached = cumulative >= cost
+    payback = np.where(reached.any(axis=1), reached.argmax(axis=1) + 1, years)
+    
+    return npv, payback, cumulative.astype(np.float32), reached[:, -1]
+
+
+def pareto_front(minimize: np.ndarray, maximize: np.ndarray) -> np.ndarray:
+    """Indices of the Pareto-optimal points (low `minimize`, high `maximize`), ordered by `minimize`"""
+    order = np.lexsort((-maximize, minimize))
+    best_so_far = np.maximum.accumulate(maximize[order])
+    keep = np.empty(order.size, dtype=bool)
+    keep[:1] = True
+    keep[1:] = maximize[order][1:] > best_so_far[:-1]
+    return order[keep]
+
+
+def _solve_increasing(func, lo: np.ndarray, hi: np.ndarray, tol: float = 1e-12, max_iter: int = 100):
+    """Vectorized safeguarded Newton for f increasing on [lo, hi] with f(lo) <= 0 <= f(hi).
+
+    Newton steps that leave the bracket fall back to bisection, so every row converges.
+    `func(x)` returns (f, f'). Returns (root, converged, iterations).
+    """
+    lo, hi = lo.astype(np.float64), hi.astype(np.float64)
+    x = (lo + hi) / 2
+    converged = np.zeros(x.shape, dtype=bool)
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        f, df = func(x)
+        hi = np.where(f > 0, x, hi)
+        lo = np.where(f <= 0, x, lo)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = x - f / df
+        in_bracket = np.isfinite(newton) & (newton > lo) & (newton < hi)
+        x_next = np.where(in_bracket, newton, (lo + hi) / 2)
+        converged = (np.abs(x_next - x) <= tol * (1 + np.abs(x))) | (f == 0)
+        x = np.where(f == 0, x, x_next)
+        if converged.all():
+            break
+    return x, converged, iterations
+
+
+def irr(cashflows) -> tuple:
+    """Per-row IRR of a (rows, periods) cashflow matrix (period 0 first); returns (rate, converged)"""
+    cashflows = np.atleast_2d(np.asarray(cashflows, dtype=np.float64))
+    periods = np.arange(cashflows.shape[1], dtype=np.float64)
+    
+    def negative_npv(rate):
+        discount = np.power(1 + rate[:, None], -periods)
+        npv = (cashflows * discount).sum(axis=1)
+        slope = (cashflows * periods * discount).sum(axis=1) / (1 + rate)
+        return -npv, slope
+    
+    # NPV falls with the rate for conventional (outflow, then inflows) cashflows
+    lo = np.full(cashflows.shape[0], -0.99)
+    hi = np.full(cashflows.shape[0], 10.0)
+    bracketed = (negative_npv(lo)[0] <= 0) & (negative_npv(hi)[0] >= 0)
+    rate, converged, _ = _solve_increasing(negative_npv, lo, hi)
+    return rate, converged & bracketed
+
+
+def _get_simulation_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared process pool for risk simulations"""
+    global _simulation_pool
+    if _simulation_pool is None:
+        _simulation_pool = ProcessPoolExecutor(max_workers=settings.ROI_SIMULATION_WORKERS or None)
+    return _simulation_pool
+
+
+def shutdown_simulation_pool():
+    """Shut down the risk simulation process pool (app shutdown)"""
+    global _simulation_pool
+    if _simulation_pool is not None:
+        _simulation_pool.shutdown(cancel_futures=True)
+        _simulation_pool = None
+
+
+class CalculationService:
+    """Financial calculation service (stateless; reference data is shared process-wide)"""
     
     def _load_irradiation_data(self):
-        """Load irradiation data from CSV"""
-        if self._irradiation_data is None:
-            csv_path = self.data_dir / "irradiation.csv"
-            if csv_path.exists():
-                with open(csv_path, 'r') as f:
-                    reader = csv.DictReader(f)
-                    self._irradiation_data = {row['state']: float(row['irradiation']) for row in reader}
-            else:
-                # Default values
-                self._irradiation_data = {
-                    "Maharashtra": 5.5,
-                    "Gujarat": 5.8,
-                    "Rajasthan": 6.0,
-                    "Karnataka": 5.2,
-                    "Tamil Nadu": 5.0,
-                }
-        return self._irradiation_data
-    
-    def _load_subsidy_data(self):
-        """Load subsidy data from JSON"""
-        if self._subsidy_data is None:
-            json_path = self.data_dir / "subsidy.json"
-            if json_path.exists():
-                with open(json_path, 'r') as f:
-                    self._subsidy_data = json.load(f)
-            else:
-                # Default subsidy structure
-                self._subsidy_data = {
-                    "central": {
-                        "residential": {
-                            "upto_3kw": {"percentage": 40, "max_amount": 30000},
-                            "above_3kw": {"percentage": 40, "max_amount": 40000},
-                        },
-                        "commercial": {
-                            "percentage": 0,
-                        },
-                    },
-                    "state": {
-                        "Maharashtra": {"percentage": 20, "max_amount": 20000},
-                        "Gujarat": {"percentage": 25, "max_amount": 25000},
-                        "Rajasthan": {"percentage": 15, "max_amount": 15000},
-                    },
-                }
-        return self._subsidy_data
+        """Irradiation by state from the shared reference data snapshot"""
+        return get_reference_data().irradiation
+    
+    def resolve_irradiation(
+        self,
+        location: str = None,
+        latitude: float = None,
+        longitude: float = None,
+        pincode: str = None,
+    ) -> tuple:
+        """Most precise irradiation available: pincode cell, lat/lon cell, then state average (default 5.0)"""
+        grid = get_reference_data().irradiation_grid
+        if grid is not None:
+            cell = grid.pincode_cell(pincode) if pincode else None
+            source = "pincode"
+            if cell is None and latitude is not None and longitude is not None:
+                cell = grid.cell(latitude, longitude)
+                source = "grid"
+            if cell is not None:
+                value = grid.annual_mean(*cell)
+                if value is not None:
+                    return value, source
+        if location in self._load_irradiation_data():
+            return self._load_irradiation_data()[location], "state"
+        return 5.0, "default"
     
     @staticmethod
     async def calculate_emi(
@@ -96,51 +201,342 @@ class CalculationService:
             "tenure_months": tenure_months,
         }
     
+    @staticmethod
+    def _emi_arrays(principal, interest_rate, tenure_years):
+        """Vectorized EMI core; returns (emi, total_amount, total_interest, tenure_months) arrays"""
+        principal = np.asarray(principal, dtype=np.float64)
+        monthly_rate = np.asarray(interest_rate, dtype=np.float64) / 100 / 12
+        tenure_months = np.asarray(tenure_years, dtype=np.int64) * 12
+        
+        # Zero-rate loans repay principal evenly; only evaluate the annuity formula where r != 0
+        growth = np.power(1 + monthly_rate, tenure_months)
+        emi = principal / tenure_months
+        np.divide(
+            principal * monthly_rate * growth,
+            growth - 1,
+            out=emi,
+            where=monthly_rate != 0,
+        )
+        
+        total_amount = emi * tenure_months
+        total_interest = total_amount - principal
+        return emi, total_amount, total_interest, tenure_months
+    
+    @staticmethod
+    async def calculate_emi_batch(
+        principals: Sequence[float],
+        interest_rates: Sequence[float],
+        tenure_years: Sequence[int],
+    ) -> dict:
+        """Calculate EMIs for many principal/rate/tenure combinations in one NumPy pass"""
+        tenure = CalculationService._validate_batch(principals, interest_rates, tenure_years=tenure_years)
+        
+        emi, total_amount, total_interest, tenure_months = CalculationService._emi_arrays(
+            principals, interest_rates, tenure,
+        )
+        
+        return {
+            "emi_amount": np.round(emi, 2).tolist(),
+            "total_amount": np.round(total_amount, 2).tolist(),
+            "total_interest": np.round(total_interest, 2).tolist(),
+            "tenure_months": tenure_months.tolist(),
+            "count": int(emi.size),
+        }
+    
+    @staticmethod
+    def _validate_batch(*columns, tenure_years=None):
+        """Check column lengths; with `tenure_years`, also that they are positive whole years (returned as int64)"""
+        if tenure_years is not None:
+            columns += (tenure_years,)
+        lengths = {len(column) for column in columns}
+        if len(lengths) != 1:
+            raise ValueError("All batch columns must have the same length")
+        if lengths.pop() > settings.EMI_BATCH_MAX_ROWS:
+            raise ValueError(f"Batch size exceeds limit of {settings.EMI_BATCH_MAX_ROWS} rows")
+        if tenure_years is None:
+            return None
+        # Rejected rather than cast: int64 would silently truncate 2.5 years to 2
+        tenure = np.asarray(tenure_years, dtype=np.float64)
+        if tenure.size and tenure.min() <= 0:
+            raise ValueError("tenure_years must be positive")
+        if np.any(tenure != np.floor(tenure)):
+            raise ValueError("tenure_years must be whole years")
+        return tenure.astype(np.int64)
+    
+    @staticmethod
+    async def solve_rate_for_emi(
+        principals: Sequence[float],
+        emi_amounts: Sequence[float],
+        tenure_years: Sequence[int],
+    ) -> dict:
+        """Annual interest rate (%) that gives each EMI; rows with EMI × months < principal have no solution"""
+        CalculationService._validate_batch(principals, emi_amounts, tenure_years)
+        principal = np.asarray(principals, dtype=np.float64)
+        emi = np.asarray(emi_amounts, dtype=np.float64)
+        months = np.asarray(tenure_years, dtype=np.float64) * 12
+        if months.size and (months.min() <= 0 or principal.min() <= 0 or emi.min() <= 0):
+            raise ValueError("principals, emi_amounts and tenure_years must be positive")
+        
+        def excess_principal(rate):
+            # P - EMI * annuity factor: increasing in the monthly rate
+            small = rate < 1e-9
+            safe = np.where(small, 1.0, rate)
+            annuity = np.where(
+                small,
+                months - months * (months + 1) / 2 * rate,
+                -np.expm1(-months * np.log1p(safe)) / safe,
+            )
+            slope = np.where(
+                small,
+                months * (months + 1) / 2,
+                (annuity - months * np.power(1 + safe, -months - 1)) / safe,
+            )
+            return principal - emi * annuity, emi * slope
+        
+        # Zero rate is the lowest feasible answer; EMI >= P * r bounds it above
+        repaid = emi * months / principal - 1
+        feasible = repaid >= -1e-9
+        upper = np.where(repaid <= 1e-9, 0.0, emi / principal)
+        rate, converged, iterations = _solve_increasing(excess_principal, np.zeros_like(principal), upper)
+        ok = feasible & converged
+        annual = np.round(np.where(ok, rate * 1200, 0.0), 6)
+        return {
+            "interest_rate": [value if valid else None for value, valid in zip(annual.tolist(), ok.tolist())],
+            "converged": ok.tolist(),
+            "iterations": iterations,
+            "count": int(principal.size),
+        }
+    
+    @staticmethod
+    async def solve_tenure_for_emi(
+        principals: Sequence[float],
+        emi_amounts: Sequence[float],
+        interest_rates: Sequence[float],
+    ) -> dict:
+        """Months needed to repay each principal at a given EMI; infeasible when EMI <= monthly interest"""
+        CalculationService._validate_batch(principals, emi_amounts, interest_rates)
+        principal = np.asarray(principals, dtype=np.float64)
+        emi = np.asarray(emi_amounts, dtype=np.float64)
+        monthly_rate = np.asarray(interest_rates, dtype=np.float64) / 1200
+        if principal.size and (principal.min() <= 0 or emi.min() <= 0 or monthly_rate.min() < 0):
+            raise ValueError("principals and emi_amounts must be positive and interest_rates non-negative")
+        
+        # Closed form n = -ln(1 - P r / EMI) / ln(1 + r); no iteration needed
+        feasible = emi > principal * monthly_rate
+        with np.errstate(divide="ignore", invalid="ignore"):
+            exact = np.where(
+                monthly_rate > 0,
+                -np.log1p(-principal * monthly_rate / emi) / np.log1p(monthly_rate),
+                principal / emi,
+            )
+        exact = np.where(feasible, exact, 0.0)
+        # Whole installments; the tolerance keeps exact round-trips from ticking up a month
+        months = np.ceil(exact - 1e-9).astype(np.int64)
+        return {
+            "tenure_months": [int(m) if ok else None for m, ok in zip(months.tolist(), feasible.tolist())],
+            "tenure_months_exact": [
+                round(value, 6) if ok else None for value, ok in zip(exact.tolist(), feasible.tolist())
+            ],
+            "feasible": feasible.tolist(),
+            "count": int(principal.size),
+        }
+    
+    @staticmethod
+    def amortization_schedule(
+        principal: Decimal,
+        interest_rate: Decimal,
+        tenure_years: int,
+    ) -> Iterator[dict]:
+        """Return a lazy month-by-month amortization schedule (validated eagerly)"""
+        if tenure_years <= 0:
+            raise ValueError("tenure_years must be positive")
+        if principal <= 0:
+            raise ValueError("principal must be positive")
+        if interest_rate < 0:
+            raise ValueError("interest_rate must not be negative")
+        return CalculationService._amortization_rows(
+            Decimal(principal), Decimal(interest_rate), tenure_years * 12,
+        )
+    
+    @staticmethod
+    def _amortization_rows(principal: Decimal, interest_rate: Decimal, tenure_months: int) -> Iterator[dict]:
+        """Yield schedule rows; all money is rounded to paise and the last installment absorbs the remainder"""
+        monthly_rate = interest_rate / 1200
+        if monthly_rate == 0:
+            emi = (principal / tenure_months).quantize(CENT, rounding=ROUND_HALF_UP)
+        else:
+            growth = (1 + monthly_rate) ** tenure_months
+            emi = (principal * monthly_rate * growth / (growth - 1)).quantize(CENT, rounding=ROUND_HALF_UP)
+        
+        balance = principal
+        for month in range(1, tenure_months + 1):
+            interest = (balance * monthly_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+            if month == tenure_months:
+                principal_paid = balance
+            else:
+                principal_paid = min(emi - interest, balance)
+            balance -= principal_paid
+            yield {
+                "month": month,
+                "payment": principal_paid + interest,
+                "principal": principal_paid,
+                "interest": interest,
+                "balance": balance,
+            }
+    
     async def calculate_subsidy(
         self,
         system_capacity_kw: Decimal,
         state: str,
         system_type: str = "residential",
     ) -> dict:
-        """Calculate subsidy amount"""
-        subsidy_data = self._load_subsidy_data()
-        
-        # Central subsidy
-        central_subsidy = Decimal("0")
-        if system_type == "residential":
-            if system_capacity_kw <= 3:
-                central_info = subsidy_data["central"]["residential"]["upto_3kw"]
-                central_subsidy = min(
-                    system_capacity_kw * 1000 * Decimal(str(central_info["percentage"])) / 100,
-                    Decimal(str(central_info["max_amount"])),
-                )
-            else:
-                central_info = subsidy_data["central"]["residential"]["above_3kw"]
-                central_subsidy = min(
-                    system_capacity_kw * 1000 * Decimal(str(central_info["percentage"])) / 100,
-                    Decimal(str(central_info["max_amount"])),
-                )
-        
-        # State subsidy
-        state_subsidy = Decimal("0")
-        if state in subsidy_data.get("state", {}):
-            state_info = subsidy_data["state"][state]
-            state_subsidy = min(
-                system_capacity_kw * 1000 * Decimal(str(state_info["percentage"])) / 100,
-                Decimal(str(state_info["max_amount"])),
-            )
-        
-        total_subsidy = central_subsidy + state_subsidy
+        """Calculate subsidy amount from the compiled rules engine"""
+        result = get_reference_data().subsidy_rules.calculate(system_capacity_kw, state, system_type)
         
         return {
-            "subsidy_amount": total_subsidy,
-            "central_subsidy": central_subsidy,
-            "state_subsidy": state_subsidy,
+            **result,
             "system_capacity_kw": system_capacity_kw,
             "state": state,
             "system_type": system_type,
         }
     
+    async def calculate_subsidy_batch(
+        self,
+        system_capacity_kw: Sequence[float],
+        state: str,
+        system_type: str = "residential",
+    ) -> dict:
+        """Calculate subsidies for many capacities at once (columnar)"""
+        rules = get_reference_data().subsidy_rules
+        central, state_subsidy = rules.calculate_array(system_capacity_kw, state, system_type)
+        return {
+            "subsidy_amount": np.round(central + state_subsidy, 2).tolist(),
+            "central_subsidy": central.tolist(),
+            "state_subsidy": state_subsidy.tolist(),
+            "state": state,
+            "system_type": system_type,
+            "rules_version": rules.version,
+        }
+    
+    def _subsidy_arrays(self, system_capacity_kw, state: str, system_type: str = "residential"):
+        """Vectorized subsidy; returns (central, state) arrays"""
+        return get_reference_data().subsidy_rules.calculate_array(system_capacity_kw, state, system_type)
+    
+    def evaluate_scenario_grid(
+        self,
+        system_capacity_kw,
+        loan_tenure_years,
+        interest_rate,
+        down_payment,
+        state: str,
+        cost_per_kw,
+        electricity_rate=8.0,
+        degradation_rate=0.5,
+        years: int = 25,
+    ) -> dict:
+        """Evaluate cost, subsidy, EMI and borrower NPV for every grid cell in one pass"""
+        capacity = np.asarray(system_capacity_kw, dtype=np.float64)
+        down_payment = np.asarray(down_payment, dtype=np.float64)
+        installation_cost = capacity * np.asarray(cost_per_kw, dtype=np.float64)
+        central, state_subsidy = self._subsidy_arrays(capacity, state)
+        subsidy = central + state_subsidy
+        net_cost = np.maximum(installation_cost - subsidy, 0)
+        principal = np.maximum(net_cost - down_payment, 0)
+        
+        emi, total_amount, total_interest, tenure_months = self._emi_arrays(principal, interest_rate, loan_tenure_years)
+        
+        irradiation = self._load_irradiation_data().get(state, 5.0)
+        roi = self._roi_arrays(capacity, irradiation, net_cost, electricity_rate, degradation_rate, years)
+        
+        # Borrower NPV: PV(savings) - down payment - PV(EMI stream), discounted at the ROI rate
+        monthly_discount = (1 + float(ROI_DISCOUNT_RATE)) ** (1 / 12) - 1
+        pv_emis = emi * (1 - (1 + monthly_discount) ** -tenure_months.astype(np.float64)) / monthly_discount
+        npv = roi["npv"] + net_cost - np.minimum(down_payment, net_cost) - pv_emis
+        
+        return {
+            "installation_cost": installation_cost,
+            "subsidy_amount": subsidy,
+            "principal": principal,
+            "emi": emi,
+            "total_interest": total_interest,
+            "npv": npv,
+            "roi_percentage": roi["roi_percentage"],
+            "payback_period_years": roi["payback_period_years"],
+        }
+    
+    @staticmethod
+    def _roi_arrays(
+        system_capacity_kw,
+        irradiation,
+        installation_cost,
+        electricity_rate,
+        degradation_rate,
+        years: int,
+        discount_rate: float = float(ROI_DISCOUNT_RATE),
+    ) -> dict:
+        """Closed-form ROI over N systems (geometric sums, no per-year loop)"""
+        capacity = np.asarray(system_capacity_kw, dtype=np.float64)
+        cost = np.asarray(installation_cost, dtype=np.float64)
+        # Year-one savings and the yearly retention factor q = 1 - degradation
+        first_year = capacity * np.asarray(irradiation, dtype=np.float64) * 365 * np.asarray(electricity_rate, dtype=np.float64)
+        q = 1 - np.asarray(degradation_rate, dtype=np.float64) / 100
+        first_year, q, cost = np.broadcast_arrays(first_year, q, cost)
+        no_degradation = np.abs(q - 1) < 1e-12
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Total savings: S1 * (1 - q^Y) / (1 - q)
+            total_savings = np.where(
+                no_degradation,
+                first_year * years,
+                first_year * (1 - q ** years) / (1 - q),
+            )
+            
+            # NPV: sum S1 * q^(y-1) / (1+d)^y = S1/(1+d) * (1 - g^Y) / (1 - g), g = q / (1+d)
+            g = q / (1 + discount_rate)
+            pv_savings = np.where(
+                np.abs(g - 1) < 1e-12,
+                first_year / (1 + discount_rate) * years,
+                first_year / (1 + discount_rate) * (1 - g ** years) / (1 - g),
+            )
+            
+            # Payback: smallest k with S1 * (1 - q^k) / (1 - q) >= cost
+            ratio = np.where(no_degradation, 0.0, cost * (1 - q) / first_year)
+            k = np.where(
+                no_degradation,
+                cost / first_year,
+                np.log1p(-ratio) / np.log(q),
+            )
+        # Guard against float error on exact-integer boundaries before taking the ceiling
+        k = np.ceil(k - 1e-9)
+        payback = np.where(
+            (first_year > 0) & (k <= years),  # NaN/inf (never paid back) compare False
+            np.maximum(k, 1),
+            years,
+        ).astype(np.int64)
+        
+        net_savings = total_savings - cost
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roi_percentage = np.where(cost > 0, net_savings / cost * 100, 0.0)
+        
+        return {
+            "total_savings": total_savings,
+            "net_savings": net_savings,
+            "roi_percentage": roi_percentage,
+            "payback_period_years": payback,
+            "npv": pv_savings - cost,
+            "first_year_savings": first_year,
+            "retention": q,
+        }
+    
+    def irradiation_for(self, locations) -> np.ndarray:
+        """Map location names to irradiation values (default 5.0)"""
+        irradiation_data = self._load_irradiation_data()
+        return np.fromiter(
+            (irradiation_data.get(loc, 5.0) for loc in locations),
+            dtype=np.float64,
+            count=len(locations),
+        )
+    
     async def calculate_roi(
         self,
         system_capacity_kw: Decimal,
@@ -149,49 +545,91 @@ class CalculationService:
         electricity_rate: Decimal = Decimal("8.0"),
         degradation_rate: Decimal = Decimal("0.5"),
         years: int = 25,
+        exact: bool = False,
+        latitude: float = None,
+        longitude: float = None,
+        pincode: str = None,
     ) -> dict:
-        """Calculate ROI over N years"""
-        irradiation_data = self._load_irradiation_data()
-        irradiation = Decimal(str(irradiation_data.get(location, 5.0)))
+        """Calculate ROI over N years (exact=True keeps the full Decimal computation)"""
+        irradiation, irradiation_source = self.resolve_irradiation(location, latitude, longitude, pincode)
+        if exact:
+            result = self._calculate_roi_exact(
+                system_capacity_kw, Decimal(str(irradiation)), installation_cost, electricity_rate, degradation_rate, years,
+            )
+            return {**result, "irradiation": irradiation, "irradiation_source": irradiation_source}
+        
+        cost = float(installation_cost)
+        
+        # Yearly series as arrays: generation_y = base * q^(y-1), discounted at (1+d)^y
+        year_index = np.arange(years)
+        retention = np.power(1 - float(degradation_rate) / 100, year_index)
+        generation = float(system_capacity_kw) * irradiation * 365 * retention
+        savings = generation * float(electricity_rate)
+        cumulative = np.cumsum(savings)
+        discount = np.power(1 + float(ROI_DISCOUNT_RATE), -(year_index + 1.0))
+        
+        total_savings = float(cumulative[-1]) if years else 0.0
+        net_savings = total_savings - cost
+        roi_percentage = net_savings / cost * 100 if cost > 0 else 0.0
+        paid_back = int(np.searchsorted(cumulative, cost))
+        npv = float(savings @ discount) - cost
         
-        # Annual generation (kWh) = Capacity (kW) × Irradiation (kWh/kW/day) × 365
-        annual_generation = system_capacity_kw * irradiation * Decimal("365")
+        annual_savings_list = [
+            {"year": year, "generation_kwh": gen, "savings": sav}
+            for year, gen, sav in zip(range(1, years + 1), generation.tolist(), savings.tolist())
+        ]
+        
+        return {
+            "total_savings": Decimal(str(round(total_savings, 2))),
+            "net_savings": Decimal(str(round(net_savings, 2))),
+            "roi_percentage": Decimal(str(round(roi_percentage, 2))),
+            "payback_period_years": paid_back + 1 if paid_back < years else years,
+            "npv": Decimal(str(round(npv, 2))),
+            "annual_savings": annual_savings_list,
+            "installation_cost": installation_cost,
+            "system_capacity_kw": system_capacity_kw,
+            "years": years,
+            "irradiation": irradiation,
+            "irradiation_source": irradiation_source,
+        }
+    
+    def _calculate_roi_exact(
+        self,
+        system_capacity_kw: Decimal,
+        irradiation: Decimal,
+        installation_cost: Decimal,
+        electricity_rate: Decimal,
+        degradation_rate: Decimal,
+        years: int,
+    ) -> dict:
+        """Single-pass Decimal ROI for regulatory output (no float round-trips)"""
+        retention = 1 - Decimal(degradation_rate) / 100
+        discount = 1 + ROI_DISCOUNT_RATE
         
-        # Calculate savings over years with degradation
+        generation = system_capacity_kw * irradiation * Decimal("365")
+        discount_factor = Decimal("1")
         total_savings = Decimal("0")
+        npv = -installation_cost
+        payback_years = None
         annual_savings_list = []
         
         for year in range(1, years + 1):
-            # Apply degradation
-            current_capacity = system_capacity_kw * (1 - degradation_rate / 100) ** (year - 1)
-            current_generation = current_capacity * irradiation * Decimal("365")
-            annual_savings = current_generation * electricity_rate
+            annual_savings = generation * electricity_rate
+            discount_factor *= discount
             total_savings += annual_savings
+            npv += annual_savings / discount_factor
+            if payback_years is None and total_savings >= installation_cost:
+                payback_years = year
             annual_savings_list.append({
                 "year": year,
-                "generation_kwh": float(current_generation),
+                "generation_kwh": float(generation),
                 "savings": float(annual_savings),
             })
+            generation *= retention
         
-        # ROI calculation
         net_savings = total_savings - installation_cost
         roi_percentage = (net_savings / installation_cost * 100) if installation_cost > 0 else Decimal("0")
         
-        # Payback period
-        cumulative_savings = Decimal("0")
-        payback_years = None
-        for year_data in annual_savings_list:
-            cumulative_savings += Decimal(str(year_data["savings"]))
-            if cumulative_savings >= installation_cost and payback_years is None:
-                payback_years = year_data["year"]
-        
-        # NPV (simplified, assuming discount rate of 8%)
-        discount_rate = Decimal("0.08")
-        npv = Decimal("0")
-        for year_data in annual_savings_list:
-            npv += Decimal(str(year_data["savings"])) / ((1 + discount_rate) ** year_data["year"])
-        npv -= installation_cost
-        
         return {
             "total_savings": total_savings,
             "net_savings": net_savings,
@@ -203,4 +641,201 @@ class CalculationService:
             "system_capacity_kw": system_capacity_kw,
             "years": years,
         }
+    
+    async def calculate_roi_batch(
+        self,
+        system_capacity_kw: Sequence[float],
+        locations,
+        installation_costs: Sequence[float],
+        electricity_rate=8.0,
+        degradation_rate=0.5,
+        years: int = 25,
+        latitudes: Sequence[float] = None,
+        longitudes: Sequence[float] = None,
+        irradiation: Sequence[float] = None,
+    ) -> dict:
+        """Calculate ROI summaries for many systems at once (columnar); `irradiation` overrides the location lookup"""
+        capacity = np.asarray(system_capacity_kw, dtype=np.float64)
+        if isinstance(locations, str):
+            locations = [locations]
+        elif isinstance(locations, np.ndarray):
+            locations = locations.tolist()
+        if irradiation is not None:
+            irradiation = np.asarray(irradiation, dtype=np.float64)
+        else:
+            irradiation = self.irradiation_for(locations)
+            grid = get_reference_data().irradiation_grid
+            if grid is not None and latitudes is not None and longitudes is not None:
+                # Grid cells where available, state averages elsewhere
+                irradiation = grid.annual_mean_many(latitudes, longitudes, irradiation)
+        if irradiation.size not in (1, capacity.size):
+            raise ValueError("locations must be a single value or match system_capacity_kw length")
+        
+        summary = self._roi_arrays(
+            capacity, irradiation, installation_costs, electricity_rate, degradation_rate, years,
+        )
+        return {
+            "total_savings": np.round(summary["total_savings"], 2).tolist(),
+            "net_savings": np.round(summary["net_savings"], 2).tolist(),
+            "roi_percentage": np.round(summary["roi_percentage"], 2).tolist(),
+            "payback_period_years": summary["payback_period_years"].tolist(),
+            "npv": np.round(summary["npv"], 2).tolist(),
+            "count": int(summary["npv"].size),
+            "years": years,
+        }
+    
+    async def calculate_irr_batch(
+        self,
+        system_capacity_kw: Sequence[float],
+        locations,
+        installation_costs: Sequence[float],
+        subsidy_amounts: Optional[Sequence[float]] = None,
+        apply_subsidy: bool = False,
+        electricity_rate=8.0,
+        degradation_rate=0.5,
+        years: int = 25,
+    ) -> dict:
+        """Project IRR from the ROI cashflows (year 0: net cost after subsidy; years 1..N: savings)"""
+        if years <= 0:
+            raise ValueError("years must be positive")
+        capacity = np.atleast_1d(np.asarray(system_capacity_kw, dtype=np.float64))
+        if capacity.size > settings.EMI_BATCH_MAX_ROWS:
+            raise ValueError(f"Batch size exceeds limit of {settings.EMI_BATCH_MAX_ROWS} rows")
+        if isinstance(locations, str):
+            locations = [locations] * capacity.size
+        if len(locations) != capacity.size:
+            raise ValueError("locations must be a single value or match system_capacity_kw length")
+        cost = np.atleast_1d(np.asarray(installation_costs, dtype=np.float64))
+        if cost.size != capacity.size:
+            raise ValueError("installation_costs must match system_capacity_kw length")
+        
+        subsidy = np.zeros_like(capacity)
+        if subsidy_amounts is not None:
+            subsidy = np.atleast_1d(np.asarray(subsidy_amounts, dtype=np.float64))
+            if subsidy.size != capacity.size:
+                raise ValueError("subsidy_amounts must match system_capacity_kw length")
+        elif apply_subsidy:
+            rules = get_reference_data().subsidy_rules
+            states = np.asarray(locations)
+            for state in np.unique(states):
+                rows = states == state
+                central, state_amount = rules.calculate_array(capacity[rows], str(state))
+                subsidy[rows] = central + state_amount
+        net_cost = np.maximum(cost - subsidy, 0.0)
+        
+        # Same yearly savings series as calculate_roi
+        first_year = capacity * self.irradiation_for(locations) * 365 * np.asarray(electricity_rate, dtype=np.float64)
+        retention = np.power(1 - np.asarray(degradation_rate, dtype=np.float64) / 100, np.arange(years))
+        cashflows = np.concatenate([-net_cost[:, None], np.multiply.outer(first_year, retention)], axis=1)
+        
+        rate, converged = irr(cashflows)
+        irr_percentage = np.round(rate * 100, 4)
+        return {
+            "irr_percentage": [
+                value if ok else None for value, ok in zip(irr_percentage.tolist(), converged.tolist())
+            ],
+            "converged": converged.tolist(),
+            "net_cost": np.round(net_cost, 2).tolist(),
+            "count": int(capacity.size),
+            "years": years,
+        }
+    
+    async def simulate_roi_risk(
+        self,
+        system_capacity_kw: Decimal,
+        location: str,
+        installation_cost: Decimal,
+        electricity_rate: Decimal = Decimal("8.0"),
+        degradation_rate: Decimal = Decimal("0.5"),
+        years: int = 25,
+        paths: int = 10000,
+        seed: Optional[int] = None,
+        distributions: Optional[dict] = None,
+        percentiles: Sequence[float] = (10, 50, 90),
+        parallel: bool = False,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        pincode: Optional[str] = None,
+    ) -> dict:
+        """Monte Carlo ROI: percentile bands for NPV, payback and cumulative savings"""
+        if not 1 <= paths <= settings.ROI_SIMULATION_MAX_PATHS:
+            raise ValueError(f"paths must be between 1 and {settings.ROI_SIMULATION_MAX_PATHS}")
+        if years <= 0:
+            raise ValueError("years must be positive")
+        
+        dists = {name: dict(spec) for name, spec in RISK_DEFAULT_DISTRIBUTIONS.items()}
+        dists["degradation"]["mean"] = float(degradation_rate)
+        for name, spec in (distributions or {}).items():
+            if name not in dists:
+                raise ValueError(f"Unknown distribution: {name}")
+            dists[name] = {**dists[name], **spec}
+        # Validate every spec up front rather than inside a worker
+        validation_rng = np.random.default_rng(0)
+        for spec in dists.values():
+            try:
+                _sample(validation_rng, spec, 1)
+            except KeyError as e:
+                raise ValueError(f"Missing distribution parameter: {e.args[0]}")
+        
+        seed_sequence = np.random.SeedSequence(seed)
+        chunk_sizes = [RISK_CHUNK_PATHS] * (paths // RISK_CHUNK_PATHS)
+        if paths % RISK_CHUNK_PATHS:
+            chunk_sizes.append(paths % RISK_CHUNK_PATHS)
+        base = {
+            "system_capacity_kw": float(system_capacity_kw),
+            "irradiation": self.resolve_irradiation(location, latitude, longitude, pincode)[0],
+            "installation_cost": float(installation_cost),
+            "electricity_rate": float(electricity_rate),
+            "discount_rate": float(ROI_DISCOUNT_RATE),
+            "years": years,
+            "distributions": dists,
+        }
+        chunks = [
+            {**base, "paths": size, "seed": child}
+            for size, child in zip(chunk_sizes, seed_sequence.spawn(len(chunk_sizes)))
+        ]
+        
+        if parallel and len(chunks) > 1:
+            loop = asyncio.get_running_loop()
+            pool = _get_simulation_pool()
+            results = await asyncio.gather(*(loop.run_in_executor(pool, _simulate_roi_chunk, c) for c in chunks))
+        else:
+            results = await asyncio.to_thread(lambda: [_simulate_roi_chunk(c) for c in chunks])
+        
+        npv = np.concatenate([r[0] for r in results])
+        payback = np.concatenate([r[1] for r in results])
+        cumulative = np.concatenate([r[2] for r in results])
+        paid_back = np.concatenate([r[3] for r in results])
+        
+        def bands(values: np.ndarray) -> dict:
+            points = np.percentile(values, percentiles, axis=0)
+            return {f"p{p:g}": np.round(v, 2).tolist() for p, v in zip(percentiles, points)}
+        
+        yearly = bands(cumulative)
+        return {
+            "npv": bands(npv),
+            "payback_period_years": bands(payback),
+            "total_savings": bands(cumulative[:, -1]),
+            "cumulative_savings": [
+                {"year": year + 1, **{key: values[year] for key, values in yearly.items()}}
+                for year in range(years)
+            ],
+            "mean_npv": round(float(npv.mean()), 2),
+            "probability_of_payback": round(float(paid_back.mean()), 4),
+            "probability_npv_positive": round(float((npv > 0).mean()), 4),
+            "paths": paths,
+            "seed": seed_sequence.entropy,
+            "distributions": dists,
+            "system_capacity_kw": system_capacity_kw,
+            "installation_cost": installation_cost,
+            "years": years,
+        }
+
+
+# Shared instance for call sites
+calculation_service = CalculationService()
+
 
+def get_calculation_service() -> CalculationService:
+    """Get the process-wide CalculationService"""
+    return calculation_service
@@ -0,0 +1,106 @@
+"""
+Prediction Explainer
+
+Vectorized SHAP values for the positive class: TreeSHAP for tree ensembles
+(via the shap package), exact per-feature log-odds contributions for linear
+models. Explanations are CPU-heavy, so request-path callers run them in a
+process pool; each worker process loads the model artifact once
+(memory-mapped) and keeps the explainer for that version.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple
+import joblib
+import numpy as np
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_explain_pool: Optional[ProcessPoolExecutor] = None
+# Per-process explainers keyed by (artifact path or model name, version)
+_explainers: Dict[Tuple[str, str], Callable] = {}
+
+
+def build_explainer(model) -> Callable[[np.ndarray], np.ndarray]:
+    """Function mapping a feature matrix to SHAP values of shape (rows, features)"""
+    coef = getattr(model, "coef_", None)
+    if coef is not None:
+        # Linear models: coefficient x value (log-odds, relative to an all-zero input)
+        weights = np.asarray(coef, dtype=np.float64)[-1]
+        return lambda features: np.asarray(features, dtype=np.float64) * weights
+
+    import shap
+    tree_explainer = shap.TreeExplainer(model)
+
+    def explain(features):
+        values = tree_explainer.shap_values(np.asarray(features, dtype=np.float64))
+        if isinstance(values, list):
+            values = values[-1]
+        values = np.asarray(values)
+        # Multi-output classifiers return (rows, features, classes)
+        return values[..., -1] if values.ndim == 3 else values
+
+    return explain
+
+
+def explain_matrix(model, features: np.ndarray, key: Tuple[str, str] = None) -> np.ndarray:
+    """SHAP values for every row of `features`, reusing the explainer cached under `key`"""
+    explainer = _explainers.get(key) if key else None
+    if explainer is None:
+        explainer = build_explainer(model)
+        if key:
+            _explainers[key] = explainer
+    return explainer(features)
+
+
+def _explain_artifact(path: str, version: str, features: np.ndarray) -> np.ndarray:
+    """Process-pool entry point: load the artifact once per worker, then explain"""
+    key = (path, version)
+    if key not in _explainers:
+        _explainers[key] = build_explainer(joblib.load(path, mmap_mode="r" if settings.ML_MODELS_MMAP else None))
+    return _explainers[key](features)
+
+
+def _get_explain_pool() -> ProcessPoolExecutor:
+    """Lazily create the shared process pool for explanations"""
+    global _explain_pool
+    if _explain_pool is None:
+        _explain_pool = ProcessPoolExecutor(max_workers=settings.SHAP_WORKERS or None)
+    return _explain_pool
+
+
+async def explain_artifact(path: str, version: str, features: np.ndarray) -> np.ndarray:
+    """Explain a feature matrix in the process pool, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_explain_pool(), _explain_artifact, path, version, features)
+
+
+def shutdown_explain_pool():
+    """Shut down the explanation process pool (app shutdown)"""
+    global _explain_pool
+    if _explain_pool is not None:
+        _explain_pool.shutdown(cancel_futures=True)
+        _explain_pool = None
+
+
+def _impact(share: float, value: float) -> str:
+    level = "High" if share >= 0.4 else "Moderate" if share >= 0.15 else "Low"
+    return f"{level} {'positive' if value >= 0 else 'negative'} impact"
+
+
+def describe(shap_values: Dict[str, float]) -> Tuple[Dict[str, str], str]:
+    """Feature importance labels and a one-line explanation for one row of SHAP values"""
+    total = sum(abs(value) for value in shap_values.values()) or 1.0
+    ranked = sorted(shap_values, key=lambda name: abs(shap_values[name]), reverse=True)
+    importance = {name: _impact(abs(shap_values[name]) / total, shap_values[name]) for name in ranked}
+    drivers = " and ".join(name.replace("_", " ") for name in ranked[:2])
+    return importance, f"Loan eligibility is primarily driven by {drivers}."
+
+
+def shap_rows(feature_names: Sequence[str], values: np.ndarray) -> list:
+    """One {feature: value} dict per row"""
+    return [
+        {name: round(float(value), 6) for name, value in zip(feature_names, row)}
+        for row in np.atleast_2d(values)
+    ]
@@ -0,0 +1,169 @@
+"""
+Feature Assembly
+
+Builds model inputs from the loan application, the applicant's latest
+completed credit check and a summary of their KYC records, fetched for any
+number of loans with one joined query. Rows become a float32 matrix whose
+column order is fixed by a declared, versioned schema, so single-request
+scoring, batch scoring, explanations and prequalification all feed models
+identically.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, Mapping, Sequence, Tuple
+from uuid import UUID
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.credit import CreditCheck, CreditStatus
+from app.models.kyc import KYCRecord, KYCStatus
+from app.models.loan import LoanApplication
+
+
+@dataclass(frozen=True)
+class FeatureSchema:
+    """Named, ordered model inputs with defaults for missing values"""
+    name: str
+    version: str
+    features: Tuple[str, ...]
+    defaults: Mapping[str, float]
+    # Columns consumed by models that do not declare their own inputs (artifacts trained before this schema)
+    legacy_features: Tuple[str, ...] = ()
+
+    def row(self, values: Mapping[str, object]) -> Dict[str, float]:
+        """Complete feature dict in schema order; unknown keys are dropped"""
+        row = {}
+        for name in self.features:
+            value = values.get(name)
+            row[name] = float(self.defaults.get(name, 0.0) if value is None else value)
+        return row
+
+    def matrix(self, rows: Sequence[Mapping[str, object]], columns: Sequence[str] = None) -> np.ndarray:
+        """float32 matrix of `rows` with `columns` (default: the whole schema) in order"""
+        columns = tuple(columns or self.features)
+        unknown = set(columns) - set(self.features)
+        if unknown:
+            raise ValueError(f"Features not in schema {self.name}/{self.version}: {sorted(unknown)}")
+        matrix = np.empty((len(rows), len(columns)), dtype=np.float32)
+        for i, values in enumerate(rows):
+            row = self.row(values)
+            matrix[i] = [row[name] for name in columns]
+        return matrix
+
+    def column_matrix(self, values: Mapping[str, np.ndarray], rows: int, columns: Sequence[str] = None) -> np.ndarray:
+        """float32 matrix from per-feature arrays (missing features or NaNs take the default)"""
+        columns = tuple(columns or self.features)
+        matrix = np.empty((rows, len(columns)), dtype=np.float32)
+        for j, name in enumerate(columns):
+            if name not in self.features:
+                raise ValueError(f"Feature not in schema {self.name}/{self.version}: {name}")
+            column = values.get(name)
+            default = self.defaults.get(name, 0.0)
+            matrix[:, j] = default if column is None else np.where(np.isnan(column), default, column)
+        return matrix
+
+    def model_columns(self, model) -> Tuple[str, ...]:
+        """Schema columns a model consumes, in its training order"""
+        names = getattr(model, "feature_names_in_", None)
+        if names is not None:
+            return tuple(str(name) for name in names)
+        if getattr(model, "n_features_in_", None) == len(self.features) or not self.legacy_features:
+            return self.features
+        return self.legacy_features
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "dtype": "float32",
+            "features": list(self.features),
+            "defaults": dict(self.defaults),
+        }
+
+
+# Applicants without a credit report are scored as an average bureau score, on every path
+DEFAULT_CREDIT_SCORE = 700.0
+
+ELIGIBILITY_SCHEMA = FeatureSchema(
+    name="eligibility",
+    version="3",
+    features=(
+        "annual_income",
+        "loan_amount",
+        "existing_loans",
+        "loan_tenure_years",
+        "system_capacity_kw",
+        "credit_score",
+        "kyc_verified_count",
+        "kyc_failed_count",
+    ),
+    defaults={"loan_tenure_years": 5.0, "credit_score": DEFAULT_CREDIT_SCORE},
+    legacy_features=("annual_income", "loan_amount"),
+)
+
+
+# Inputs of the roi_prediction model, which predicts annual yield (kWh per kW);
+# a roof of unknown pitch is taken as a typical 20° Indian rooftop tilt, not flat
+ROI_SCHEMA = FeatureSchema(
+    name="roi_prediction",
+    version="1",
+    features=("system_capacity_kw", "irradiation", "roof_angle"),
+    defaults={"roof_angle": 20.0},
+)
+
+
+def applicant_features(**values) -> Dict[str, float]:
+    """Eligibility feature row from raw values, e.g. a prequalification request with no stored loan"""
+    return ELIGIBILITY_SCHEMA.row(values)
+
+
+def _latest_credit_scores(user_ids):
+    ranked = select(
+        CreditCheck.user_id,
+        CreditCheck.credit_score,
+        func.row_number().over(
+            partition_by=CreditCheck.user_id, order_by=CreditCheck.created_at.desc(),
+        ).label("recency"),
+    ).where(
+        CreditCheck.user_id.in_(user_ids),
+        CreditCheck.status == CreditStatus.COMPLETED,
+    ).subquery()
+    return select(ranked.c.user_id, ranked.c.credit_score).where(ranked.c.recency == 1).subquery()
+
+
+def _kyc_summary(user_ids):
+    return select(
+        KYCRecord.user_id,
+        func.sum(case((KYCRecord.is_verified.is_(True), 1), else_=0)).label("verified"),
+        func.sum(case((KYCRecord.status.in_([KYCStatus.FAILED, KYCStatus.REJECTED]), 1), else_=0)).label("failed"),
+    ).where(KYCRecord.user_id.in_(user_ids)).group_by(KYCRecord.user_id).subquery()
+
+
+async def load_loan_features(
+    db: AsyncSession, loan_ids: Iterable[UUID],
+) -> Dict[UUID, Tuple[LoanApplication, Dict[str, float]]]:
+    """Loan and its eligibility feature row for every existing loan ID, in one query"""
+    loan_ids = list(loan_ids)
+    if not loan_ids:
+        return {}
+    user_ids = select(LoanApplication.user_id).where(LoanApplication.id.in_(loan_ids)).scalar_subquery()
+    credit = _latest_credit_scores(user_ids)
+    kyc = _kyc_summary(user_ids)
+    result = await db.execute(
+        select(LoanApplication, credit.c.credit_score, kyc.c.verified, kyc.c.failed)
+        .outerjoin(credit, credit.c.user_id == LoanApplication.user_id)
+        .outerjoin(kyc, kyc.c.user_id == LoanApplication.user_id)
+        .where(LoanApplication.id.in_(loan_ids))
+    )
+    return {
+        loan.id: (loan, applicant_features(
+            annual_income=loan.annual_income,
+            loan_amount=loan.loan_amount,
+            existing_loans=loan.existing_loans,
+            loan_tenure_years=loan.loan_tenure_years,
+            system_capacity_kw=loan.system_capacity_kw,
+            credit_score=credit_score,
+            kyc_verified_count=verified,
+            kyc_failed_count=failed,
+        ))
+        for loan, credit_score, verified, failed in result.all()
+    }
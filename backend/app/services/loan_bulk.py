@@ -0,0 +1,170 @@
+"""
+Bulk Loan Import
+
+Creates loan applications from a partner upload (JSON lines or CSV streamed
+from the request body). Records are validated with LoanApplicationCreate as
+they arrive and inserted LOAN_BULK_CHUNK_ROWS at a time with one multi-row
+INSERT ... RETURNING and one commit per chunk. Submitted imports are inserted
+with their subsidy and EMI already computed, write their `submitted` events in
+that commit and hand the whole chunk to the workers as one Celery group. The
+upload is read while it is imported, so memory holds one chunk of records
+(plus the short per-row results).
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from uuid import UUID, uuid4
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.loan import LoanApplication, LoanStatus
+from app.models.workflow import WorkflowEventType
+from app.schemas.loan import LoanApplicationCreate
+from app.services.loan_workflow import LoanWorkflow, WORKFLOW_STEPS, ready_steps
+from app.services.workflow_events import WorkflowEventBuffer
+import logging
+
+logger = logging.getLogger(__name__)
+
+JSONL_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines", "application/x-jsonlines")
+FIELDS = tuple(LoanApplicationCreate.model_fields)
+
+
+def _error_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+        )
+    return str(error)
+
+
+def validate_header(header) -> List[str]:
+    """Normalised CSV header, or ValueError on unknown or missing columns"""
+    header = [name.strip().lower() for name in header]
+    unknown = [name for name in header if name and name not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    missing = [name for name, field in LoanApplicationCreate.model_fields.items() if field.is_required() and name not in header]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return header
+
+
+async def jsonl_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(row, record, parse error) for each non-blank line"""
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "Row must be a JSON object"
+            continue
+        yield row, record, None
+
+
+async def csv_records(header: List[str], rows: AsyncIterator[List[str]]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(row, record, parse error) for each CSV record after the header; blank cells are left unset"""
+    row = 0
+    async for values in rows:
+        row += 1
+        if len(values) != len(header):
+            yield row, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row, {name: value.strip() for name, value in zip(header, values) if name and value.strip()}, None
+
+
+async def _insert_chunk(db: AsyncSession, chunk: List[Tuple[int, dict, Optional[WorkflowEventBuffer]]]) -> List[dict]:
+    """One INSERT ... RETURNING (and one commit) for a chunk of validated rows"""
+    # Core insert on the table: the ORM bulk path would split the chunk by which columns are None
+    table = LoanApplication.__table__
+    statement = insert(table).returning(table.c.id, table.c.status, sort_by_parameter_order=True)
+    try:
+        inserted = (await db.execute(statement, [values for _, values, _ in chunk])).all()
+        staged = [(events, events.stage(db)) for _, _, events in chunk if events is not None]
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        logger.warning(f"Bulk loan chunk of {len(chunk)} rows rejected by the database: {e}")
+        error = f"Rejected by the database with its chunk: {getattr(e, 'orig', None) or e}"
+        return [{"row": row, "loan_id": None, "status": None, "error": error} for row, _, _ in chunk]
+
+    if staged:
+        await asyncio.gather(*(events.publish(committed) for events, committed in staged))
+        from app.tasks.loan_tasks import enqueue_loan_workflows
+        try:
+            enqueue_loan_workflows({
+                str(values["id"]): ready_steps(values["workflow_data"]["steps"])
+                for _, values, events in chunk if events is not None
+            })
+        except Exception as e:
+            # The loans stay submitted; the resume sweep enqueues them once the broker is back
+            logger.error(f"Failed to enqueue workflows for {len(staged)} bulk-imported loans: {e}")
+    return [
+        {"row": row, "loan_id": str(loan_id), "status": status.value, "error": None}
+        for (row, _, _), (loan_id, status) in zip(chunk, inserted)
+    ]
+
+
+async def import_loans(
+    db: AsyncSession,
+    user_id: UUID,
+    records: AsyncIterator[Tuple[int, Optional[dict], Optional[str]]],
+    submit: bool = False,
+) -> dict:
+    """Validate and insert records chunk by chunk as the upload is read; per-row results in row order"""
+    start = time.perf_counter()
+    chunk: List[Tuple[int, dict, Optional[WorkflowEventBuffer]]] = []
+    results: List[dict] = []
+    async for row, record, error in records:
+        if row > settings.LOAN_BULK_MAX_ROWS:
+            results.append({"row": row, "loan_id": None, "status": None, "error": f"Upload exceeds {settings.LOAN_BULK_MAX_ROWS} rows; the rest was not read"})
+            break
+        if error is None:
+            try:
+                values = {
+                    **LoanApplicationCreate.model_validate(record).model_dump(),
+                    "user_id": user_id,
+                    "status": LoanStatus.DRAFT,
+                }
+                events = None
+                if submit:
+                    # IDs are assigned here so the submission events can be recorded before the insert
+                    values.update(
+                        id=uuid4(),
+                        status=LoanStatus.SUBMITTED,
+                        submitted_at=datetime.utcnow(),
+                        current_step=WORKFLOW_STEPS[0],
+                    )
+                    events = WorkflowEventBuffer(values["id"])
+                    events.record(WorkflowEventType.SUBMITTED, status=LoanStatus.SUBMITTED)
+                    data, fields = await LoanWorkflow.submission_state(LoanApplication(**values), events)
+                    values.update(fields, workflow_data=data)
+                chunk.append((row, values, events))
+            except ValidationError as e:
+                error = _error_message(e)
+        if error is not None:
+            results.append({"row": row, "loan_id": None, "status": None, "error": error})
+        if len(chunk) >= settings.LOAN_BULK_CHUNK_ROWS:
+            results.extend(await _insert_chunk(db, chunk))
+            chunk = []
+    if chunk:
+        results.extend(await _insert_chunk(db, chunk))
+    
+    results.sort(key=lambda result: result["row"])
+    failed = sum(1 for result in results if result["error"])
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Bulk loan import for user {user_id}: {len(results) - failed} created, {failed} failed "
+        f"in {elapsed:.2f}s{' (submitted)' if submit else ''}"
+    )
+    return {"created": len(results) - failed, "failed": failed, "submitted": submit, "results": results}
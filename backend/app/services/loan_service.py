@@ -1,17 +1,25 @@
 """
 Loan Service
 """
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+from typing import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select
+from app.core.config import settings
+from app.core.event_broker import get_event_broker
 from app.models.loan import LoanApplication, LoanStatus
 from app.schemas.loan import LoanApplicationCreate, LoanApplicationUpdate
-from app.services.kyc_service import KYCService
-from app.services.credit_service import CreditService
-from app.services.ai_service import AIService
-from app.services.calculation_service import CalculationService
+from app.models.workflow import WorkflowEventType
+from app.services.loan_workflow import ACTIVE_STATUSES, LoanWorkflow, WORKFLOW_STEPS
+from app.services.workflow_events import (
+    TERMINAL_EVENTS,
+    WorkflowEventBuffer,
+    format_sse,
+    list_events,
+    workflow_snapshot,
+)
 from datetime import datetime
 from uuid import UUID
-from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
@@ -87,122 +95,62 @@ class LoanService:
         loan_id: UUID,
         user_id: UUID,
     ) -> LoanApplication:
-        """Submit loan application and trigger workflow"""
+        """Submit loan application and hand its workflow to the Celery workers"""
+        from app.tasks.loan_tasks import enqueue_loan_workflow
+        
         loan = await LoanService.get_loan(db, loan_id, user_id)
         
         if loan.status != LoanStatus.DRAFT:
             raise ValueError("Loan application already submitted")
         
-        # Update status
         loan.status = LoanStatus.SUBMITTED
         loan.submitted_at = datetime.utcnow()
-        loan.current_step = "kyc"
+        loan.current_step = WORKFLOW_STEPS[0]
+        events = WorkflowEventBuffer(loan.id)
+        events.record(WorkflowEventType.SUBMITTED, status=loan.status)
+        # Subsidy and EMI are computed here and committed with the submission
+        loan.workflow_data, fields = await LoanWorkflow.submission_state(loan, events)
+        for name, value in fields.items():
+            setattr(loan, name, value)
+        committed = events.stage(db)
         await db.commit()
+        await events.publish(committed)
         
-        # Trigger workflow asynchronously (in production, use Celery)
         try:
-            await LoanService._run_workflow(db, loan)
+            enqueue_loan_workflow(str(loan.id), LoanWorkflow.pending_steps(loan))
         except Exception as e:
-            logger.error(f"Workflow error for loan {loan_id}: {e}")
-            loan.status = LoanStatus.REJECTED
-            loan.workflow_data = {"error": str(e)}
-            await db.commit()
+            # The loan stays submitted; the resume sweep enqueues it once the broker is back
+            logger.error(f"Failed to enqueue workflow for loan {loan_id}: {e}")
         
-        await db.refresh(loan)
         return loan
     
     @staticmethod
-    async def _run_workflow(db: AsyncSession, loan: LoanApplication):
-        """Run loan processing workflow"""
-        workflow_steps = []
-        
+    async def get_workflow_events(db: AsyncSession, loan_id: UUID, user_id: UUID):
+        """Workflow event log of a loan, oldest first"""
+        await LoanService.get_loan(db, loan_id, user_id)
+        return await list_events(db, loan_id)
+    
+    @staticmethod
+    async def event_stream(bind, loan_id: UUID) -> AsyncIterator[str]:
+        """Server-Sent Events: a snapshot of the workflow, then its events until it finishes"""
+        broker = get_event_broker()
+        queue = broker.subscribe(loan_id)
         try:
-            # Step 1: KYC
-            loan.status = LoanStatus.KYC_IN_PROGRESS
-            loan.current_step = "kyc"
-            await db.commit()
-            
-            kyc_service = KYCService()
-            kyc_result = await kyc_service.run_kyc_checks(db, loan.user_id, loan.id)
-            workflow_steps.append("kyc_completed")
-            
-            loan.status = LoanStatus.KYC_COMPLETED
-            loan.current_step = "cibil"
-            await db.commit()
-            
-            # Step 2: CIBIL Check
-            loan.status = LoanStatus.CIBIL_CHECKING
-            await db.commit()
-            
-            credit_service = CreditService()
-            cibil_result = await credit_service.fetch_cibil(db, loan.user_id, loan.id, loan.pan_number)
-            workflow_steps.append("cibil_completed")
-            
-            loan.status = LoanStatus.CIBIL_COMPLETED
-            loan.current_step = "ai_eligibility"
-            await db.commit()
-            
-            # Step 3: AI Eligibility
-            loan.status = LoanStatus.AI_ELIGIBILITY_CHECKING
-            await db.commit()
-            
-            ai_result = await AIService.check_eligibility(db, loan.id)
-            loan.ai_eligibility_score = ai_result.get("eligibility_score")
-            loan.ai_eligibility_result = ai_result
-            workflow_steps.append("ai_eligibility_completed")
-            
-            loan.status = LoanStatus.AI_ELIGIBILITY_COMPLETED
-            loan.current_step = "subsidy"
-            await db.commit()
-            
-            # Step 4: Subsidy Check
-            loan.status = LoanStatus.SUBSIDY_CHECKING
-            await db.commit()
-            
-            calc_service = CalculationService()
-            subsidy_result = await calc_service.calculate_subsidy(
-                loan.system_capacity_kw,
-                loan.state,
-            )
-            loan.subsidy_amount = subsidy_result.get("subsidy_amount")
-            workflow_steps.append("subsidy_completed")
-            
-            loan.status = LoanStatus.SUBSIDY_COMPLETED
-            loan.current_step = "emi"
-            await db.commit()
-            
-            # Step 5: EMI Calculation
-            calc_service = CalculationService()
-            emi_result = await calc_service.calculate_emi(
-                loan.loan_amount,
-                loan.interest_rate or Decimal("8.5"),
-                loan.loan_tenure_years or 5,
-            )
-            loan.emi_amount = emi_result.get("emi_amount")
-            workflow_steps.append("emi_calculated")
-            
-            loan.status = LoanStatus.EMI_CALCULATED
-            loan.current_step = "review"
-            
-            # Store workflow data
-            loan.workflow_data = {
-                "steps": workflow_steps,
-                "kyc_result": kyc_result,
-                "cibil_result": cibil_result,
-                "ai_result": ai_result,
-                "subsidy_result": subsidy_result,
-                "emi_result": emi_result,
-            }
-            
-            await db.commit()
-            
-        except Exception as e:
-            logger.error(f"Workflow failed for loan {loan.id}: {e}")
-            loan.status = LoanStatus.REJECTED
-            loan.workflow_data = {
-                "error": str(e),
-                "completed_steps": workflow_steps,
-            }
-            await db.commit()
-            raise
-
+            # Snapshot after subscribing, so no event is lost in between (clients dedupe by id)
+            async with async_sessionmaker(bind, class_=AsyncSession, expire_on_commit=False)() as db:
+                loan = await LoanWorkflow.get_loan(db, loan_id)
+            yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+            yield format_sse("snapshot", workflow_snapshot(loan))
+            if loan.status != LoanStatus.DRAFT and loan.status not in ACTIVE_STATUSES:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event["event"], event, event.get("id"))
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            broker.unsubscribe(loan_id, queue)
@@ -0,0 +1,388 @@
+"""
+Loan Workflow
+
+The post-submission pipeline as a resumable DAG of steps. KYC, CIBIL, subsidy
+and EMI do not depend on each other and start together; AI eligibility joins
+on KYC and CIBIL, whose results are among its features. Subsidy and EMI are
+pure calculations, so they run inside the submit commit (INLINE_STEPS) and
+only KYC, CIBIL and AI eligibility reach the workers. Each step's result is
+checkpointed in `workflow_data` under a row lock, merged with whatever
+concurrent steps have recorded. That checkpoint is the only write a step
+makes to the loan: transitions (step completed, failed) go to the buffered
+`workflow_events` log in the same commit, and to Redis for live progress,
+instead of a row update per transient status; a step starting is only
+published to Redis. Re-running a step that is already
+checkpointed is a no-op, so a step may be retried or redelivered after a
+worker crash; the Celery tasks in app.tasks.loan_tasks fan ready steps out as
+a group and retry failures with backoff.
+
+workflow_data layout:
+    {"steps": ["kyc", ...], "results": {"kyc": {...}}, "attempts": {"kyc": 1},
+     "timings": {"kyc": {"started_at": "...", "duration_ms": 12.5}},
+     "critical_path": {"steps": ["cibil", "ai_eligibility"], "duration_ms": 40.1, "elapsed_ms": 55.0},
+     "failed_step": None, "error": None}
+"""
+import asyncio
+import contextlib
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.core.config import settings
+from app.models.credit import CreditStatus
+from app.models.loan import LoanApplication, LoanStatus
+from app.services.ai_service import AIService
+from app.services.calculation_service import get_calculation_service
+from app.services.credit_service import CreditService
+from app.services.kyc_service import KYCService
+from app.models.workflow import WorkflowEventType
+from app.services.workflow_events import WorkflowEventBuffer
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Canonical order, used to derive the loan's status
+WORKFLOW_STEPS = ("kyc", "cibil", "ai_eligibility", "subsidy", "emi")
+STEP_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "kyc": (),
+    "cibil": (),
+    "ai_eligibility": ("kyc", "cibil"),
+    "subsidy": (),
+    "emi": (),
+}
+FINAL_STEP = "review"
+# Pure, deterministic steps with no dependencies: run inside the submit commit, not as checkpoints of their own
+INLINE_STEPS = ("subsidy", "emi")
+# Step -> (status reported while it runs, status once it and every earlier step are done)
+STEP_STATUSES = {
+    "kyc": (LoanStatus.KYC_IN_PROGRESS, LoanStatus.KYC_COMPLETED),
+    "cibil": (LoanStatus.CIBIL_CHECKING, LoanStatus.CIBIL_COMPLETED),
+    "ai_eligibility": (LoanStatus.AI_ELIGIBILITY_CHECKING, LoanStatus.AI_ELIGIBILITY_COMPLETED),
+    "subsidy": (LoanStatus.SUBSIDY_CHECKING, LoanStatus.SUBSIDY_COMPLETED),
+    "emi": (LoanStatus.SUBSIDY_COMPLETED, LoanStatus.EMI_CALCULATED),
+}
+# Statuses of a loan whose workflow has not finished
+ACTIVE_STATUSES = (LoanStatus.SUBMITTED,) + tuple(
+    status for running, completed in STEP_STATUSES.values() for status in (running, completed)
+    if status != LoanStatus.EMI_CALCULATED
+)
+
+
+def _json_default(value):
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+
+def _jsonable(value):
+    """Round-trip through JSON so Decimals (as numbers), UUIDs and datetimes fit a JSON column"""
+    return json.loads(json.dumps(value, default=_json_default))
+
+
+def ready_steps(done) -> List[str]:
+    """Unfinished steps whose dependencies are all done"""
+    done = set(done)
+    return [
+        step for step in WORKFLOW_STEPS
+        if step not in done and all(dependency in done for dependency in STEP_DEPENDENCIES[step])
+    ]
+
+
+def critical_path(durations: Mapping[str, float]) -> Tuple[List[str], float]:
+    """Longest dependency chain by step duration (ms): the workflow's latency floor"""
+    finish: Dict[str, float] = {}
+    via: Dict[str, Optional[str]] = {}
+    for step in WORKFLOW_STEPS:
+        slowest = max(STEP_DEPENDENCIES[step], key=lambda dependency: finish[dependency], default=None)
+        via[step] = slowest
+        finish[step] = durations.get(step, 0.0) + (finish[slowest] if slowest else 0.0)
+    step = max(finish, key=finish.get)
+    total = finish[step]
+    path = []
+    while step:
+        path.append(step)
+        step = via[step]
+    return path[::-1], round(total, 3)
+
+
+def _status_for(done) -> Tuple[LoanStatus, str]:
+    """Loan status and current_step for a set of finished steps: the completed status of the longest done prefix"""
+    status = LoanStatus.SUBMITTED
+    for step in WORKFLOW_STEPS:
+        if step not in done:
+            return status, step
+        status = STEP_STATUSES[step][1]
+    return status, FINAL_STEP
+
+
+async def _run_kyc(db: AsyncSession, loan: LoanApplication) -> Tuple[dict, dict]:
+    return await KYCService().run_kyc_checks(db, loan.user_id, loan.id), {}
+
+
+async def _run_cibil(db: AsyncSession, loan: LoanApplication) -> Tuple[dict, dict]:
+    # Reuses the applicant's report while it is valid, so a retry does not pull the bureau again
+    credit_check = await CreditService().fetch_cibil(db, loan.user_id, loan.id, loan.pan_number)
+    if credit_check.status != CreditStatus.COMPLETED:
+        raise RuntimeError(f"CIBIL fetch failed: {(credit_check.meta_data or {}).get('error', 'unknown error')}")
+    return {
+        "credit_check_id": str(credit_check.id),
+        "credit_score": credit_check.credit_score,
+        "credit_rating": credit_check.credit_rating,
+    }, {}
+
+
+async def _run_ai_eligibility(db: AsyncSession, loan: LoanApplication) -> Tuple[dict, dict]:
+    # The audit prediction joins the step's checkpoint commit, so a retried or redelivered step cannot store it twice
+    result = await AIService.check_eligibility(db, loan.id, explain_inline=True, commit=False)
+    return result, {"ai_eligibility_score": result.get("eligibility_score"), "ai_eligibility_result": _jsonable(result)}
+
+
+async def _run_subsidy(db: AsyncSession, loan: LoanApplication) -> Tuple[dict, dict]:
+    result = await get_calculation_service().calculate_subsidy(loan.system_capacity_kw, loan.state)
+    return result, {"subsidy_amount": result.get("subsidy_amount")}
+
+
+async def _run_emi(db: AsyncSession, loan: LoanApplication) -> Tuple[dict, dict]:
+    result = await get_calculation_service().calculate_emi(
+        loan.loan_amount,
+        loan.interest_rate or Decimal("8.5"),
+        loan.loan_tenure_years or 5,
+    )
+    return result, {"emi_amount": result.get("emi_amount")}
+
+
+# Step -> coroutine returning (result, loan columns to set at the checkpoint)
+STEP_RUNNERS: Dict[str, Callable[[AsyncSession, LoanApplication], Awaitable[Tuple[dict, dict]]]] = {
+    "kyc": _run_kyc,
+    "cibil": _run_cibil,
+    "ai_eligibility": _run_ai_eligibility,
+    "subsidy": _run_subsidy,
+    "emi": _run_emi,
+}
+
+
+class InvalidWorkflowTask(ValueError):
+    """A step task that can never succeed (unknown loan or step); not retried"""
+
+
+class LoanWorkflow:
+    """Checkpointed loan processing steps"""
+
+    @staticmethod
+    def initial_state() -> dict:
+        return {
+            "steps": [], "results": {}, "attempts": {}, "timings": {},
+            "critical_path": None, "failed_step": None, "error": None,
+        }
+
+    @staticmethod
+    async def submission_state(loan: LoanApplication, events: WorkflowEventBuffer = None) -> Tuple[dict, dict]:
+        """workflow_data and loan columns at submit, with INLINE_STEPS already run; a failing one is left to the workers"""
+        data = LoanWorkflow.initial_state()
+        fields = {}
+        for step in INLINE_STEPS:
+            started_at = datetime.utcnow()
+            start = time.perf_counter()
+            try:
+                result, step_fields = await STEP_RUNNERS[step](None, loan)
+            except Exception as e:
+                logger.warning(f"Loan {loan.id}: inline workflow step {step} failed at submit ({e}); queued instead")
+                continue
+            duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            data["steps"].append(step)
+            data["results"][step] = _jsonable(result)
+            data["attempts"][step] = 1
+            data["timings"][step] = {"started_at": started_at.isoformat(), "duration_ms": duration_ms}
+            fields.update(step_fields)
+            if events is not None:
+                events.record(WorkflowEventType.STEP_COMPLETED, step, LoanStatus.SUBMITTED, attempt=1, duration_ms=duration_ms)
+        return data, fields
+
+    @staticmethod
+    def pending_steps(loan: LoanApplication) -> List[str]:
+        """Steps that can start now; empty when the workflow is finished or rejected"""
+        if loan.status not in ACTIVE_STATUSES:
+            return []
+        return ready_steps((loan.workflow_data or {}).get("steps", []))
+
+    @staticmethod
+    async def _lock_loan(db: AsyncSession, loan_id: UUID) -> LoanApplication:
+        # populate_existing: pick up checkpoints committed by concurrent steps
+        result = await db.execute(
+            select(LoanApplication)
+            .where(LoanApplication.id == loan_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        loan = result.scalar_one_or_none()
+        if not loan:
+            raise InvalidWorkflowTask("Loan application not found")
+        return loan
+
+    @staticmethod
+    async def run_step(
+        db: AsyncSession, loan_id: UUID, step: str, checkpoint_lock: asyncio.Lock = None,
+    ) -> List[str]:
+        """Run `step` unless it is already checkpointed; returns the steps it made ready"""
+        if step not in STEP_RUNNERS:
+            raise InvalidWorkflowTask(f"Unknown workflow step: {step}")
+        # The row lock serializes checkpoints across workers; `checkpoint_lock` does so between
+        # concurrent steps in one process when the database ignores row locks (SQLite)
+        checkpoint_lock = checkpoint_lock or contextlib.nullcontext()
+        loan = await LoanWorkflow.get_loan(db, loan_id)
+        data = {**LoanWorkflow.initial_state(), **(loan.workflow_data or {})}
+        # End the read transaction; nothing is written until the step boundary
+        await db.commit()
+        if loan.status not in ACTIVE_STATUSES or step in data["steps"]:
+            return []
+
+        # Start of the step: Redis only, neither the row nor the event log is written
+        events = WorkflowEventBuffer(loan_id)
+        attempt = data["attempts"].get(step, 0) + 1
+        started_at = datetime.utcnow()
+        await events.announce(WorkflowEventType.STEP_STARTED, step, STEP_STATUSES[step][0], attempt=attempt)
+
+        start = time.perf_counter()
+        try:
+            result, fields = await STEP_RUNNERS[step](db, loan)
+        except Exception as e:
+            duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            failed = events.record(
+                WorkflowEventType.STEP_FAILED, step, _status_for(data["steps"])[0],
+                attempt=attempt, duration_ms=duration_ms, error=str(e),
+            )
+            await db.rollback()
+            async with checkpoint_lock:
+                loan = await LoanWorkflow._lock_loan(db, loan_id)
+                data = {**LoanWorkflow.initial_state(), **(loan.workflow_data or {})}
+                loan.workflow_data = {**data, "attempts": {**data["attempts"], step: data["attempts"].get(step, 0) + 1}}
+                events.stage(db)
+                await db.commit()
+            await events.publish([failed])
+            raise
+        duration_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        # Result, loan columns, status and the buffered events land in one commit: the checkpoint
+        async with checkpoint_lock:
+            loan = await LoanWorkflow._lock_loan(db, loan_id)
+            data = {**LoanWorkflow.initial_state(), **(loan.workflow_data or {})}
+            if step in data["steps"]:
+                # A redelivered copy of this step got there first; drop what this one staged
+                await db.rollback()
+                return []
+            done = data["steps"] + [step]
+            timings = {**data["timings"], step: {"started_at": started_at.isoformat(), "duration_ms": duration_ms}}
+            data = {
+                **data,
+                "steps": done,
+                "results": {**data["results"], step: _jsonable(result)},
+                "attempts": {**data["attempts"], step: data["attempts"].get(step, 0) + 1},
+                "timings": timings,
+            }
+            for name, value in fields.items():
+                setattr(loan, name, value)
+            ready, finished = [], False
+            if loan.status in ACTIVE_STATUSES:
+                loan.status, loan.current_step = _status_for(done)
+                ready = [later for later in ready_steps(done) if step in STEP_DEPENDENCIES[later]]
+                finished = len(done) == len(WORKFLOW_STEPS)
+            events.record(WorkflowEventType.STEP_COMPLETED, step, loan.status, attempt=attempt, duration_ms=duration_ms)
+            if finished:
+                data["critical_path"] = LoanWorkflow._critical_path(timings)
+                events.record(WorkflowEventType.COMPLETED, status=loan.status, data=data["critical_path"])
+            loan.workflow_data = data
+            committed = events.stage(db)
+            await db.commit()
+        await events.publish(committed)
+        logger.info(f"Loan {loan_id}: workflow step {step} completed in {duration_ms:.1f} ms")
+        if data["critical_path"]:
+            path = data["critical_path"]
+            logger.info(
+                f"Loan {loan_id}: workflow finished, critical path {' -> '.join(path['steps'])} "
+                f"{path['duration_ms']:.1f} ms, elapsed {path['elapsed_ms']:.1f} ms"
+            )
+        return ready
+
+    @staticmethod
+    def _critical_path(timings: dict) -> dict:
+        steps, duration_ms = critical_path({step: timing["duration_ms"] for step, timing in timings.items()})
+        first_start = min(datetime.fromisoformat(timing["started_at"]) for timing in timings.values())
+        return {
+            "steps": steps,
+            "duration_ms": duration_ms,
+            # Wall clock from the first step starting, including queueing and retries
+            "elapsed_ms": round((datetime.utcnow() - first_start).total_seconds() * 1000, 3),
+        }
+
+    @staticmethod
+    async def fail(db: AsyncSession, loan_id: UUID, step: str, error: str):
+        """Reject the loan after `step` has exhausted its retries"""
+        await db.rollback()
+        loan = await LoanWorkflow._lock_loan(db, loan_id)
+        data = {**LoanWorkflow.initial_state(), **(loan.workflow_data or {})}
+        loan.status = LoanStatus.REJECTED
+        loan.workflow_data = {**data, "failed_step": step, "error": error}
+        events = WorkflowEventBuffer(loan_id)
+        events.record(WorkflowEventType.REJECTED, step, loan.status, error=error)
+        committed = events.stage(db)
+        await db.commit()
+        await events.publish(committed)
+        logger.error(f"Loan {loan_id}: workflow failed at {step}: {error}")
+
+    @staticmethod
+    async def get_loan(db: AsyncSession, loan_id: UUID) -> LoanApplication:
+        """Current state of a loan, without locking it"""
+        result = await db.execute(
+            select(LoanApplication)
+            .where(LoanApplication.id == loan_id)
+            .execution_options(populate_existing=True)
+        )
+        loan = result.scalar_one_or_none()
+        if not loan:
+            raise InvalidWorkflowTask("Loan application not found")
+        return loan
+
+    @staticmethod
+    async def resume_point(db: AsyncSession, loan_id: UUID) -> List[str]:
+        """Steps of a stored loan that can start now"""
+        return LoanWorkflow.pending_steps(await LoanWorkflow.get_loan(db, loan_id))
+
+    @staticmethod
+    async def run(db: AsyncSession, loan_id: UUID):
+        """Run every remaining step inline, independent steps concurrently on sessions of their own"""
+        session_factory = async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+        checkpoint_lock = asyncio.Lock()
+
+        async def branch(step: str):
+            async with session_factory() as session:
+                ready = await LoanWorkflow.run_step(session, loan_id, step, checkpoint_lock)
+            await LoanWorkflow._gather(branch, ready)
+
+        await LoanWorkflow._gather(branch, await LoanWorkflow.resume_point(db, loan_id))
+
+    @staticmethod
+    async def _gather(branch, steps: List[str]):
+        # Let every branch settle before surfacing the first failure
+        outcomes = await asyncio.gather(*(branch(step) for step in steps), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+    @staticmethod
+    async def stalled(db: AsyncSession, limit: int = 500) -> List[Tuple[UUID, List[str]]]:
+        """(loan ID, startable steps) of active workflows untouched for LOAN_WORKFLOW_STALL_SECONDS"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.LOAN_WORKFLOW_STALL_SECONDS)
+        result = await db.execute(
+            select(LoanApplication)
+            .where(LoanApplication.status.in_(ACTIVE_STATUSES), LoanApplication.updated_at < cutoff)
+            .order_by(LoanApplication.updated_at)
+            .limit(limit)
+        )
+        stalled = []
+        for loan in result.scalars():
+            steps = LoanWorkflow.pending_steps(loan)
+            if steps:
+                stalled.append((loan.id, steps))
+        return stalled
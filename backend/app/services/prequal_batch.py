@@ -0,0 +1,245 @@
+"""
+Bulk Prequalification
+
+Scores lead lists (CSV streamed from the request body, or Parquet) in chunks
+of PREQUAL_BATCH_CHUNK_ROWS: each chunk is parsed into NumPy columns, scored
+as one vector operation (or one predict_proba on the prequal model) in a
+worker thread, and written out as CSV before the next chunk is read, so
+memory stays flat whatever the file size.
+"""
+import asyncio
+import codecs
+import collections
+import csv
+import io
+import time
+from typing import AsyncIterator, Dict, Iterator, List
+import numpy as np
+from app.core.config import settings
+from app.core.inference_executor import run_model_sync
+from app.core.ml_loader import get_model
+from app.services.feature_service import DEFAULT_CREDIT_SCORE, ELIGIBILITY_SCHEMA
+import logging
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ("annual_income", "existing_loans", "loan_amount", "loan_tenure_years")
+OPTIONAL_COLUMNS = ("credit_score", "system_capacity_kw")
+ID_COLUMN = "lead_id"
+CSV_CONTENT_TYPES = ("text/csv", "application/csv", "text/plain")
+PARQUET_CONTENT_TYPES = ("application/vnd.apache.parquet", "application/x-parquet", "application/octet-stream")
+OUTPUT_COLUMNS = (
+    "row", ID_COLUMN, "is_prequalified", "max_loan_amount", "recommended_tenure", "confidence", "error",
+)
+
+
+def validate_columns(header) -> List[str]:
+    """Normalised header, or ValueError when required columns are missing"""
+    header = [name.strip().lower() for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return header
+
+
+def _parse_column(values) -> np.ndarray:
+    """Strings to float64; blanks become NaN and unparsable values inf (the row is then reported invalid)"""
+    try:
+        return np.asarray([value.strip() or "nan" for value in values], dtype=np.float64)
+    except ValueError:
+        parsed = np.empty(len(values))
+        for i, value in enumerate(values):
+            try:
+                parsed[i] = float(value.strip() or "nan")
+            except ValueError:
+                parsed[i] = np.inf
+        return parsed
+
+
+def score_leads(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Vectorized prequalification of parsed lead columns (rule-based unless a prequal model is loaded)"""
+    income = columns["annual_income"]
+    # Blank optional values take their defaults; unparsable ones (inf) invalidate the row
+    existing_loans = np.where(np.isnan(columns["existing_loans"]), 0.0, columns["existing_loans"])
+    credit_score = columns.get("credit_score")
+    credit_score = np.full(len(income), DEFAULT_CREDIT_SCORE) if credit_score is None else np.where(
+        np.isnan(credit_score), DEFAULT_CREDIT_SCORE, credit_score,
+    )
+    invalid = ~np.isfinite(income) | ~np.isfinite(columns["loan_amount"]) | ~np.isfinite(columns["loan_tenure_years"])
+    invalid |= np.isinf(existing_loans) | np.isinf(credit_score)
+    income = np.where(invalid, 0.0, income)
+
+    model = get_model("prequal")
+    if model is not None and not settings.USE_MOCKS:
+        values = {**columns, "credit_score": credit_score, "existing_loans": existing_loans}
+        # Invalid rows are scored on defaults (NaN) and blanked in the output
+        matrix = ELIGIBILITY_SCHEMA.column_matrix(
+            {name: np.where(invalid, np.nan, column) for name, column in values.items()},
+            len(income), ELIGIBILITY_SCHEMA.model_columns(model),
+        )
+        confidence = run_model_sync("prequal", model, "predict_proba", matrix)[:, 1] * 100
+        prequalified = confidence >= 50.0
+    else:
+        debt_to_income = np.divide(existing_loans, income, out=np.ones_like(income), where=income > 0)
+        prequalified = (debt_to_income < 0.4) & (credit_score >= 650)
+        confidence = np.full(len(income), 85.0)
+    prequalified &= ~invalid
+    return {
+        "is_prequalified": prequalified,
+        "max_loan_amount": np.where(prequalified, income * 0.3, 0.0),
+        "confidence": confidence,
+        "invalid": invalid,
+    }
+
+
+def _score_chunk(header: List[str], records: List[List[str]], first_row: int) -> str:
+    """Parse, score and render one chunk of CSV records"""
+    positions = {name: header.index(name) for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if name in header}
+    width = len(header)
+    records = [record + [""] * (width - len(record)) for record in records]
+    columns = {name: _parse_column([record[i] for record in records]) for name, i in positions.items()}
+    ids = [record[header.index(ID_COLUMN)] for record in records] if ID_COLUMN in header else [""] * len(records)
+    return _render(columns, ids, first_row)
+
+
+def _render(columns: Dict[str, np.ndarray], ids: List[str], first_row: int) -> str:
+    scores = score_leads(columns)
+    tenure = columns["loan_tenure_years"]
+    tenure = np.where(np.isfinite(tenure), tenure, 0).astype(np.int64)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for i in range(len(ids)):
+        invalid = scores["invalid"][i]
+        writer.writerow([
+            first_row + i,
+            ids[i],
+            "" if invalid else bool(scores["is_prequalified"][i]),
+            "" if invalid else round(float(scores["max_loan_amount"][i]), 2),
+            "" if invalid else tenure[i],
+            "" if invalid else round(float(scores["confidence"][i]), 2),
+            "Invalid numeric value" if invalid else "",
+        ])
+    return out.getvalue()
+
+
+async def iter_lines(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without buffering it"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for data in body:
+        pending += decoder.decode(data)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+
+class _LineFeed:
+    """Iterator a csv.reader pulls from while lines are pushed in as they arrive"""
+
+    def __init__(self):
+        self.lines = collections.deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def _parsed(reader, feed: _LineFeed) -> Iterator[List[str]]:
+    while feed.lines:
+        record = next(reader, [])
+        if any(value.strip() for value in record):
+            yield record
+
+
+async def csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[List[str]]:
+    """CSV records from a line stream, all parsed by one csv.reader so quoted fields may span lines; blank records are skipped"""
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    quotes = 0
+    async for line in lines:
+        feed.lines.append(line + "\n")
+        # Parse once every quote opened since the last record is closed
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            quotes = 0
+            for record in _parsed(reader, feed):
+                yield record
+    # An unterminated quote at the end of the upload: the reader returns what it has
+    for record in _parsed(reader, feed):
+        yield record
+
+
+async def read_csv_header(rows: AsyncIterator[List[str]], validate=validate_columns) -> List[str]:
+    """Read the header record and check it with `validate`"""
+    async for record in rows:
+        return validate(record)
+    raise ValueError("Empty upload")
+
+
+class _Throughput:
+    def __init__(self):
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    def log(self, source: str):
+        elapsed = time.perf_counter() - self.start
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Prequalified {self.rows} leads from {source} in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+
+async def stream_csv_results(header: List[str], rows: AsyncIterator[List[str]]) -> AsyncIterator[str]:
+    """Score CSV records chunk by chunk, yielding result CSV"""
+    yield ",".join(OUTPUT_COLUMNS) + "\n"
+    throughput = _Throughput()
+    chunk: List[List[str]] = []
+    async for record in rows:
+        chunk.append(record)
+        if len(chunk) >= settings.PREQUAL_BATCH_CHUNK_ROWS:
+            yield await asyncio.to_thread(_score_chunk, header, chunk, throughput.rows + 1)
+            throughput.rows += len(chunk)
+            chunk = []
+    if chunk:
+        yield await asyncio.to_thread(_score_chunk, header, chunk, throughput.rows + 1)
+        throughput.rows += len(chunk)
+    throughput.log("CSV")
+
+
+def parquet_batches(source) -> Iterator:
+    """Record batches of a Parquet file (needs pyarrow); validates the schema first"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet uploads require pyarrow; upload CSV instead")
+    parquet_file = pq.ParquetFile(source)
+    validate_columns(parquet_file.schema_arrow.names)
+    return parquet_file.iter_batches(batch_size=settings.PREQUAL_BATCH_CHUNK_ROWS)
+
+
+def _score_batch(batch, first_row: int) -> str:
+    table = {name.lower(): batch.column(i) for i, name in enumerate(batch.schema.names)}
+    columns = {
+        name: table[name].to_numpy(zero_copy_only=False).astype(np.float64)
+        for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if name in table
+    }
+    ids = [str(value) for value in table[ID_COLUMN].to_pylist()] if ID_COLUMN in table else [""] * batch.num_rows
+    return _render(columns, ids, first_row)
+
+
+async def stream_parquet_results(batches: Iterator) -> AsyncIterator[str]:
+    """Score Parquet record batches, yielding result CSV"""
+    yield ",".join(OUTPUT_COLUMNS) + "\n"
+    throughput = _Throughput()
+    while True:
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            break
+        yield await asyncio.to_thread(_score_batch, batch, throughput.rows + 1)
+        throughput.rows += batch.num_rows
+    throughput.log("Parquet")
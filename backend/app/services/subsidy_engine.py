@@ -0,0 +1,194 @@
+"""
+Subsidy Rules Engine
+
+Compiles subsidy.json into immutable slab tables keyed by
+(scheme, state, system_type) and evaluates them for one or many capacities.
+The compiled tables are held and hot-reloaded by app.core.reference_data.
+
+Rule formats accepted in subsidy.json:
+- Slabs (PM Surya Ghar style): {"slabs": [{"upto_kw": 2, "per_kw": 30000}, ...], "max_amount": 78000}
+- Brackets, where the total capacity selects the rule:
+  {"brackets": [{"upto_kw": 3, "slabs": [...], "max_amount": ...}, {"slabs": [...]}]}
+- Legacy percentage: {"percentage": 40, "max_amount": 30000}, i.e. capacity * 1000 * percentage / 100
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+ANY = "*"
+CENT = Decimal("0.01")
+INFINITY = Decimal("Infinity")
+
+# Used when subsidy.json is missing
+DEFAULT_RULES = {
+    "version": "builtin",
+    "central": {
+        "residential": {
+            "slabs": [{"upto_kw": 2, "per_kw": 30000}, {"upto_kw": 3, "per_kw": 18000}],
+            "max_amount": 78000,
+        },
+        "commercial": {"percentage": 0},
+    },
+    "state": {},
+}
+
+
+@dataclass(frozen=True)
+class SlabSchedule:
+    """Marginal per-kW slabs with an overall cap"""
+    lower_kw: Tuple[Decimal, ...]
+    upper_kw: Tuple[Decimal, ...]
+    per_kw: Tuple[Decimal, ...]
+    max_amount: Decimal
+
+    def evaluate(self, capacity: Decimal) -> Decimal:
+        amount = Decimal("0")
+        for lower, upper, rate in zip(self.lower_kw, self.upper_kw, self.per_kw):
+            if capacity <= lower:
+                break
+            amount += (min(capacity, upper) - lower) * rate
+        return min(amount, self.max_amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    def evaluate_array(self, capacity: np.ndarray) -> np.ndarray:
+        if not self.per_kw:
+            return np.zeros_like(capacity)
+        lower = np.array(self.lower_kw, dtype=np.float64)
+        width = np.array(self.upper_kw, dtype=np.float64) - lower
+        covered = np.clip(capacity[:, None] - lower, 0, width)
+        amount = covered @ np.array(self.per_kw, dtype=np.float64)
+        return np.round(np.minimum(amount, float(self.max_amount)), 2)
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    """Capacity brackets (first bracket with upto_kw >= capacity applies)"""
+    upto_kw: Tuple[Decimal, ...]
+    schedules: Tuple[SlabSchedule, ...]
+
+    def evaluate(self, capacity: Decimal) -> Decimal:
+        for bound, schedule in zip(self.upto_kw, self.schedules):
+            if capacity <= bound:
+                return schedule.evaluate(capacity)
+        return Decimal("0.00")
+
+    def evaluate_array(self, capacity: np.ndarray) -> np.ndarray:
+        amounts = [schedule.evaluate_array(capacity) for schedule in self.schedules]
+        conditions = [capacity <= float(bound) for bound in self.upto_kw]
+        return np.select(conditions, amounts, default=0.0)
+
+
+@dataclass(frozen=True)
+class SubsidyRules:
+    """Immutable compiled rule set"""
+    version: str
+    rules: Mapping[Tuple[str, str, str], CompiledRule]
+
+    def lookup(self, scheme: str, state: str, system_type: str) -> Optional[CompiledRule]:
+        return (
+            self.rules.get((scheme, state, system_type))
+            or self.rules.get((scheme, state, ANY))
+        )
+
+    def calculate(self, system_capacity_kw: Decimal, state: str, system_type: str = "residential") -> dict:
+        """Exact Decimal evaluation for a single capacity"""
+        capacity = Decimal(system_capacity_kw)
+        central_rule = self.lookup("central", ANY, system_type)
+        state_rule = self.lookup("state", state, system_type)
+        central = central_rule.evaluate(capacity) if central_rule else Decimal("0")
+        state_amount = state_rule.evaluate(capacity) if state_rule else Decimal("0")
+        return {
+            "central_subsidy": central,
+            "state_subsidy": state_amount,
+            "subsidy_amount": central + state_amount,
+            "rules_version": self.version,
+        }
+
+    def calculate_array(self, system_capacity_kw, state: str, system_type: str = "residential"):
+        """Vectorized evaluation; returns (central, state) arrays"""
+        capacity = np.atleast_1d(np.asarray(system_capacity_kw, dtype=np.float64))
+        central_rule = self.lookup("central", ANY, system_type)
+        state_rule = self.lookup("state", state, system_type)
+        central = central_rule.evaluate_array(capacity) if central_rule else np.zeros_like(capacity)
+        state_amount = state_rule.evaluate_array(capacity) if state_rule else np.zeros_like(capacity)
+        return central, state_amount
+
+
+def _compile_schedule(spec: dict) -> SlabSchedule:
+    max_amount = Decimal(str(spec["max_amount"])) if spec.get("max_amount") is not None else INFINITY
+    if "percentage" in spec:
+        # Legacy: capacity * 1000 * percentage / 100 per kW, single open-ended slab
+        per_kw = Decimal(str(spec["percentage"])) * 10
+        return SlabSchedule((Decimal("0"),), (INFINITY,), (per_kw,), max_amount)
+
+    lower, upper, rates = [], [], []
+    previous = Decimal("0")
+    for slab in spec.get("slabs", []):
+        bound = Decimal(str(slab["upto_kw"])) if slab.get("upto_kw") is not None else INFINITY
+        if bound <= previous:
+            raise ValueError(f"Subsidy slabs must be increasing (got {bound} after {previous})")
+        lower.append(previous)
+        upper.append(bound)
+        rates.append(Decimal(str(slab["per_kw"])))
+        previous = bound
+    return SlabSchedule(tuple(lower), tuple(upper), tuple(rates), max_amount)
+
+
+def _compile_rule(spec: dict) -> CompiledRule:
+    if "brackets" not in spec:
+        return CompiledRule((INFINITY,), (_compile_schedule(spec),))
+    bounds, schedules = [], []
+    for bracket in spec["brackets"]:
+        bounds.append(Decimal(str(bracket["upto_kw"])) if bracket.get("upto_kw") is not None else INFINITY)
+        schedules.append(_compile_schedule(bracket))
+    return CompiledRule(tuple(bounds), tuple(schedules))
+
+
+def _is_rule(spec: dict) -> bool:
+    return any(key in spec for key in ("slabs", "brackets", "percentage"))
+
+
+def compile_rules(data: dict, version: str) -> SubsidyRules:
+    """Compile raw subsidy JSON into an immutable SubsidyRules table"""
+    rules = {}
+    central = dict(data.get("central", {}))
+
+    # Legacy central layout: residential.{upto_3kw, above_3kw}
+    residential = central.get("residential", {})
+    if "upto_3kw" in residential:
+        central["residential"] = {"brackets": [
+            {"upto_kw": 3, **residential["upto_3kw"]},
+            {"upto_kw": None, **residential["above_3kw"]},
+        ]}
+
+    for system_type, spec in central.items():
+        rules[("central", ANY, system_type)] = _compile_rule(spec)
+
+    for state, spec in data.get("state", {}).items():
+        if _is_rule(spec):
+            # Legacy state rules apply to every system type
+            rules[("state", state, ANY)] = _compile_rule(spec)
+        else:
+            for system_type, type_spec in spec.items():
+                rules[("state", state, system_type)] = _compile_rule(type_spec)
+
+    return SubsidyRules(version=version, rules=MappingProxyType(rules))
+
+
+def load_subsidy_rules(path: Path) -> SubsidyRules:
+    """Read and compile subsidy rules; version is the file's "version" field or a content hash"""
+    path = Path(path)
+    if not path.exists():
+        logger.warning(f"Subsidy rules not found at {path}, using built-in defaults")
+        return compile_rules(DEFAULT_RULES, DEFAULT_RULES["version"])
+    raw = path.read_bytes()
+    data = json.loads(raw)
+    version = data.get("version") or f"sha1:{hashlib.sha1(raw).hexdigest()[:12]}"
+    return compile_rules(data, version)
@@ -0,0 +1,134 @@
+"""
+Workflow Events
+
+Loan workflow transitions are appended to `workflow_events` instead of being
+written to the loan row as they happen. Events are buffered and written in the
+same commit as the step boundary they belong to, and every event is also
+published on the loan's Redis channel (`loan_events:<loan_id>`), which feeds
+the live Server-Sent Event streams through app.core.event_broker. Transient
+progress (a step starting) is only published, never written.
+"""
+import json
+from datetime import datetime
+from typing import List
+from uuid import UUID, uuid4
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.event_broker import EVENT_CHANNEL_PREFIX
+from app.core.redis_client import get_redis
+from app.models.loan import LoanApplication
+from app.models.workflow import WorkflowEvent, WorkflowEventType
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Events after which a loan's workflow emits nothing more
+TERMINAL_EVENTS = (WorkflowEventType.COMPLETED.value, WorkflowEventType.REJECTED.value)
+
+
+def event_channel(loan_id) -> str:
+    return f"{EVENT_CHANNEL_PREFIX}{loan_id}"
+
+
+def format_sse(event_type: str, data: dict, event_id: str = None) -> str:
+    """One Server-Sent Events frame"""
+    frame = f"id: {event_id}\n" if event_id else ""
+    return f"{frame}event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def workflow_snapshot(loan: LoanApplication) -> dict:
+    """Workflow state of a loan, sent first on a new event stream"""
+    data = loan.workflow_data or {}
+    return {
+        "loan_id": str(loan.id),
+        "status": loan.status.value,
+        "current_step": loan.current_step,
+        "steps": data.get("steps", []),
+        "critical_path": data.get("critical_path"),
+    }
+
+
+class WorkflowEventBuffer:
+    """Events of one loan, held until the next step boundary commits them"""
+
+    def __init__(self, loan_id: UUID):
+        self.loan_id = loan_id
+        self._pending: List[dict] = []
+        self._published = set()
+
+    def record(self, event: WorkflowEventType, step: str = None, status=None, **fields) -> dict:
+        """Buffer an event; `fields` may set attempt, duration_ms, error and data"""
+        payload = self._payload(event, step, status, **fields)
+        self._pending.append(payload)
+        return payload
+
+    async def announce(self, event: WorkflowEventType, step: str = None, status=None, **fields) -> dict:
+        """Publish a transient event (e.g. a step starting) without adding it to the log"""
+        payload = self._payload(event, step, status, **fields)
+        await self.publish([payload])
+        return payload
+
+    def _payload(self, event: WorkflowEventType, step: str = None, status=None, **fields) -> dict:
+        return {
+            "id": str(uuid4()),
+            "loan_id": str(self.loan_id),
+            "event": event.value,
+            "step": step,
+            "status": getattr(status, "value", status),
+            "attempt": fields.get("attempt"),
+            "duration_ms": fields.get("duration_ms"),
+            "error": fields.get("error"),
+            "data": fields.get("data"),
+            "created_at": datetime.utcnow().isoformat(),
+        }
+
+    def stage(self, db: AsyncSession) -> List[dict]:
+        """Add the buffered events to the session's pending transaction and return them"""
+        events, self._pending = self._pending, []
+        db.add_all(
+            WorkflowEvent(
+                id=UUID(event["id"]),
+                loan_application_id=self.loan_id,
+                event=WorkflowEventType(event["event"]),
+                step=event["step"],
+                status=event["status"],
+                attempt=event["attempt"],
+                duration_ms=event["duration_ms"],
+                error=event["error"],
+                data=event["data"],
+                created_at=datetime.fromisoformat(event["created_at"]),
+            )
+            for event in events
+        )
+        return events
+
+    async def publish(self, events: List[dict]):
+        """Publish events on the loan's channel, each once (live events go out before their commit)"""
+        events = [event for event in events if event["id"] not in self._published]
+        self._published.update(event["id"] for event in events)
+        await publish_events(self.loan_id, events)
+
+
+async def publish_events(loan_id, events: List[dict]):
+    """Publish events on the loan's channel; best effort, the table is the record"""
+    client = await get_redis()
+    if client is None or not events:
+        return
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for event in events:
+            pipeline.publish(event_channel(loan_id), json.dumps(event, default=str))
+        await pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish workflow events for loan {loan_id}: {e}")
+
+
+async def list_events(db: AsyncSession, loan_id: UUID) -> List[WorkflowEvent]:
+    """A loan's workflow events, oldest first"""
+    result = await db.execute(
+        select(WorkflowEvent)
+        .where(WorkflowEvent.loan_application_id == loan_id)
+        .order_by(WorkflowEvent.created_at, WorkflowEvent.id)
+    )
+    return result.scalars().all()
@@ -1,8 +1,15 @@
 """
 Celery Tasks
 """
-from app.tasks.loan_tasks import process_loan_workflow
+from app.tasks.loan_tasks import process_loan_workflow, run_loan_workflow_step, resume_loan_workflows
 from app.tasks.email_tasks import send_email_task
+from app.tasks.ai_tasks import score_batch_chunk
 
-__all__ = ["process_loan_workflow", "send_email_task"]
+__all__ = [
+    "process_loan_workflow",
+    "run_loan_workflow_step",
+    "resume_loan_workflows",
+    "send_email_task",
+    "score_batch_chunk",
+]
 
@@ -0,0 +1,39 @@
+"""
+AI Batch Scoring Tasks
+"""
+import asyncio
+from uuid import UUID
+from celery import group
+from app.celery_app import celery_app
+from app.core.database import worker_session
+from app.core.ml_loader import ensure_models_loaded
+from app.services.ai_service import AIService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def _score_chunk(job_id: str, loan_ids: list, prediction_type: str) -> dict:
+    ids = [UUID(loan_id) for loan_id in loan_ids]
+    # Pools without worker_process_init (solo, threads) load on the first task instead
+    await ensure_models_loaded()
+    async with worker_session() as db:
+        try:
+            return await AIService.score_batch_chunk(db, UUID(job_id), ids, prediction_type)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Batch job {job_id}: chunk of {len(ids)} loans failed: {e}")
+            await AIService.fail_batch_chunk(db, UUID(job_id), ids, str(e))
+            return {"success_count": 0, "failed_count": len(ids)}
+
+
+@celery_app.task(name="score_batch_chunk")
+def score_batch_chunk(job_id: str, loan_ids: list, prediction_type: str = "eligibility"):
+    """Score one chunk of a batch job and record its progress"""
+    return asyncio.run(_score_chunk(job_id, loan_ids, prediction_type))
+
+
+def enqueue_batch_chunks(job_id: str, chunks: list, prediction_type: str):
+    """Fan a batch job's chunks out to the workers"""
+    if chunks:
+        group(score_batch_chunk.s(job_id, chunk, prediction_type) for chunk in chunks).apply_async()
@@ -1,21 +1,130 @@
 """
 Loan Processing Tasks
+
+One task per workflow step; steps that become ready together are sent as a
+group, so independent steps run concurrently on different workers. Tasks are acknowledged only after they finish
+(acks_late) and redelivered if the worker dies, which is safe because steps
+are checkpointed and idempotent (see app.services.loan_workflow). Failed steps
+retry with exponential backoff; a periodic sweep re-enqueues workflows that
+stalled, e.g. when the broker was unreachable at submit time.
 """
-from app.celery_app import celery_app
-from app.core.database import AsyncSessionLocal
-from app.services.loan_service import LoanService
+import asyncio
+import contextlib
 from uuid import UUID
+from celery import group
+from celery.utils.time import get_exponential_backoff_interval
+from app.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import worker_session
+from app.core.ml_loader import ensure_models_loaded
+from app.core.redis_client import close_redis, init_redis
+from app.services.loan_workflow import InvalidWorkflowTask, LoanWorkflow
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+@contextlib.asynccontextmanager
+async def _progress_feed():
+    """Redis client for this task's event loop, used to publish workflow events"""
+    try:
+        await init_redis()
+    except Exception:
+        # Progress is best effort; events are still written to workflow_events
+        with contextlib.suppress(Exception):
+            await close_redis()
+    try:
+        yield
+    finally:
+        with contextlib.suppress(Exception):
+            await close_redis()
+
+
+async def _run_step(loan_id: str, step: str):
+    # The AI step scores with the registry; pools without worker_process_init load it here
+    await ensure_models_loaded()
+    async with _progress_feed(), worker_session() as db:
+        return await LoanWorkflow.run_step(db, UUID(loan_id), step)
+
+
+async def _fail_step(loan_id: str, step: str, error: str):
+    async with _progress_feed(), worker_session() as db:
+        await LoanWorkflow.fail(db, UUID(loan_id), step, error)
+
+
+async def _resume_point(loan_id: str):
+    async with worker_session() as db:
+        return await LoanWorkflow.resume_point(db, UUID(loan_id))
+
+
+async def _stalled():
+    async with worker_session() as db:
+        return await LoanWorkflow.stalled(db)
+
+
+@celery_app.task(
+    name="run_loan_workflow_step",
+    bind=True,
+    acks_late=True,
+    reject_on_worker_lost=True,
+    max_retries=settings.LOAN_WORKFLOW_MAX_RETRIES,
+)
+def run_loan_workflow_step(self, loan_id: str, step: str):
+    """Run one checkpointed workflow step, then enqueue the steps it unblocked"""
+    try:
+        ready = asyncio.run(_run_step(loan_id, step))
+    except InvalidWorkflowTask as e:
+        # Unknown loan or step: retrying cannot help. Errors raised by the step itself,
+        # ValueError included, go through the retries and then reject the loan
+        logger.error(f"Loan {loan_id}: workflow step {step} rejected: {e}")
+        return {"loan_id": loan_id, "step": step, "status": "invalid", "error": str(e)}
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            asyncio.run(_fail_step(loan_id, step, str(e)))
+            return {"loan_id": loan_id, "step": step, "status": "failed", "error": str(e)}
+        countdown = get_exponential_backoff_interval(
+            settings.LOAN_WORKFLOW_RETRY_BACKOFF_SECONDS,
+            self.request.retries,
+            settings.LOAN_WORKFLOW_RETRY_BACKOFF_MAX_SECONDS,
+            full_jitter=True,
+        )
+        logger.warning(f"Loan {loan_id}: workflow step {step} failed ({e}); retry in {countdown}s")
+        raise self.retry(exc=e, countdown=countdown)
+    _enqueue_steps(loan_id, ready)
+    return {"loan_id": loan_id, "step": step, "status": "completed", "ready": ready}
+
+
 @celery_app.task(name="process_loan_workflow")
 def process_loan_workflow(loan_id: str):
-    """Process loan workflow asynchronously"""
-    # Note: This is a synchronous wrapper for async function
-    # In production, use async task support or convert to sync
-    logger.info(f"Processing loan workflow for {loan_id}")
-    # Implementation would run the workflow
-    return {"status": "completed", "loan_id": loan_id}
+    """Start or resume a loan's workflow from its checkpoints"""
+    ready = asyncio.run(_resume_point(loan_id))
+    _enqueue_steps(loan_id, ready)
+    return {"loan_id": loan_id, "ready": ready}
+
+
+@celery_app.task(name="resume_loan_workflows")
+def resume_loan_workflows():
+    """Re-enqueue workflows with no progress for LOAN_WORKFLOW_STALL_SECONDS"""
+    stalled = asyncio.run(_stalled())
+    for loan_id, steps in stalled:
+        _enqueue_steps(str(loan_id), steps)
+    if stalled:
+        logger.info(f"Resumed {len(stalled)} stalled loan workflows")
+    return {"resumed": len(stalled)}
+
+
+def _enqueue_steps(loan_id: str, steps: list, **options):
+    if steps:
+        group(run_loan_workflow_step.s(loan_id, step) for step in steps).apply_async(**options)
+
+
+def enqueue_loan_workflow(loan_id: str, steps: list):
+    """Hand a submitted loan's startable steps to the workers; fails fast so the submit request is not held up by the broker"""
+    _enqueue_steps(loan_id, steps, retry=False)
+
 
+def enqueue_loan_workflows(workflows: dict):
+    """Hand many submitted loans (loan ID -> startable steps) to the workers in one group (bulk import)"""
+    signatures = [run_loan_workflow_step.s(loan_id, step) for loan_id, steps in workflows.items() for step in steps]
+    if signatures:
+        group(signatures).apply_async(retry=False)
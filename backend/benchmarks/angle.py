@@ -0,0 +1,46 @@
+"""
+Orientation optimizer benchmark (cold compute vs memoized lookup)
+
+Usage (from backend/):
+    python -m benchmarks.angle
+"""
+import asyncio
+import statistics
+import time
+import numpy as np
+from app.services import angle_optimizer
+
+RUNS = 20
+# Distinct 0.1° cells across India so every cold run is a cache miss
+LOCATIONS = [(8.5 + i, 72.0 + i * 0.7) for i in range(RUNS)]
+
+
+async def main():
+    cold = []
+    for latitude, longitude in LOCATIONS:
+        start = time.perf_counter()
+        await angle_optimizer.get_optimal_orientation(latitude, longitude)
+        cold.append((time.perf_counter() - start) * 1000)
+    
+    warm = []
+    for latitude, longitude in LOCATIONS * 50:
+        start = time.perf_counter()
+        await angle_optimizer.get_optimal_orientation(latitude + 0.01, longitude + 0.01)
+        warm.append((time.perf_counter() - start) * 1000)
+    
+    start = time.perf_counter()
+    angle_optimizer.plane_of_array(
+        angle_optimizer.hourly_irradiance(19.1, 72.9, np.full(12, 5.5)),
+        np.arange(0, 61, 1.0), np.arange(90, 271, 1.0),
+    )
+    full_grid_ms = (time.perf_counter() - start) * 1000
+    
+    print(f"cold median:     {statistics.median(cold):.1f} ms")
+    print(f"cold max:        {max(cold):.1f} ms")
+    print(f"memoized median: {statistics.median(warm) * 1000:.1f} µs")
+    print(f"full 61x181 grid (1°, no refinement): {full_grid_ms:.1f} ms")
+    print(f"cache stats:     {angle_optimizer.angle_cache_stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""
+EMI batch throughput benchmark
+
+Usage (from backend/):
+    python -m benchmarks.emi_batch [rows]
+"""
+import asyncio
+import sys
+import time
+from decimal import Decimal
+import numpy as np
+from app.services.calculation_service import CalculationService
+
+
+def _inputs(rows: int):
+    rng = np.random.default_rng(42)
+    principals = rng.uniform(50000, 1500000, rows).round(2)
+    rates = rng.choice([0.0, 7.5, 8.5, 9.25, 10.5, 12.0], rows)
+    tenures = rng.integers(1, 26, rows)
+    return principals.tolist(), rates.tolist(), tenures.tolist()
+
+
+async def _scalar(principals, rates, tenures):
+    for p, r, n in zip(principals, rates, tenures):
+        await CalculationService.calculate_emi(Decimal(str(p)), Decimal(str(r)), n)
+
+
+async def main(rows: int):
+    principals, rates, tenures = _inputs(rows)
+    
+    start = time.perf_counter()
+    await _scalar(principals, rates, tenures)
+    scalar_s = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    await CalculationService.calculate_emi_batch(principals, rates, tenures)
+    batch_s = time.perf_counter() - start
+    
+    print(f"rows:   {rows}")
+    print(f"scalar: {scalar_s * 1000:9.1f} ms  ({rows / scalar_s:12,.0f} rows/s)")
+    print(f"batch:  {batch_s * 1000:9.1f} ms  ({rows / batch_s:12,.0f} rows/s)")
+    print(f"speedup: {scalar_s / batch_s:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000))
@@ -0,0 +1,62 @@
+"""
+Bulk loan import benchmark (per-row create_loan vs chunked INSERT ... RETURNING)
+
+Runs against an in-memory SQLite database, so it measures statement and
+commit overhead rather than network round trips, which widen the gap on
+PostgreSQL.
+
+Usage (from backend/):
+    python -m benchmarks.loan_bulk
+"""
+import asyncio
+import json
+import time
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from app.core.database import Base
+from app.models.user import User
+from app.schemas.loan import LoanApplicationCreate
+from app.services import loan_bulk
+from app.services.loan_service import LoanService
+
+ROWS = 5000
+RECORDS = [
+    {"full_name": f"Customer {i}", "state": "Maharashtra", "annual_income": 600000 + i,
+     "system_capacity_kw": 3 + i % 5, "loan_amount": 150000 + i * 10, "loan_tenure_years": 5}
+    for i in range(ROWS)
+]
+
+
+async def lines():
+    for record in RECORDS:
+        yield json.dumps(record)
+
+
+async def main():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session() as db:
+        user = User(email="partner@example.com", hashed_password="x", full_name="Partner")
+        db.add(user)
+        await db.commit()
+        
+        start = time.perf_counter()
+        for record in RECORDS:
+            await LoanService.create_loan(db, user.id, LoanApplicationCreate(**record))
+        per_row = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        result = await loan_bulk.import_loans(db, user.id, loan_bulk.jsonl_records(lines()))
+        bulk = time.perf_counter() - start
+    await engine.dispose()
+    
+    print(f"rows:               {ROWS}")
+    print(f"per-row create:     {per_row:.2f} s ({ROWS / per_row:,.0f} rows/s)")
+    print(f"bulk import:        {bulk:.2f} s ({ROWS / bulk:,.0f} rows/s, {result['created']} created)")
+    print(f"speedup:            {per_row / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
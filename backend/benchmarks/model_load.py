@@ -0,0 +1,50 @@
+"""
+Model startup benchmark (sequential in-memory loads vs concurrent memory-mapped loads)
+
+Usage (from backend/):
+    python -m benchmarks.model_load [n_estimators]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from app.core import ml_loader
+
+
+def main():
+    n_estimators = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = np.random.default_rng(0)
+    X = rng.random((20000, 12))
+    y = (X[:, 0] + rng.normal(0, 0.3, len(X)) > 0.5).astype(int)
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=0, n_jobs=-1).fit(X, y)
+    
+    with tempfile.TemporaryDirectory() as models_dir:
+        for filename in ml_loader.MODEL_FILES.values():
+            joblib.dump(model, Path(models_dir) / filename)
+        size_mb = sum(p.stat().st_size for p in Path(models_dir).iterdir()) / 2**20
+        ml_loader.settings.ML_MODELS_DIR = models_dir
+        
+        start = time.perf_counter()
+        for name, filename in ml_loader.MODEL_FILES.items():
+            ml_loader.load_model_version(name, Path(models_dir) / filename, mmap=False)
+        sequential_ms = (time.perf_counter() - start) * 1000
+        
+        ml_loader.settings.ML_MODELS_MMAP = True
+        start = time.perf_counter()
+        asyncio.run(ml_loader.load_ml_models())
+        concurrent_ms = (time.perf_counter() - start) * 1000
+    
+    print(f"artifacts:              {len(ml_loader.MODEL_FILES)} x {size_mb / len(ml_loader.MODEL_FILES):.1f} MB")
+    print(f"sequential, in-memory:  {sequential_ms:.0f} ms")
+    print(f"concurrent, mmap:       {concurrent_ms:.0f} ms")
+    for name, info in ml_loader.get_registry_info().items():
+        active = info["active"]
+        print(f"  {name:<20} {active['load_ms']:>7.0f} ms  +{active['rss_delta_mb']:.1f} MB RSS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Bulk prequalification throughput benchmark (per-lead AIService.prequal vs the chunked CSV stream)
+
+Usage (from backend/):
+    python -m benchmarks.prequal_batch [rows]
+"""
+import asyncio
+import sys
+import time
+from decimal import Decimal
+import numpy as np
+from app.services import prequal_batch
+from app.services.ai_service import AIService
+
+
+def _csv_lines(rows: int):
+    rng = np.random.default_rng(7)
+    incomes = rng.uniform(200000, 3000000, rows).round(2)
+    existing = (incomes * rng.uniform(0, 0.6, rows)).round(2)
+    scores = rng.integers(550, 850, rows)
+    amounts = rng.uniform(50000, 800000, rows).round(2)
+    tenures = rng.integers(1, 11, rows)
+    header = "lead_id,annual_income,existing_loans,credit_score,loan_amount,loan_tenure_years"
+    body = [f"L{i},{incomes[i]},{existing[i]},{scores[i]},{amounts[i]},{tenures[i]}" for i in range(rows)]
+    return header, body
+
+
+async def _lines(header, body):
+    yield header
+    for line in body:
+        yield line
+
+
+async def main(rows: int):
+    header, body = _csv_lines(rows)
+    
+    sample = body[:min(rows, 10000)]
+    start = time.perf_counter()
+    for line in sample:
+        _, income, existing, score, amount, tenure = line.split(",")
+        await AIService.prequal(None, Decimal(income), Decimal(existing), Decimal(score), Decimal(amount), int(tenure))
+    scalar_rate = len(sample) / (time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    lines = _lines(header, body)
+    columns = await prequal_batch.read_csv_header(lines)
+    output_bytes = 0
+    async for chunk in prequal_batch.stream_csv_results(columns, lines):
+        output_bytes += len(chunk)
+    batch_s = time.perf_counter() - start
+    
+    print(f"rows:       {rows}")
+    print(f"per-lead:   {scalar_rate:12,.0f} rows/s  (first {len(sample)} rows)")
+    print(f"chunked:    {rows / batch_s:12,.0f} rows/s  ({batch_s * 1000:.0f} ms, {output_bytes / 2**20:.1f} MB out)")
+    print(f"speedup:    {rows / batch_s / scalar_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -0,0 +1,44 @@
+"""
+ROI engine latency and batch throughput benchmark
+
+Usage (from backend/):
+    python -m benchmarks.roi [systems]
+"""
+import asyncio
+import sys
+import time
+from decimal import Decimal
+import numpy as np
+from app.services.calculation_service import CalculationService, get_calculation_service
+
+REQUESTS = 500
+
+
+async def _latency(calc_service: CalculationService, exact: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await calc_service.calculate_roi(Decimal("5"), "Maharashtra", Decimal("300000"), exact=exact)
+    return (time.perf_counter() - start) / REQUESTS
+
+
+async def main(systems: int):
+    calc_service = get_calculation_service()
+    rng = np.random.default_rng(42)
+    capacity = rng.uniform(1, 10, systems)
+    locations = rng.choice(["Maharashtra", "Gujarat", "Rajasthan", "Karnataka", "Delhi"], systems)
+    costs = capacity * rng.uniform(50000, 70000, systems)
+    
+    exact_s = await _latency(calc_service, exact=True)
+    fast_s = await _latency(calc_service, exact=False)
+    
+    start = time.perf_counter()
+    await calc_service.calculate_roi_batch(capacity, locations, costs)
+    batch_s = time.perf_counter() - start
+    
+    print(f"per-request (exact Decimal): {exact_s * 1e6:9.1f} us")
+    print(f"per-request (vectorized):    {fast_s * 1e6:9.1f} us")
+    print(f"batch of {systems}: {batch_s * 1000:.1f} ms  ({systems / batch_s:,.0f} systems/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -0,0 +1,45 @@
+"""
+Scenario simulator benchmark (grid build + vectorized evaluation + Pareto front)
+
+Usage (from backend/):
+    python -m benchmarks.simulate
+"""
+import statistics
+import time
+import numpy as np
+from app.services.ai_service import AIService
+
+RUNS = 20
+DEFAULTS = {
+    "system_capacity_kw": 5.0,
+    "loan_tenure_years": 5,
+    "interest_rate": 8.5,
+    "down_payment": 0.0,
+    "cost_per_kw": 60000.0,
+    "electricity_rate": 8.0,
+}
+# 40 capacities x 25 tenures x 20 rates x 10 down payments = 200,000 cells
+SCENARIOS = [{
+    "system_capacity_kw": np.linspace(1, 10, 40).tolist(),
+    "loan_tenure_years": list(range(1, 26)),
+    "interest_rate": np.linspace(6, 15.5, 20).tolist(),
+    "down_payment": np.linspace(0, 90000, 10).tolist(),
+}]
+
+
+def main():
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        grid = AIService._build_scenario_grid(SCENARIOS, DEFAULTS)
+        result = AIService.evaluate_scenarios(grid, "Maharashtra", 200)
+        timings.append((time.perf_counter() - start) * 1000)
+    
+    print(f"cells:        {result['grid_size']:,}")
+    print(f"pareto front: {len(result['results'])}")
+    print(f"median:       {statistics.median(timings):.1f} ms")
+    print(f"max:          {max(timings):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
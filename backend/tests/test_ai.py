@@ -0,0 +1,615 @@
+"""
+AI Service Tests
+"""
+import pytest
+import numpy as np
+from decimal import Decimal
+from app.models.user import User
+from app.models.loan import LoanApplication
+from app.services.ai_service import AIService
+from app.services.calculation_service import pareto_front
+
+
+@pytest.fixture(autouse=True)
+def isolated_batchers():
+    """Stop batchers created by a test, so later tests do not inherit its models or worker threads"""
+    from app.core import inference_batcher
+    
+    yield
+    inference_batcher.shutdown_batchers()
+    inference_batcher._batchers.clear()
+
+
+@pytest.fixture
+async def test_loan(db_session):
+    """Persist a user with one loan application"""
+    user = User(email="ai@example.com", hashed_password="x", full_name="AI User")
+    db_session.add(user)
+    await db_session.flush()
+    loan = LoanApplication(
+        user_id=user.id,
+        full_name="AI User",
+        state="Maharashtra",
+        system_capacity_kw=Decimal("5.0"),
+        estimated_cost=Decimal("300000"),
+        loan_amount=Decimal("200000"),
+        loan_tenure_years=5,
+    )
+    db_session.add(loan)
+    await db_session.commit()
+    return loan
+
+
+def test_pareto_front_is_non_dominated():
+    """Test every front point is undominated and ordered by EMI"""
+    rng = np.random.default_rng(3)
+    emi = rng.uniform(1000, 10000, 500)
+    npv = rng.uniform(-50000, 500000, 500)
+    front = pareto_front(emi, npv)
+    
+    assert np.all(np.diff(emi[front]) >= 0)
+    assert np.all(np.diff(npv[front]) > 0)
+    for i in front:
+        dominated = (emi <= emi[i]) & (npv >= npv[i]) & ((emi < emi[i]) | (npv > npv[i]))
+        assert not dominated.any()
+
+
+def test_scenario_grid_expansion():
+    """Test scenarios expand to the full cartesian grid with loan defaults"""
+    defaults = {
+        "system_capacity_kw": 5.0,
+        "loan_tenure_years": 5,
+        "interest_rate": 8.5,
+        "down_payment": 0.0,
+        "cost_per_kw": 60000.0,
+        "electricity_rate": 8.0,
+    }
+    grid = AIService._build_scenario_grid(
+        [{"system_capacity_kw": [3, 5], "loan_tenure_years": [5, 7, 10]}, {"down_payment": 20000}],
+        defaults,
+    )
+    assert grid["system_capacity_kw"].size == 7
+    assert grid["scenario_index"].tolist() == [0] * 6 + [1]
+    
+    with pytest.raises(ValueError):
+        AIService._build_scenario_grid([{"panel_brand": "x"}], defaults)
+    # Fractional tenures are rejected, not truncated to a different scenario
+    with pytest.raises(ValueError, match="whole years"):
+        AIService._build_scenario_grid([{"loan_tenure_years": [5, 2.5]}], defaults)
+
+
+@pytest.mark.asyncio
+async def test_simulate_returns_ranked_front(db_session, test_loan):
+    """Test simulate evaluates the grid and ranks the Pareto front"""
+    result = await AIService.simulate(
+        db_session,
+        test_loan.id,
+        [{"loan_tenure_years": [3, 5, 7], "interest_rate": [8, 10], "system_capacity_kw": [3, 5]}],
+    )
+    assert result["grid_size"] == 12
+    front = result["scenarios"]
+    assert [s["rank"] for s in front] == list(range(1, len(front) + 1))
+    assert result["best_scenario"]["npv"] == max(s["npv"] for s in front)
+
+
+def test_optimize_orientation_faces_equator():
+    """Test optimum tilt tracks latitude and faces the equator"""
+    from app.services.angle_optimizer import optimize_orientation
+    
+    mumbai = optimize_orientation(19.1, 72.9, np.full(12, 5.5))
+    assert mumbai["optimal_azimuth"] == pytest.approx(180, abs=5)
+    assert 10 <= mumbai["optimal_angle"] <= 30
+    assert mumbai["expected_efficiency_gain"] > 0
+    assert mumbai["annual_flat_kwh_m2"] == pytest.approx(5.5 * 365, rel=1e-6)
+    
+    sydney = optimize_orientation(-33.9, 151.2, np.full(12, 5.0))
+    assert min(sydney["optimal_azimuth"], 360 - sydney["optimal_azimuth"]) <= 5
+    assert sydney["optimal_angle"] > mumbai["optimal_angle"]
+
+
+@pytest.mark.asyncio
+async def test_optimize_angle_memoized(db_session, test_loan):
+    """Test neighbouring coordinates share one cached optimization"""
+    from app.services import angle_optimizer
+    
+    misses = angle_optimizer.angle_cache_stats["misses"]
+    first = await AIService.optimize_angle(db_session, test_loan.id, Decimal("23.021"), Decimal("72.571"), Decimal("400"))
+    second = await AIService.optimize_angle(db_session, test_loan.id, Decimal("23.04"), Decimal("72.58"), Decimal("300"))
+    assert angle_optimizer.angle_cache_stats["misses"] == misses + 1
+    assert first["optimal_angle"] == second["optimal_angle"]
+    assert first["prediction_id"] != second["prediction_id"]
+
+
+@pytest.mark.asyncio
+async def test_angle_optimization_endpoint(client, db_session, test_loan):
+    """Test the endpoint returns the stored prediction, timestamp included"""
+    from uuid import UUID
+    from app.main import app
+    from app.dependencies import get_current_user
+    from app.models.ai_prediction import AIPrediction
+    
+    app.dependency_overrides[get_current_user] = lambda: User(id=test_loan.user_id, email="ai@example.com", hashed_password="x", full_name="AI User")
+    response = await client.post("/api/ai/angle-optimization", json={
+        "loan_application_id": str(test_loan.id), "latitude": 19.07, "longitude": 72.87, "roof_area_sqft": 400,
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert 10 <= float(body["optimal_angle"]) <= 30
+    prediction = await db_session.get(AIPrediction, UUID(body["prediction_id"]))
+    assert body["created_at"] == prediction.created_at.isoformat()
+
+
+class CountingModel:
+    """predict_proba stub that records batch sizes"""
+    
+    def __init__(self):
+        self.batch_sizes = []
+    
+    def predict_proba(self, features):
+        self.batch_sizes.append(len(features))
+        p = 1 / (1 + np.exp(-features[:, 0] / 1e6))
+        return np.column_stack([1 - p, p])
+
+
+@pytest.mark.asyncio
+async def test_micro_batching_coalesces_requests():
+    """Test concurrent single-row requests are scored as a few matrices with per-row results"""
+    import asyncio
+    from app.core.inference_batcher import BatchingModel
+    
+    model = CountingModel()
+    batcher = BatchingModel("test", model, max_batch_rows=16, max_wait_ms=20)
+    try:
+        incomes = np.arange(1, 41) * 100000.0
+        results = await asyncio.gather(*(batcher.apredict_proba([income, 0]) for income in incomes))
+        expected = model.predict_proba(np.column_stack([incomes, np.zeros(40)]))
+        np.testing.assert_allclose(np.vstack(results), expected)
+        assert sum(model.batch_sizes[:-1]) == 40
+        assert max(model.batch_sizes[:-1]) <= 16
+        assert len(model.batch_sizes) - 1 < 40
+        stats = batcher.get_stats()
+        assert stats["rows"] == 40 and stats["queue_depth"] == 0
+    finally:
+        batcher.close()
+    
+    failing = BatchingModel("failing", None, max_batch_rows=4, max_wait_ms=1)
+    try:
+        with pytest.raises(AttributeError):
+            await failing.apredict_proba([1.0, 2.0])
+        assert failing.get_stats()["errors"] == 1
+    finally:
+        failing.close()
+
+
+@pytest.mark.asyncio
+async def test_check_eligibility_uses_batcher(db_session, test_loan, monkeypatch):
+    """Test eligibility scoring goes through the batched model returned by get_model"""
+    from app.core import ml_loader
+    
+    model = CountingModel()
+    monkeypatch.setitem(ml_loader.ml_models, "eligibility", model)
+    assert ml_loader.get_model("eligibility").model is model
+    
+    result = await AIService.check_eligibility(db_session, test_loan.id, {"annual_income": 2000000, "loan_amount": 0})
+    assert result["eligibility_score"] == pytest.approx(100 / (1 + np.exp(-2.0)))
+    assert model.batch_sizes == [1]
+
+
+@pytest.mark.asyncio
+async def test_eligibility_prediction_cache(db_session, test_loan, monkeypatch):
+    """Test repeated inputs hit the cache, are still audited, and a version swap invalidates them"""
+    from uuid import UUID
+    from app.core import ml_loader, prediction_cache
+    from app.models.ai_prediction import AIPrediction
+    
+    monkeypatch.setattr(prediction_cache, "_entries", type(prediction_cache._entries)())
+    monkeypatch.setattr(ml_loader, "model_versions", {})
+    model = CountingModel()
+    monkeypatch.setitem(ml_loader.ml_models, "eligibility", model)
+    ml_loader.activate_model(ml_loader.ModelVersion("eligibility", "c1", "0" * 64, "mem", model))
+    features = {"annual_income": 1500000, "loan_amount": 250000}
+    
+    first = await AIService.check_eligibility(db_session, test_loan.id, features)
+    second = await AIService.check_eligibility(db_session, test_loan.id, features)
+    assert model.batch_sizes == [1]
+    assert second["eligibility_score"] == first["eligibility_score"]
+    audit = await db_session.get(AIPrediction, UUID(second["prediction_id"]))
+    assert audit.meta_data == {"cache": "memory"} and audit.model_version == "c1"
+    
+    replacement = CountingModel()
+    monkeypatch.setitem(ml_loader.ml_models, "eligibility", replacement)
+    ml_loader.activate_model(ml_loader.ModelVersion("eligibility", "c2", "1" * 64, "mem", replacement))
+    assert prediction_cache.get_prediction_cache_stats()["entries"] == 0
+    await AIService.check_eligibility(db_session, test_loan.id, features)
+    assert replacement.batch_sizes == [1]
+
+
+@pytest.mark.asyncio
+async def test_eligibility_endpoint(client, test_loan, monkeypatch):
+    """Test the endpoint answers with a timestamp, and a cache hit keeps the time the score was computed"""
+    from app.main import app
+    from app.core import ml_loader, prediction_cache
+    from app.dependencies import get_current_user
+    
+    monkeypatch.setattr(prediction_cache, "_entries", type(prediction_cache._entries)())
+    monkeypatch.setattr(ml_loader, "model_versions", {})
+    model = CountingModel()
+    monkeypatch.setitem(ml_loader.ml_models, "eligibility", model)
+    ml_loader.activate_model(ml_loader.ModelVersion("eligibility", "e1", "0" * 64, "mem", model))
+    app.dependency_overrides[get_current_user] = lambda: User(id=test_loan.user_id, email="ai@example.com", hashed_password="x", full_name="AI User")
+    request = {"loan_application_id": str(test_loan.id), "features": {"annual_income": 1500000}}
+    
+    first = await client.post("/api/ai/eligibility", json=request)
+    second = await client.post("/api/ai/eligibility", json=request)
+    assert first.status_code == 200 and second.status_code == 200
+    assert model.batch_sizes == [1]
+    assert second.json()["prediction_id"] != first.json()["prediction_id"]
+    assert second.json()["created_at"] == first.json()["created_at"]
+
+
+@pytest.mark.asyncio
+async def test_model_registry_versions_and_shadow(db_session, test_loan, tmp_path, monkeypatch):
+    """Test versioned loading, shadow scoring on sampled traffic and atomic promotion"""
+    import asyncio
+    import json
+    import joblib
+    from uuid import UUID
+    from sklearn.linear_model import LogisticRegression
+    from app.core import ml_loader
+    from app.models.ai_prediction import AIPrediction
+    
+    X = np.array([[100000, 500000], [2000000, 100000], [300000, 400000], [1500000, 200000]])
+    y = np.array([0, 1, 0, 1])
+    joblib.dump(LogisticRegression().fit(X / 1e6, y), tmp_path / "eligibility_model.pkl")
+    joblib.dump(LogisticRegression(C=0.01).fit(X / 1e6, y), tmp_path / "eligibility_v2.pkl")
+    (tmp_path / "manifest.json").write_text(json.dumps({"eligibility": {"file": "eligibility_model.pkl", "version": "v1"}}))
+    monkeypatch.setattr(ml_loader.settings, "ML_MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(ml_loader.settings, "MODEL_SHADOW_SAMPLE_RATE", 1.0)
+    for registry in ("ml_models", "model_versions", "shadow_models", "shadow_stats"):
+        monkeypatch.setattr(ml_loader, registry, {})
+    
+    await ml_loader.load_ml_models()
+    assert ml_loader.get_model_version("eligibility") == "v1"
+    assert len(ml_loader.get_registry_info()["eligibility"]["active"]["checksum"]) == 64
+    
+    result = await AIService.check_eligibility(db_session, test_loan.id, {"annual_income": 2.0, "loan_amount": 0.1})
+    prediction = await db_session.get(AIPrediction, UUID(result["prediction_id"]))
+    assert prediction.model_version == "v1"
+    
+    # Only files inside ML_MODELS_DIR are ever unpickled
+    outside = tmp_path.parent / "outside_model.pkl"
+    for path in (outside, "../outside_model.pkl"):
+        with pytest.raises(ValueError, match="inside"):
+            ml_loader.reload_model("eligibility", path)
+    
+    await asyncio.wrap_future(ml_loader.reload_model("eligibility", "eligibility_v2.pkl", "v2", shadow=True))
+    assert ml_loader.get_model_version("eligibility") == "v1"
+    await asyncio.gather(*(
+        ml_loader.get_model("eligibility").apredict_proba([income, 0.2]) for income in (0.1, 0.5, 1.0, 2.0)
+    ))
+    for _ in range(100):
+        if ml_loader.shadow_stats["eligibility"]["rows"] >= 4:
+            break
+        await asyncio.sleep(0.01)
+    shadow = ml_loader.get_registry_info()["eligibility"]["shadow"]
+    assert shadow["version"] == "v2" and shadow["stats"]["rows"] == 4
+    assert 0 <= shadow["stats"]["agreement_rate"] <= 1
+    
+    ml_loader.promote_shadow("eligibility")
+    _, version = await ml_loader.get_model("eligibility").apredict_proba_versioned([1.0, 0.2])
+    assert version == "v2"
+    assert ml_loader.get_registry_info()["eligibility"]["shadow"] is None
+
+
+@pytest.mark.asyncio
+async def test_models_load_concurrently_memory_mapped(tmp_path, monkeypatch):
+    """Test startup loads every model file with numpy payloads memory-mapped and reports load stats"""
+    import joblib
+    from sklearn.linear_model import LogisticRegression
+    from app.core import ml_loader
+    
+    model = LogisticRegression().fit(np.random.default_rng(0).random((50, 3)), np.arange(50) % 2)
+    for filename in ml_loader.MODEL_FILES.values():
+        joblib.dump(model, tmp_path / filename)
+    monkeypatch.setattr(ml_loader.settings, "ML_MODELS_DIR", str(tmp_path))
+    for registry in ("ml_models", "model_versions", "shadow_models", "shadow_stats"):
+        monkeypatch.setattr(ml_loader, registry, {})
+    
+    await ml_loader.load_ml_models()
+    assert set(ml_loader.ml_models) == set(ml_loader.MODEL_FILES)
+    assert isinstance(ml_loader.ml_models["prequal"].coef_, np.memmap)
+    info = ml_loader.get_registry_info()["prequal"]["active"]
+    assert info["mmap"] is True and info["load_ms"] > 0 and len(info["checksum"]) == 64
+    
+    monkeypatch.setattr(ml_loader.settings, "ML_MODELS_MMAP", False)
+    plain = ml_loader.load_model_version("prequal", tmp_path / "prequal_model.pkl")
+    assert not isinstance(plain.model.coef_, np.memmap)
+
+
+@pytest.mark.asyncio
+async def test_batch_score_chunks(db_session, test_loan, monkeypatch):
+    """Test batch scoring fans out chunks and each chunk bulk-inserts predictions and updates progress"""
+    from uuid import UUID, uuid4
+    from sqlalchemy import func, select
+    from app.core.config import settings
+    from app.models.ai_prediction import AIPrediction, BatchJobStatus
+    from app.tasks import ai_tasks
+    
+    loans = [test_loan]
+    for income in (200000, 3000000):
+        loan = LoanApplication(
+            user_id=test_loan.user_id, full_name="AI User", state="Maharashtra",
+            loan_amount=Decimal("150000"), annual_income=Decimal(income),
+        )
+        db_session.add(loan)
+        loans.append(loan)
+    await db_session.commit()
+    missing = uuid4()
+    
+    enqueued = []
+    monkeypatch.setattr(ai_tasks, "enqueue_batch_chunks", lambda job_id, chunks, kind: enqueued.extend(chunks))
+    monkeypatch.setattr(settings, "BATCH_SCORE_CHUNK_SIZE", 2)
+    
+    job = await AIService.batch_score(db_session, [loan.id for loan in loans] + [missing, loans[0].id])
+    assert job.status == BatchJobStatus.PENDING and job.total_count == 4
+    assert [len(chunk) for chunk in enqueued] == [2, 2]
+    
+    await AIService.score_batch_chunk(db_session, job.id, [UUID(i) for i in enqueued[0]])
+    await db_session.refresh(job)
+    assert (job.status, job.success_count, job.failed_count) == (BatchJobStatus.PROCESSING, 2, 0)
+    
+    await AIService.score_batch_chunk(db_session, job.id, [UUID(i) for i in enqueued[1]])
+    await db_session.refresh(job)
+    assert (job.status, job.success_count, job.failed_count) == (BatchJobStatus.COMPLETED, 3, 1)
+    assert job.failed_items == [{"loan_id": str(missing), "error": "Loan application not found"}]
+    assert {item["loan_id"] for item in job.results} == {str(loan.id) for loan in loans}
+    
+    count = await db_session.scalar(
+        select(func.count()).select_from(AIPrediction).where(AIPrediction.model_version == "mock")
+    )
+    assert count == 3
+    
+    with pytest.raises(ValueError):
+        await AIService.batch_score(db_session, [test_loan.id], "roi_prediction")
+
+
+@pytest.mark.asyncio
+async def test_batch_task_loads_models_in_worker(db_session, test_loan, tmp_path, monkeypatch):
+    """Test the worker task path loads the registry itself and scores with the real model, not the mock"""
+    import joblib
+    from sklearn.linear_model import LogisticRegression
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.core import ml_loader
+    from app.models.ai_prediction import AIPrediction
+    from app.tasks import ai_tasks
+    
+    X = np.array([[0.1, 0.5], [2.0, 0.1], [0.3, 0.4], [1.5, 0.2]])
+    joblib.dump(LogisticRegression().fit(X, [0, 1, 0, 1]), tmp_path / "eligibility_model.pkl")
+    monkeypatch.setattr(ml_loader.settings, "ML_MODELS_DIR", str(tmp_path))
+    # A fresh worker process: nothing loaded, no lifespan
+    for registry in ("ml_models", "model_versions", "shadow_models", "shadow_stats"):
+        monkeypatch.setattr(ml_loader, registry, {})
+    monkeypatch.setattr(ml_loader, "_models_loaded", False)
+    monkeypatch.setattr(ai_tasks, "enqueue_batch_chunks", lambda job_id, chunks, kind: None)
+    monkeypatch.setattr(ai_tasks, "worker_session", async_sessionmaker(db_session.bind, class_=AsyncSession, expire_on_commit=False))
+    
+    job = await AIService.batch_score(db_session, [test_loan.id])
+    result = await ai_tasks._score_chunk(str(job.id), [str(test_loan.id)], "eligibility")
+    assert result["success_count"] == 1
+    
+    prediction = (await db_session.execute(
+        select(AIPrediction).where(AIPrediction.loan_application_id == test_loan.id)
+    )).scalar_one()
+    assert prediction.model_version == ml_loader.get_model_version("eligibility")
+    assert prediction.model_version not in (None, "mock")
+
+
+@pytest.mark.asyncio
+async def test_explanations_computed_after_prediction(db_session, test_loan, tmp_path, monkeypatch):
+    """Test SHAP values are stored in the background and served by explain"""
+    import asyncio
+    import joblib
+    from uuid import UUID
+    from sklearn.ensemble import GradientBoostingClassifier
+    from app.core import ml_loader
+    from app.models.ai_prediction import AIPrediction
+    from app.services import ai_service
+    
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(0, 3, 200), rng.uniform(0, 1, 200)])
+    joblib.dump(GradientBoostingClassifier(n_estimators=20).fit(X, X[:, 0] > 1.5), tmp_path / "gbm.pkl")
+    for registry in ("ml_models", "model_versions"):
+        monkeypatch.setattr(ml_loader, registry, {})
+    ml_loader.activate_model(ml_loader.load_model_version("eligibility", tmp_path / "gbm.pkl", "gbm-1"))
+    
+    result = await AIService.check_eligibility(db_session, test_loan.id, {"annual_income": 2.5, "loan_amount": 0.4})
+    await asyncio.gather(*list(ai_service._explanation_tasks))
+    prediction = await db_session.get(AIPrediction, UUID(result["prediction_id"]))
+    await db_session.refresh(prediction)
+    assert prediction.shap_values is not None
+    
+    explanation = await AIService.explain(db_session, test_loan.id)
+    assert set(explanation["shap_values"]) == {"annual_income", "loan_amount"}
+    assert explanation["shap_values"]["annual_income"] > abs(explanation["shap_values"]["loan_amount"])
+    assert explanation["feature_importance"]["annual_income"].startswith("High positive")
+    
+    # Workflow steps (Celery) explain inline: no background task, SHAP values stored in the same commit
+    result = await AIService.check_eligibility(
+        db_session, test_loan.id, {"annual_income": 0.5, "loan_amount": 0.4}, explain_inline=True,
+    )
+    assert not ai_service._explanation_tasks
+    prediction = await db_session.get(AIPrediction, UUID(result["prediction_id"]))
+    assert prediction.shap_values is not None and prediction.feature_importance
+
+
+@pytest.mark.asyncio
+async def test_feature_assembly_joins_credit_and_kyc(db_session, test_loan):
+    """Test loan, latest credit score and KYC summary are assembled into the declared schema"""
+    from datetime import datetime, timedelta
+    from app.models.credit import CreditCheck, CreditStatus
+    from app.models.kyc import KYCRecord, KYCStatus, KYCType
+    from app.services.feature_service import ELIGIBILITY_SCHEMA, load_loan_features
+    
+    now = datetime.utcnow()
+    db_session.add_all([
+        CreditCheck(user_id=test_loan.user_id, status=CreditStatus.COMPLETED, credit_score=Decimal("690"), created_at=now - timedelta(days=40)),
+        CreditCheck(user_id=test_loan.user_id, status=CreditStatus.COMPLETED, credit_score=Decimal("745"), created_at=now),
+        CreditCheck(user_id=test_loan.user_id, status=CreditStatus.FAILED, created_at=now + timedelta(days=1)),
+        KYCRecord(user_id=test_loan.user_id, kyc_type=KYCType.PAN, status=KYCStatus.VERIFIED, is_verified=True),
+        KYCRecord(user_id=test_loan.user_id, kyc_type=KYCType.BANK, status=KYCStatus.FAILED, is_verified=False),
+    ])
+    await db_session.commit()
+    
+    loan, features = (await load_loan_features(db_session, [test_loan.id]))[test_loan.id]
+    assert loan.id == test_loan.id
+    assert list(features) == list(ELIGIBILITY_SCHEMA.features)
+    assert features["credit_score"] == 745.0
+    assert features["kyc_verified_count"] == 1.0 and features["kyc_failed_count"] == 1.0
+    assert features["loan_amount"] == 200000.0
+    
+    matrix = ELIGIBILITY_SCHEMA.matrix([features, {"annual_income": 1.0}])
+    assert matrix.dtype == np.float32 and matrix.shape == (2, len(ELIGIBILITY_SCHEMA.features))
+    assert matrix[1, ELIGIBILITY_SCHEMA.features.index("loan_tenure_years")] == 5.0
+    # No credit report: the same default score as prequalification
+    assert matrix[1, ELIGIBILITY_SCHEMA.features.index("credit_score")] == 700.0
+    assert ELIGIBILITY_SCHEMA.model_columns(CountingModel()) == ("annual_income", "loan_amount")
+    with pytest.raises(ValueError):
+        ELIGIBILITY_SCHEMA.matrix([features], ["panel_brand"])
+
+
+@pytest.mark.asyncio
+async def test_prequal_batch_streams_csv(client, monkeypatch):
+    """Test lead lists are scored in chunks and streamed back as CSV, matching single prequal"""
+    import csv
+    import io
+    from app.main import app
+    from app.dependencies import get_current_user
+    from app.services import prequal_batch
+    
+    monkeypatch.setattr(prequal_batch.settings, "PREQUAL_BATCH_CHUNK_ROWS", 3)
+    app.dependency_overrides[get_current_user] = lambda: User(email="leads@example.com", hashed_password="x", full_name="Leads")
+    headers = {"Content-Type": "text/csv"}
+    
+    leads = [("L1", 1000000, 100000, 720), ("L2", 500000, 300000, 720), ("L3", 900000, 0, 600),
+             ("L4", 800000, 50000, ""), ("L5", "n/a", 0, 700), ("L6", 1200000, 0, 800), ("L7", 0, 0, 700)]
+    body = "lead_id,annual_income,existing_loans,credit_score,loan_amount,loan_tenure_years\r\n" + "".join(
+        f"{lead},{income},{existing},{score},200000,5\r\n" for lead, income, existing, score in leads
+    )
+    response = await client.post("/api/ai/prequal/batch", content=body.encode(), headers=headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["lead_id"] for row in rows] == [lead[0] for lead in leads]
+    assert [row["row"] for row in rows] == [str(i) for i in range(1, 8)]
+    assert [row["is_prequalified"] for row in rows] == ["True", "False", "False", "True", "", "True", "False"]
+    assert rows[0]["max_loan_amount"] == "300000.0"
+    assert rows[4]["error"] == "Invalid numeric value"
+    
+    single = await AIService.prequal(None, Decimal("800000"), Decimal("50000"), Decimal("700"), Decimal("200000"), 5)
+    assert float(rows[3]["max_loan_amount"]) == single["max_loan_amount"]
+    
+    # A quoted lead ID spanning lines is one record
+    quoted = await client.post("/api/ai/prequal/batch", content=(
+        'lead_id,annual_income,existing_loans,loan_amount,loan_tenure_years\n"L8\nnorth",1000000,0,200000,5\n'
+    ).encode(), headers=headers)
+    rows = list(csv.DictReader(io.StringIO(quoted.text)))
+    assert [(row["row"], row["lead_id"], row["is_prequalified"]) for row in rows] == [("1", "L8\nnorth", "True")]
+    
+    missing = await client.post("/api/ai/prequal/batch", content=b"lead_id,annual_income\n1,2\n", headers=headers)
+    assert missing.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_prequal_endpoint(client):
+    """Test single-lead prequal answers over HTTP and agrees with the batch row for the same lead"""
+    from app.main import app
+    from app.dependencies import get_current_user
+    
+    app.dependency_overrides[get_current_user] = lambda: User(email="leads@example.com", hashed_password="x", full_name="Leads")
+    lead = {"annual_income": 800000, "existing_loans": 50000, "loan_amount": 200000, "loan_tenure_years": 5}
+    response = await client.post("/api/ai/prequal", json=lead)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["is_prequalified"] is True and body["created_at"]
+    # No credit score: the default applies, as for a blank cell in the batch (row L4 above)
+    assert float(body["max_loan_amount"]) == 240000.0
+    
+    response = await client.post("/api/ai/prequal", json={**lead, "credit_score": 600})
+    assert response.status_code == 200 and response.json()["is_prequalified"] is False
+
+
+@pytest.mark.asyncio
+async def test_predict_roi_batch_writes_back(db_session, test_loan, monkeypatch):
+    """Test ROI falls back to the engine, uses the registry model when loaded, and updates loans in bulk"""
+    from app.core import ml_loader
+    from app.services.calculation_service import get_calculation_service
+    
+    single = await AIService.predict_roi(db_session, test_loan.id, Decimal("5"), "Gujarat")
+    expected = await get_calculation_service().calculate_roi(Decimal("5"), "Gujarat", Decimal("300000"))
+    assert single["npv"] == pytest.approx(float(expected["npv"]), abs=0.01)
+    assert single["payback_period_years"] == expected["payback_period_years"]
+    await db_session.refresh(test_loan)
+    assert test_loan.roi_prediction["model_version"] == "engine"
+    
+    class YieldModel:
+        def predict(self, features):
+            return features[:, 1] * 365 * (1 - features[:, 2] / 100)
+    
+    monkeypatch.setitem(ml_loader.ml_models, "roi_prediction", YieldModel())
+    items = [
+        {"loan_application_id": test_loan.id, "system_capacity_kw": 5, "location": "Gujarat", "roof_angle": angle}
+        for angle in (0, 20, None)
+    ]
+    flat, tilted, unknown = await AIService.predict_roi_batch(db_session, items)
+    assert flat["npv"] == pytest.approx(single["npv"], abs=0.01)
+    assert tilted["npv"] < flat["npv"]
+    # A missing roof angle takes the schema default (20°), not 0°
+    assert unknown["npv"] == tilted["npv"]
+    await db_session.refresh(test_loan)
+    assert test_loan.roi_prediction["npv"] == unknown["npv"]
+    
+    with pytest.raises(ValueError):
+        await AIService.predict_roi_batch(db_session, [{**items[0], "loan_application_id": __import__("uuid").uuid4()}])
+
+
+@pytest.mark.asyncio
+async def test_inference_executor_limits_and_timeouts(monkeypatch):
+    """Test per-model concurrency limits, timeouts and wait/exec stats, with other models unaffected"""
+    import asyncio
+    import threading
+    import time
+    from app.core import inference_executor
+    
+    class SlowModel:
+        def __init__(self, seconds):
+            self.seconds = seconds
+            self.active = 0
+            self.peak = 0
+            self.lock = threading.Lock()
+        
+        def predict(self, features):
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(self.seconds)
+            with self.lock:
+                self.active -= 1
+            return features
+    
+    monkeypatch.setattr(inference_executor.settings, "INFERENCE_MODEL_CONCURRENCY", {"slow_test": 1})
+    monkeypatch.setattr(inference_executor.settings, "INFERENCE_MODEL_TIMEOUTS", {"slow_test": 0.3, "stuck_test": 0.05})
+    slow, fast = SlowModel(0.05), SlowModel(0)
+    
+    slow_calls = [asyncio.ensure_future(inference_executor.run_model("slow_test", slow, "predict", i)) for i in range(3)]
+    assert await inference_executor.run_model("fast_test", fast, "predict", 7) == 7
+    assert not all(call.done() for call in slow_calls)
+    assert await asyncio.gather(*slow_calls) == [0, 1, 2]
+    assert slow.peak == 1
+    
+    stats = inference_executor.get_inference_executor_stats()["slow_test"]
+    assert stats["calls"] == 3 and stats["max_concurrency"] == 1
+    assert stats["max_wait_ms"] >= 50 and stats["mean_exec_ms"] >= 40
+    
+    with pytest.raises(inference_executor.InferenceTimeoutError):
+        await inference_executor.run_model("stuck_test", SlowModel(0.2), "predict", 1)
+    assert inference_executor.get_inference_executor_stats()["stuck_test"]["timeouts"] == 1
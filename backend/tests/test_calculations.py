@@ -0,0 +1,339 @@
+"""
+Calculation Tests
+"""
+import pytest
+from decimal import Decimal
+import numpy as np
+from app.services.calculation_service import CalculationService, get_calculation_service
+
+
+@pytest.mark.asyncio
+async def test_emi_batch_matches_scalar():
+    """Test batch EMI agrees with the scalar path"""
+    principals = [100000, 250000, 500000, 75000]
+    rates = [8.5, 10.0, 0, 12.25]
+    tenures = [5, 7, 10, 3]
+    
+    batch = await CalculationService.calculate_emi_batch(principals, rates, tenures)
+    assert batch["count"] == 4
+    
+    for i in range(4):
+        scalar = await CalculationService.calculate_emi(
+            Decimal(str(principals[i])), Decimal(str(rates[i])), tenures[i]
+        )
+        assert Decimal(str(batch["emi_amount"][i])) == scalar["emi_amount"]
+        assert Decimal(str(batch["total_amount"][i])) == scalar["total_amount"]
+        assert batch["tenure_months"][i] == scalar["tenure_months"]
+
+
+@pytest.mark.asyncio
+async def test_emi_batch_zero_rate():
+    """Test zero-rate loans split principal evenly"""
+    batch = await CalculationService.calculate_emi_batch([120000], [0], [5])
+    assert batch["emi_amount"] == [2000.0]
+    assert batch["total_interest"] == [0.0]
+
+
+@pytest.mark.asyncio
+async def test_emi_batch_length_mismatch():
+    """Test mismatched column lengths are rejected"""
+    with pytest.raises(ValueError):
+        await CalculationService.calculate_emi_batch([100000, 200000], [8.5], [5, 5])
+
+
+@pytest.mark.asyncio
+async def test_emi_batch_rejects_fractional_tenure():
+    """Test fractional tenures are rejected instead of truncated to whole years"""
+    with pytest.raises(ValueError, match="whole years"):
+        await CalculationService.calculate_emi_batch([100000, 200000], [8.5, 8.5], [5, 2.5])
+    with pytest.raises(ValueError, match="positive"):
+        await CalculationService.calculate_emi_batch([100000], [8.5], [0])
+
+
+def test_amortization_schedule_exact():
+    """Test amortization repays principal exactly with a final-installment adjustment"""
+    principal = Decimal("500000")
+    rows = list(CalculationService.amortization_schedule(principal, Decimal("8.5"), 25))
+    
+    assert len(rows) == 300
+    assert rows[-1]["balance"] == Decimal("0.00")
+    assert sum(row["principal"] for row in rows) == principal
+    assert all(row["payment"] == rows[0]["payment"] for row in rows[:-1])
+    assert all(row["payment"] == row["principal"] + row["interest"] for row in rows)
+
+
+def test_amortization_schedule_is_lazy():
+    """Test rows are generated on demand and inputs validated eagerly"""
+    schedule = CalculationService.amortization_schedule(Decimal("100000"), Decimal("0"), 1)
+    first = next(schedule)
+    assert first["month"] == 1
+    assert first["interest"] == Decimal("0.00")
+    
+    with pytest.raises(ValueError):
+        CalculationService.amortization_schedule(Decimal("100000"), Decimal("8.5"), 0)
+
+
+@pytest.mark.asyncio
+async def test_amortization_export_is_bounded(client, monkeypatch):
+    """Test the export streams one schedule per entry and rejects requests over the schedule limit"""
+    import json
+    from app.main import app
+    from app.core.config import settings
+    from app.dependencies import get_current_user
+    from app.models.user import User
+    
+    app.dependency_overrides[get_current_user] = lambda: User(email="export@example.com", hashed_password="x", full_name="Export")
+    monkeypatch.setattr(settings, "AMORTIZATION_EXPORT_MAX_SCHEDULES", 2)
+    loan = {"principal": "120000", "interest_rate": "0", "tenure_years": 1}
+    
+    response = await client.post("/api/calculate/amortization/export", json={"schedules": [loan, loan]})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 24 and {row["schedule"] for row in rows} == {0, 1}
+    
+    response = await client.post("/api/calculate/amortization/export", json={"schedules": [loan] * 3})
+    assert response.status_code == 400
+    assert "2 schedules" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_roi_fast_matches_exact():
+    """Test closed-form ROI agrees with the Decimal-exact mode"""
+    calc_service = get_calculation_service()
+    cases = [
+        (Decimal("5"), "Maharashtra", Decimal("300000"), Decimal("0.5")),
+        (Decimal("3"), "Unknown", Decimal("900000"), Decimal("0.7")),
+        (Decimal("2.5"), "Gujarat", Decimal("150000"), Decimal("0")),
+    ]
+    for capacity, location, cost, degradation in cases:
+        fast = await calc_service.calculate_roi(capacity, location, cost, degradation_rate=degradation)
+        exact = await calc_service.calculate_roi(capacity, location, cost, degradation_rate=degradation, exact=True)
+        assert fast["payback_period_years"] == exact["payback_period_years"]
+        assert abs(fast["npv"] - exact["npv"]) < Decimal("0.01")
+        assert abs(fast["total_savings"] - exact["total_savings"]) < Decimal("0.01")
+        assert len(fast["annual_savings"]) == 25
+
+
+@pytest.mark.asyncio
+async def test_roi_batch_matches_single():
+    """Test batch ROI returns the same summaries as single calls"""
+    calc_service = get_calculation_service()
+    batch = await calc_service.calculate_roi_batch(
+        [5, 3], ["Maharashtra", "Rajasthan"], [300000, 200000],
+    )
+    single = await calc_service.calculate_roi(Decimal("3"), "Rajasthan", Decimal("200000"))
+    assert batch["count"] == 2
+    assert Decimal(str(batch["npv"][1])) == single["npv"]
+    assert batch["payback_period_years"][1] == single["payback_period_years"]
+
+
+@pytest.mark.asyncio
+async def test_roi_risk_seeded_bands():
+    """Test Monte Carlo ROI is reproducible and bands are ordered"""
+    calc_service = get_calculation_service()
+    args = (Decimal("5"), "Maharashtra", Decimal("300000"))
+    first = await calc_service.simulate_roi_risk(*args, paths=2000, seed=11)
+    second = await calc_service.simulate_roi_risk(*args, paths=2000, seed=11)
+    
+    assert first["npv"] == second["npv"]
+    assert first["npv"]["p10"] <= first["npv"]["p50"] <= first["npv"]["p90"]
+    assert len(first["cumulative_savings"]) == 25
+
+
+@pytest.mark.asyncio
+async def test_roi_risk_fixed_distributions_match_deterministic():
+    """Test degenerate distributions collapse to the deterministic ROI"""
+    calc_service = get_calculation_service()
+    fixed = {
+        "irradiation": {"kind": "fixed", "mean": 1.0},
+        "degradation": {"kind": "fixed"},
+        "tariff_escalation": {"kind": "fixed", "mean": 0.0},
+        "downtime": {"kind": "fixed", "mean": 0.0},
+    }
+    risk = await calc_service.simulate_roi_risk(
+        Decimal("5"), "Gujarat", Decimal("300000"), paths=100, seed=1, distributions=fixed,
+    )
+    roi = await calc_service.calculate_roi(Decimal("5"), "Gujarat", Decimal("300000"))
+    assert abs(Decimal(str(risk["npv"]["p50"])) - roi["npv"]) < Decimal("0.05")
+    assert risk["payback_period_years"]["p50"] == roi["payback_period_years"]
+
+
+@pytest.mark.asyncio
+async def test_subsidy_slabs():
+    """Test PM Surya Ghar style marginal slabs and the overall cap"""
+    calc_service = get_calculation_service()
+    result = await calc_service.calculate_subsidy(Decimal("2.5"), "Unknown")
+    assert result["central_subsidy"] == Decimal("69000.00")
+    assert result["state_subsidy"] == Decimal("0")
+    assert result["rules_version"]
+    
+    capped = await calc_service.calculate_subsidy(Decimal("10"), "Unknown")
+    assert capped["central_subsidy"] == Decimal("78000.00")
+    
+    commercial = await calc_service.calculate_subsidy(Decimal("10"), "Unknown", "commercial")
+    assert commercial["central_subsidy"] == Decimal("0.00")
+
+
+@pytest.mark.asyncio
+async def test_subsidy_batch_matches_scalar():
+    """Test vectorized subsidy evaluation agrees with the exact path"""
+    calc_service = get_calculation_service()
+    capacities = [0.5, 1, 2, 2.75, 3, 4.5, 12]
+    batch = await calc_service.calculate_subsidy_batch(capacities, "Gujarat")
+    for capacity, amount in zip(capacities, batch["subsidy_amount"]):
+        single = await calc_service.calculate_subsidy(Decimal(str(capacity)), "Gujarat")
+        assert Decimal(str(amount)) == single["subsidy_amount"]
+
+
+def test_subsidy_rules_legacy_format(tmp_path):
+    """Test legacy percentage rules compile to equivalent slab tables"""
+    import json
+    from app.services.subsidy_engine import load_subsidy_rules
+    
+    path = tmp_path / "subsidy.json"
+    path.write_text(json.dumps({
+        "central": {"residential": {
+            "upto_3kw": {"percentage": 40, "max_amount": 30000},
+            "above_3kw": {"percentage": 40, "max_amount": 1000},
+        }},
+        "state": {"Gujarat": {"percentage": 25, "max_amount": 25000}},
+    }))
+    rules = load_subsidy_rules(path)
+    
+    result = rules.calculate(Decimal("2"), "Gujarat")
+    assert result["central_subsidy"] == Decimal("800.00")
+    assert result["state_subsidy"] == Decimal("500.00")
+    assert result["rules_version"].startswith("sha1:")
+    assert rules.calculate(Decimal("5"), "Gujarat")["central_subsidy"] == Decimal("1000.00")
+
+
+def test_reference_data_reload(tmp_path, monkeypatch):
+    """Test reference data reloads from disk, counts reloads and keeps the last good snapshot"""
+    import json
+    from app.core import reference_data
+    
+    (tmp_path / "irradiation.csv").write_text("state,irradiation\nGoa,5.1\n")
+    (tmp_path / "subsidy.json").write_text(json.dumps({"version": "v1", "central": {}, "state": {}}))
+    monkeypatch.setattr(reference_data.settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(reference_data, "_reference_data", None)
+    
+    first = reference_data.reload_reference_data()
+    assert first.irradiation["Goa"] == 5.1
+    assert first.subsidy_rules.version == "v1"
+    with pytest.raises(TypeError):
+        first.irradiation["Goa"] = 6.0
+    
+    reloads = reference_data.reference_data_stats["reload_count"]
+    (tmp_path / "subsidy.json").write_text(json.dumps({"version": "v2", "central": {}, "state": {}}))
+    assert reference_data.reload_reference_data().subsidy_rules.version == "v2"
+    assert reference_data.reference_data_stats["reload_count"] == reloads + 1
+    
+    (tmp_path / "subsidy.json").write_text("{not json")
+    assert reference_data.reload_reference_data().subsidy_rules.version == "v2"
+    assert reference_data.get_reference_data_stats()["last_error"]
+    monkeypatch.setattr(reference_data, "_reference_data", None)
+
+
+@pytest.mark.asyncio
+async def test_irradiation_grid_lookup(tmp_path, monkeypatch):
+    """Test gridded irradiation resolves by pincode and lat/lon, falling back to the state average"""
+    from app.core import reference_data
+    from app.core.irradiation_grid import build_grid_from_csv
+    
+    rows = ["lat,lon,month,ghi"]
+    for lat, lon, ghi in [(18.0, 72.8, 5.0), (18.0, 72.9, 6.0), (18.1, 72.8, 4.0)]:
+        rows += [f"{lat},{lon},{month},{ghi}" for month in range(1, 13)]
+    (tmp_path / "grid.csv").write_text("\n".join(rows) + "\n")
+    assert build_grid_from_csv(tmp_path / "grid.csv", tmp_path, 0.1) == (2, 2, 12)
+    (tmp_path / "pincodes.csv").write_text("pincode,latitude,longitude\n400001,18.05,72.95\n")
+    monkeypatch.setattr(reference_data.settings, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(reference_data, "_reference_data", None)
+    
+    grid = reference_data.get_reference_data().irradiation_grid
+    assert grid.cell(18.05, 72.85) == (0, 0)
+    assert grid.cell(10.0, 72.85) is None
+    assert grid.pincode_cell("400001") == (0, 1)
+    assert grid.annual_mean(1, 1) is None  # no data in that cell
+    
+    service = get_calculation_service()
+    assert service.resolve_irradiation(pincode="400001") == (pytest.approx(6.0), "pincode")
+    assert service.resolve_irradiation(latitude=18.15, longitude=72.85) == (pytest.approx(4.0), "grid")
+    assert service.resolve_irradiation("Maharashtra", latitude=18.15, longitude=72.95) == (5.5, "state")
+    
+    result = await service.calculate_roi(
+        Decimal("3"), "Maharashtra", Decimal("180000"), Decimal("8"), latitude=18.05, longitude=72.85,
+    )
+    assert result["irradiation_source"] == "grid"
+    batch = await service.calculate_roi_batch(
+        [3, 3], ["Maharashtra", "Maharashtra"], [180000, 180000], [8, 8],
+        latitudes=[18.05, 30.0], longitudes=[72.85, 72.85],
+    )
+    assert batch["total_savings"][0] == pytest.approx(float(result["total_savings"]), rel=1e-9)
+    monkeypatch.setattr(reference_data, "_reference_data", None)
+
+
+def test_irradiation_grid_finds_its_source_points(tmp_path):
+    """Test points lying exactly on source coordinates resolve to the cells they were built into"""
+    from app.core.irradiation_grid import build_grid_from_csv, load_irradiation_grid
+    
+    points = [(lat, lon) for lat in (6.1, 18.2, 18.4, 28.7) for lon in (68.3, 72.8, 77.1, 88.4)]
+    rows = ["lat,lon,month,ghi"]
+    for n, (lat, lon) in enumerate(points):
+        rows += [f"{lat},{lon},{month},{n}" for month in range(1, 13)]
+    (tmp_path / "grid.csv").write_text("\n".join(rows) + "\n")
+    build_grid_from_csv(tmp_path / "grid.csv", tmp_path, 0.1)
+    grid = load_irradiation_grid(tmp_path)
+    
+    for n, (lat, lon) in enumerate(points):
+        cell = grid.cell(lat, lon)
+        assert cell is not None and grid.annual_mean(*cell) == n
+    lats, lons = np.array(points).T
+    assert grid.annual_mean_many(lats, lons, -1.0).tolist() == list(range(len(points)))
+
+
+@pytest.mark.asyncio
+async def test_solve_rate_and_tenure_round_trip():
+    """Test reverse-EMI solvers recover the forward inputs"""
+    rng = np.random.default_rng(7)
+    principals = rng.uniform(50000, 2000000, 500)
+    rates = np.concatenate([[0.0, 0.05, 36.0], rng.uniform(1, 24, 497)])
+    tenures = rng.integers(1, 31, 500)
+    emi = CalculationService._emi_arrays(principals, rates, tenures)[0]
+    
+    solved = await CalculationService.solve_rate_for_emi(principals.tolist(), emi.tolist(), tenures.tolist())
+    assert all(solved["converged"])
+    assert solved["iterations"] <= 50
+    np.testing.assert_allclose(solved["interest_rate"], rates, atol=1e-6)
+    
+    tenure = await CalculationService.solve_tenure_for_emi(principals.tolist(), emi.tolist(), rates.tolist())
+    assert tenure["tenure_months"] == (tenures * 12).tolist()
+    
+    # EMI too small to cover principal at any rate / to cover interest at this rate
+    infeasible = await CalculationService.solve_rate_for_emi([100000], [1000], [5])
+    assert infeasible["interest_rate"] == [None] and infeasible["converged"] == [False]
+    infeasible = await CalculationService.solve_tenure_for_emi([100000], [500], [12])
+    assert infeasible["tenure_months"] == [None]
+
+
+@pytest.mark.asyncio
+async def test_irr_matches_roi_cashflows():
+    """Test project IRR zeroes the NPV of the calculate_roi savings series"""
+    from app.services.calculation_service import irr
+    
+    rate, converged = irr([[-100, 110, 0], [-100, 60, 60]])
+    assert converged.all()
+    assert rate[0] == pytest.approx(0.10)
+    assert rate[1] == pytest.approx(0.130662, abs=1e-6)
+    
+    service = get_calculation_service()
+    roi = await service.calculate_roi(Decimal("5"), "Maharashtra", Decimal("300000"))
+    result = await service.calculate_irr_batch(
+        [5, 5], "Maharashtra", [300000, 300000], subsidy_amounts=[0, 78000],
+    )
+    assert all(result["converged"])
+    savings = np.array([row["savings"] for row in roi["annual_savings"]])
+    discount = (1 + result["irr_percentage"][0] / 100) ** -np.arange(1, savings.size + 1)
+    assert savings @ discount == pytest.approx(300000, rel=1e-5)  # irr_percentage is rounded to 4 dp
+    # Subsidy lowers the borrower's outlay, so the IRR rises
+    assert result["irr_percentage"][1] > result["irr_percentage"][0]
+    assert result["net_cost"] == [300000.0, 222000.0]
@@ -1,6 +1,8 @@
 """
 Loan Tests
 """
+import asyncio
+from uuid import UUID, uuid4
 import pytest
 from httpx import AsyncClient
 
@@ -55,3 +57,432 @@ async def test_list_loans(client: AsyncClient, test_user_data, test_loan_data):
     data = response.json()
     assert len(data) > 0
 
+
+
+@pytest.fixture
+async def workflow_loan(db_session):
+    """Draft loan whose applicant has a valid bureau report on file (reused by the CIBIL step)"""
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    from app.models.credit import CreditCheck, CreditStatus
+    from app.models.loan import LoanApplication
+    from app.models.user import User
+    
+    user = User(email="workflow@example.com", hashed_password="x", full_name="Workflow User")
+    db_session.add(user)
+    await db_session.flush()
+    loan = LoanApplication(
+        user_id=user.id,
+        full_name="Workflow User",
+        state="Maharashtra",
+        annual_income=Decimal("900000"),
+        system_capacity_kw=Decimal("5.0"),
+        loan_amount=Decimal("200000"),
+        loan_tenure_years=5,
+    )
+    db_session.add_all([loan, CreditCheck(
+        user_id=user.id,
+        status=CreditStatus.COMPLETED,
+        credit_score=760,
+        consent_text="I consent to credit check",
+        consent_timestamp=datetime.utcnow(),
+        expires_at=datetime.utcnow() + timedelta(days=30),
+    )])
+    await db_session.commit()
+    return loan
+
+
+@pytest.mark.asyncio
+async def test_submit_returns_202_and_workflow_resumes_from_checkpoint(client: AsyncClient, db_session, workflow_loan, monkeypatch):
+    """Test submit computes subsidy and EMI and enqueues the rest, and a failed step retries without re-running completed ones"""
+    from app.main import app
+    from app.dependencies import get_current_user
+    from app.models.loan import LoanStatus
+    from app.models.user import User
+    from app.services import loan_workflow
+    from app.services.loan_workflow import LoanWorkflow
+    from app.tasks import loan_tasks
+    
+    loan = workflow_loan
+    enqueued = []
+    monkeypatch.setattr(loan_tasks, "enqueue_loan_workflow", lambda loan_id, steps: enqueued.append((loan_id, steps)))
+    app.dependency_overrides[get_current_user] = lambda: User(id=loan.user_id, email="workflow@example.com", hashed_password="x", full_name="Workflow User")
+    response = await client.post(f"/api/loans/{loan.id}/submit")
+    assert response.status_code == 202
+    assert response.json()["status"] == "submitted"
+    assert enqueued == [(str(loan.id), ["kyc", "cibil"])]
+    await db_session.refresh(loan)
+    assert loan.workflow_data["steps"] == ["subsidy", "emi"]
+    assert loan.emi_amount is not None and loan.subsidy_amount is not None
+    
+    calls = {step: 0 for step in loan_workflow.WORKFLOW_STEPS}
+    running = {"now": 0, "peak": 0}
+    original = dict(loan_workflow.STEP_RUNNERS)
+    
+    async def counted(step, db, target):
+        calls[step] += 1
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        try:
+            await asyncio.sleep(0.05)
+            if step == "ai_eligibility" and calls[step] == 1:
+                raise ConnectionError("model registry unavailable")
+            return await original[step](db, target)
+        finally:
+            running["now"] -= 1
+    
+    for step in calls:
+        monkeypatch.setitem(loan_workflow.STEP_RUNNERS, step, lambda db, target, step=step: counted(step, db, target))
+    
+    # Independent steps run concurrently; AI eligibility still joins on KYC and CIBIL
+    with pytest.raises(ConnectionError):
+        await LoanWorkflow.run(db_session, loan.id)
+    assert running["peak"] >= 2
+    await db_session.refresh(loan)
+    # Status only moves at checkpoints: the completed prefix is KYC, CIBIL
+    assert loan.status == LoanStatus.CIBIL_COMPLETED
+    assert loan.current_step == "ai_eligibility"
+    assert loan.workflow_data["steps"][:2] == ["subsidy", "emi"]
+    assert sorted(loan.workflow_data["steps"]) == ["cibil", "emi", "kyc", "subsidy"]
+    
+    # Resume: checkpointed steps are skipped, the failed one is retried
+    assert await LoanWorkflow.resume_point(db_session, loan.id) == ["ai_eligibility"]
+    assert await LoanWorkflow.run_step(db_session, loan.id, "cibil") == []
+    await LoanWorkflow.run(db_session, loan.id)
+    await db_session.refresh(loan)
+    assert loan.status == LoanStatus.EMI_CALCULATED
+    assert loan.current_step == "review"
+    assert loan.workflow_data["attempts"]["ai_eligibility"] == 2
+    assert loan.workflow_data["results"]["cibil"]["credit_score"] == 760
+    assert calls == {"kyc": 1, "cibil": 1, "ai_eligibility": 2, "subsidy": 0, "emi": 0}
+    assert loan.workflow_data["critical_path"]["duration_ms"] > 0
+    assert await LoanWorkflow.resume_point(db_session, loan.id) == []
+
+
+@pytest.mark.asyncio
+async def test_workflow_writes_one_checkpoint_per_step(db_session, workflow_loan, monkeypatch):
+    """Test transitions go to the event log and Redis, with one loan row write per step boundary"""
+    import json
+    from sqlalchemy import event
+    from app.services import workflow_events
+    from app.services.loan_service import LoanService
+    from app.services.loan_workflow import LoanWorkflow
+    from app.tasks import loan_tasks
+    
+    published = []
+    
+    class FakePipeline:
+        def publish(self, channel, message):
+            published.append((channel, json.loads(message)))
+        
+        async def execute(self):
+            return []
+    
+    class FakeRedis:
+        def pipeline(self, transaction=True):
+            return FakePipeline()
+    
+    async def fake_get_redis():
+        return FakeRedis()
+    
+    monkeypatch.setattr(workflow_events, "get_redis", fake_get_redis)
+    monkeypatch.setattr(loan_tasks, "enqueue_loan_workflow", lambda loan_id, steps: None)
+    loan_id = workflow_loan.id
+    
+    writes = []
+    loan_updates = []
+    
+    def count_writes(conn, cursor, statement, parameters, context, executemany):
+        statement = statement.lstrip().upper()
+        if statement.startswith(("INSERT", "UPDATE")):
+            writes.append(statement)
+        if statement.startswith("UPDATE LOAN_APPLICATIONS"):
+            loan_updates.append(statement)
+    
+    engine = db_session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", count_writes)
+    try:
+        await LoanService.submit_loan(db_session, loan_id, workflow_loan.user_id)
+        # Submit: one loan row update (with subsidy and EMI) and one multi-row event insert
+        assert len(loan_updates) == 1 and len(writes) == 2
+        await LoanWorkflow.run(db_session, loan_id)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_writes)
+    # Then one checkpoint per worker step: KYC, CIBIL, AI eligibility
+    assert len(loan_updates) == 4
+    
+    logged = await workflow_events.list_events(db_session, loan_id)
+    kinds = [entry.event.value for entry in logged]
+    assert kinds[0] == "submitted" and kinds[-1] == "completed"
+    assert kinds.count("step_started") == 0 and kinds.count("step_completed") == 5
+    assert [entry.step for entry in logged[1:3]] == ["subsidy", "emi"]
+    assert {entry.step for entry in logged if entry.event.value == "step_completed"} == {
+        "kyc", "cibil", "ai_eligibility", "subsidy", "emi",
+    }
+    assert logged[-1].data["duration_ms"] > 0
+    
+    # Every logged event was also published on the loan's channel; step starts only there
+    assert {channel for channel, _ in published} == {f"loan_events:{loan_id}"}
+    started = [message["step"] for _, message in published if message["event"] == "step_started"]
+    assert sorted(started) == ["ai_eligibility", "cibil", "kyc"]
+    assert sorted(message["id"] for _, message in published if message["event"] != "step_started") == sorted(
+        str(entry.id) for entry in logged
+    )
+
+
+def test_workflow_critical_path():
+    """Test the critical path follows the slowest dependency chain"""
+    from app.services.loan_workflow import critical_path, ready_steps
+    
+    assert ready_steps([]) == ["kyc", "cibil", "subsidy", "emi"]
+    assert ready_steps(["kyc", "subsidy"]) == ["cibil", "emi"]
+    assert "ai_eligibility" in ready_steps(["kyc", "cibil"])
+    assert critical_path({"kyc": 5, "cibil": 1000, "ai_eligibility": 40, "subsidy": 2, "emi": 1}) == (["cibil", "ai_eligibility"], 1040)
+    assert critical_path({"kyc": 5, "cibil": 10, "ai_eligibility": 40, "subsidy": 900, "emi": 1}) == (["subsidy"], 900)
+
+
+@pytest.mark.asyncio
+async def test_loan_event_stream(client: AsyncClient, db_session, workflow_loan, monkeypatch):
+    """Test the SSE stream sends a snapshot, then the loan's events until the workflow finishes"""
+    from app.main import app
+    from app.core.event_broker import get_event_broker
+    from app.dependencies import get_current_user
+    from app.models.user import User
+    from app.services.loan_service import LoanService
+    from app.tasks import loan_tasks
+    
+    loan = workflow_loan
+    monkeypatch.setattr(loan_tasks, "enqueue_loan_workflow", lambda loan_id, steps: None)
+    await LoanService.submit_loan(db_session, loan.id, loan.user_id)
+    app.dependency_overrides[get_current_user] = lambda: User(id=loan.user_id, email="workflow@example.com", hashed_password="x", full_name="Workflow User")
+    
+    broker = get_event_broker()
+    request = asyncio.create_task(client.get(f"/api/loans/{loan.id}/events"))
+    for _ in range(200):
+        if broker.get_stats()["subscribers"]:
+            break
+        await asyncio.sleep(0.01)
+    broker.dispatch(loan.id, {"id": "e1", "event": "step_completed", "step": "kyc"})
+    broker.dispatch(loan.id, {"id": "e2", "event": "completed", "step": None})
+    response = await asyncio.wait_for(request, 5)
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    body = response.text
+    assert body.startswith("retry: ")
+    assert body.index("event: snapshot") < body.index("id: e1\nevent: step_completed") < body.index("id: e2\nevent: completed")
+    assert '"status": "submitted"' in body
+    assert broker.get_stats()["subscribers"] == 0
+    
+    # Someone else's loan is not streamed
+    app.dependency_overrides[get_current_user] = lambda: User(id=uuid4(), email="other@example.com", hashed_password="x", full_name="Other")
+    response = await client.get(f"/api/loans/{loan.id}/events")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_loans(client: AsyncClient, db_session, monkeypatch):
+    """Test bulk import validates per row, inserts one multi-row statement per chunk and can submit"""
+    import json
+    from sqlalchemy import event, select
+    from app.main import app
+    from app.core.config import settings
+    from app.dependencies import get_current_user
+    from app.models.loan import LoanApplication
+    from app.models.user import User
+    from app.services.workflow_events import list_events
+    from app.tasks import loan_tasks
+    
+    user = User(email="partner@example.com", hashed_password="x", full_name="Installer Partner")
+    db_session.add(user)
+    await db_session.commit()
+    app.dependency_overrides[get_current_user] = lambda: User(id=user.id, email="partner@example.com", hashed_password="x", full_name="Installer Partner")
+    enqueued = []
+    monkeypatch.setattr(loan_tasks, "enqueue_loan_workflows", lambda workflows: enqueued.append(workflows))
+    monkeypatch.setattr(settings, "LOAN_BULK_CHUNK_ROWS", 2)
+    
+    rows = [
+        {"full_name": "A", "loan_amount": 150000, "state": "Gujarat", "system_capacity_kw": 3},
+        {"full_name": "B", "loan_amount": "not a number"},
+        {"full_name": "C", "loan_amount": 250000, "loan_tenure_years": 7, "system_capacity_kw": 5},
+        "not json",
+        {"full_name": "D", "loan_amount": 90000},
+    ]
+    body = "\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+    
+    inserts = []
+    
+    def count_inserts(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("INSERT INTO LOAN_APPLICATIONS"):
+            inserts.append(statement)
+    
+    engine = db_session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", count_inserts)
+    try:
+        response = await client.post(
+            "/api/loans/bulk?submit=true", content=body, headers={"Content-Type": "application/x-ndjson"},
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count_inserts)
+    
+    assert response.status_code == 200
+    assert response.json()["created"] == 3 and response.json()["failed"] == 2
+    results = response.json()["results"]
+    assert [result["row"] for result in results] == [1, 2, 3, 4, 5]
+    assert [result["status"] for result in results] == ["submitted", None, "submitted", None, "submitted"]
+    assert "loan_amount" in results[1]["error"] and "Invalid JSON" in results[3]["error"]
+    # Rows 1 and 3 fill the first chunk, row 5 the second: one INSERT each
+    assert len(inserts) == 2
+    assert enqueued == [
+        {results[0]["loan_id"]: ["kyc", "cibil"], results[2]["loan_id"]: ["kyc", "cibil"]},
+        # No system capacity: the subsidy step cannot run at submit and goes to the workers
+        {results[4]["loan_id"]: ["kyc", "cibil", "subsidy"]},
+    ]
+    
+    loans = (await db_session.execute(
+        select(LoanApplication).where(LoanApplication.user_id == user.id).execution_options(populate_existing=True)
+    )).scalars().all()
+    by_id = {str(loan.id): loan for loan in loans}
+    assert set(by_id) == {results[i]["loan_id"] for i in (0, 2, 4)}
+    loan = by_id[results[2]["loan_id"]]
+    assert loan.full_name == "C" and loan.loan_tenure_years == 7 and loan.current_step == "kyc"
+    assert loan.workflow_data["steps"] == ["subsidy", "emi"] and loan.emi_amount is not None
+    assert [(entry.event.value, entry.step) for entry in await list_events(db_session, loan.id)] == [
+        ("submitted", None), ("step_completed", "subsidy"), ("step_completed", "emi"),
+    ]
+    
+    # CSV: blank cells take the schema defaults, quoted cells may span lines; drafts are not enqueued
+    response = await client.post(
+        "/api/loans/bulk",
+        content='full_name,address,loan_amount,loan_tenure_years\nE,"12 MG Road\nPune",120000,\n\nG,,80000,3\n',
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(result["row"], result["status"]) for result in results] == [(1, "draft"), (2, "draft")]
+    loan = await db_session.get(LoanApplication, UUID(results[0]["loan_id"]))
+    assert loan.address == "12 MG Road\nPune" and loan.loan_amount == 120000
+    assert len(enqueued) == 2
+    
+    response = await client.post("/api/loans/bulk", content="full_name,city\nF,Pune\n", headers={"Content-Type": "text/csv"})
+    assert response.status_code == 400
+    assert "loan_amount" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_ai_step_stores_one_prediction_across_retries(db_session, workflow_loan, monkeypatch):
+    """Test the AI step's audit prediction is committed with its checkpoint, so retries and re-runs add no rows"""
+    from sqlalchemy import func, select
+    from app.models.ai_prediction import AIPrediction
+    from app.services import loan_workflow
+    from app.services.loan_service import LoanService
+    from app.services.loan_workflow import LoanWorkflow
+    from app.tasks import loan_tasks
+    
+    monkeypatch.setattr(loan_tasks, "enqueue_loan_workflow", lambda loan_id, steps: None)
+    loan_id = workflow_loan.id
+    await LoanService.submit_loan(db_session, loan_id, workflow_loan.user_id)
+    for step in ("kyc", "cibil"):
+        await LoanWorkflow.run_step(db_session, loan_id, step)
+    
+    original = loan_workflow.STEP_RUNNERS["ai_eligibility"]
+    calls = []
+    
+    async def flaky(db, loan):
+        calls.append(1)
+        result = await original(db, loan)
+        if len(calls) == 1:
+            raise ConnectionError("worker lost after scoring")
+        return result
+    
+    monkeypatch.setitem(loan_workflow.STEP_RUNNERS, "ai_eligibility", flaky)
+    
+    async def stored():
+        query = select(func.count()).select_from(AIPrediction).where(AIPrediction.loan_application_id == loan_id)
+        return (await db_session.execute(query)).scalar_one()
+    
+    with pytest.raises(ConnectionError):
+        await LoanWorkflow.run_step(db_session, loan_id, "ai_eligibility")
+    assert await stored() == 0
+    await LoanWorkflow.run_step(db_session, loan_id, "ai_eligibility")
+    assert await stored() == 1
+    assert await LoanWorkflow.run_step(db_session, loan_id, "ai_eligibility") == []
+    assert await stored() == 1 and len(calls) == 2
+
+
+def test_step_errors_retry_then_reject(monkeypatch):
+    """Test only unknown loans or steps skip the retries; a ValueError raised by a step still rejects the loan"""
+    from app.services.loan_workflow import InvalidWorkflowTask
+    from app.tasks import loan_tasks
+    
+    attempts, failed = [], []
+    
+    async def failing_step(loan_id, step):
+        attempts.append(step)
+        raise ValueError("Features not in schema eligibility/2: ['debt_ratio']")
+    
+    async def fail_step(loan_id, step, error):
+        failed.append((step, error))
+    
+    monkeypatch.setattr(loan_tasks, "_run_step", failing_step)
+    monkeypatch.setattr(loan_tasks, "_fail_step", fail_step)
+    monkeypatch.setattr(loan_tasks, "_enqueue_steps", lambda *args, **kwargs: None)
+    result = loan_tasks.run_loan_workflow_step.apply(args=["loan-1", "ai_eligibility"]).get()
+    assert result["status"] == "failed"
+    assert len(attempts) == loan_tasks.run_loan_workflow_step.max_retries + 1
+    assert failed == [("ai_eligibility", "Features not in schema eligibility/2: ['debt_ratio']")]
+    
+    async def invalid_step(loan_id, step):
+        attempts.append(step)
+        raise InvalidWorkflowTask("Loan application not found")
+    
+    attempts.clear()
+    failed.clear()
+    monkeypatch.setattr(loan_tasks, "_run_step", invalid_step)
+    result = loan_tasks.run_loan_workflow_step.apply(args=["loan-1", "kyc"]).get()
+    assert result["status"] == "invalid"
+    assert attempts == ["kyc"] and failed == []
+
+
+@pytest.mark.asyncio
+async def test_workflow_ai_step_uses_registered_model(db_session, workflow_loan, tmp_path, monkeypatch):
+    """Test the AI eligibility step in a fresh worker scores with the registry model and explains inline"""
+    import contextlib
+    import joblib
+    import numpy as np
+    from uuid import UUID
+    from sklearn.linear_model import LogisticRegression
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+    from app.core import ml_loader
+    from app.core.inference_batcher import shutdown_batchers
+    from app.models.ai_prediction import AIPrediction
+    from app.services import ai_service
+    from app.services.loan_service import LoanService
+    from app.tasks import loan_tasks
+    
+    X = np.array([[0.1, 0.5], [2.0, 0.1], [0.3, 0.4], [1.5, 0.2]])
+    joblib.dump(LogisticRegression().fit(X, [0, 1, 0, 1]), tmp_path / "eligibility_model.pkl")
+    (tmp_path / "manifest.json").write_text('{"eligibility": {"file": "eligibility_model.pkl", "version": "elig-7"}}')
+    monkeypatch.setattr(ml_loader.settings, "ML_MODELS_DIR", str(tmp_path))
+    for registry in ("ml_models", "model_versions", "shadow_models", "shadow_stats"):
+        monkeypatch.setattr(ml_loader, registry, {})
+    monkeypatch.setattr(ml_loader, "_models_loaded", False)
+    monkeypatch.setattr(loan_tasks, "enqueue_loan_workflow", lambda loan_id, steps: None)
+    monkeypatch.setattr(loan_tasks, "_progress_feed", contextlib.nullcontext)
+    monkeypatch.setattr(loan_tasks, "worker_session", async_sessionmaker(db_session.bind, class_=AsyncSession, expire_on_commit=False))
+    
+    try:
+        loan_id = workflow_loan.id
+        await LoanService.submit_loan(db_session, loan_id, workflow_loan.user_id)
+        for step in ("kyc", "cibil"):
+            await loan_tasks._run_step(str(loan_id), step)
+        assert await loan_tasks._run_step(str(loan_id), "ai_eligibility") == []
+        
+        loan = await db_session.get(type(workflow_loan), loan_id, populate_existing=True)
+        prediction = await db_session.get(AIPrediction, UUID(loan.workflow_data["results"]["ai_eligibility"]["prediction_id"]))
+        assert prediction.model_version == "elig-7"
+        assert prediction.shap_values is not None
+        assert not ai_service._explanation_tasks
+    finally:
+        # The eligibility batcher wraps this test's model; stop its worker thread
+        shutdown_batchers()